@@ -10,6 +10,11 @@ django_asgi_app = get_asgi_application()
 # NOW import everything else AFTER Django is initialized
 from channels.routing import ProtocolTypeRouter, URLRouter
 import editor.routing
+from editor.middleware import JWTAuthMiddleware
+from editor.loopmonitor import LoopMonitorMiddleware
+from editor.drain import DrainMiddleware, restored_rooms
+from editor.toolchains import toolchains
+from django.conf import settings
 
 # Configure the application
 # WebSockets in this app do not require cookie-based auth for basic room sync.
@@ -21,7 +26,22 @@ application = ProtocolTypeRouter({
     "http": django_asgi_app,
     # This app doesn't rely on cookie/session auth for room sync.
     # Avoid importing CookieSessionMiddleware (not available in older/newer Channels versions).
-    "websocket": URLRouter(editor.routing.websocket_urlpatterns),
+    # JWTAuthMiddleware verifies the SimpleJWT access token (?token=...) once per handshake.
+    "websocket": JWTAuthMiddleware(URLRouter(editor.routing.websocket_urlpatterns)),
 })
 
+# Drain mode (DRAIN_SIGNAL or POST /api/debug/drain/) refuses new sockets; the snapshot
+# written by the previous process answers the first joins after a restart.
+application = DrainMiddleware(application)
+restored_rooms.load()
+
+# Find out which compilers/runtimes are installed and warm them up, off the startup path. With an
+# executor daemon the jobs run over there, so this process only checks PATH.
+if settings.EXECUTOR_PROBE_TOOLCHAINS:
+    toolchains.start(prewarm=settings.EXECUTOR_PREWARM and not settings.EXECUTOR_DAEMON_SOCKET)
+
+# Opt-in event loop diagnostics: lag sampling, blocking-call stacks and pool queue stats.
+if settings.LOOP_MONITOR_ENABLED:
+    application = LoopMonitorMiddleware(application)
+
 
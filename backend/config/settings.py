@@ -185,3 +185,121 @@ LOGGING = {
         },
     },
 }
+
+# Code execution
+# Test-case runs compile once and execute the cases in parallel, bounded by these limits.
+EXECUTOR_MAX_CASES = int(os.getenv('EXECUTOR_MAX_CASES', '20'))
+EXECUTOR_CASE_CONCURRENCY = int(os.getenv('EXECUTOR_CASE_CONCURRENCY', '4'))
+
+# WebSocket rate limits: message type -> scope -> (tokens per second, burst).
+# 'connection' buckets are per socket, 'room' buckets are shared by all sockets of a room in this process.
+WS_RATE_LIMITS = {
+    'code_update': {'connection': (20, 40), 'room': (60, 120)},
+    'cursor_move': {'connection': (30, 60), 'room': (120, 240)},
+    'awareness': {'connection': (30, 60), 'room': (120, 240)},
+    'compile': {'connection': (0.5, 3), 'room': (2, 6)},
+    'language_change': {'connection': (2, 5), 'room': (5, 10)},
+    'clear_output': {'connection': (2, 5), 'room': (5, 10)},
+    'default': {'connection': (10, 20)},
+}
+
+# Reconnect-with-resume: each room keeps its most recent updates in memory (bounded by count and size).
+ROOM_HISTORY_MAX_ENTRIES = int(os.getenv('ROOM_HISTORY_MAX_ENTRIES', '200'))
+ROOM_HISTORY_MAX_BYTES = int(os.getenv('ROOM_HISTORY_MAX_BYTES', str(1024 * 1024)))
+
+# Background syntax diagnostics, debounced per room and run in a process pool.
+DIAGNOSTICS_ENABLED = os.getenv('DIAGNOSTICS_ENABLED', 'True') == 'True'
+DIAGNOSTICS_DEBOUNCE = float(os.getenv('DIAGNOSTICS_DEBOUNCE', '0.5'))
+DIAGNOSTICS_WORKERS = int(os.getenv('DIAGNOSTICS_WORKERS', '2'))
+DIAGNOSTICS_CACHE_SIZE = int(os.getenv('DIAGNOSTICS_CACHE_SIZE', '512'))
+
+# Lobby WebSocket: room changes are merged and pushed at most once per interval (seconds).
+LOBBY_BATCH_INTERVAL = float(os.getenv('LOBBY_BATCH_INTERVAL', '1.0'))
+
+# Execution workspaces are pooled on a RAM-backed filesystem and reused between runs.
+# If the root is unavailable (or has less than the minimum free space) runs fall back to disk temp dirs.
+EXECUTOR_WORKSPACE_ROOT = os.getenv('EXECUTOR_WORKSPACE_ROOT', '/dev/shm/codeknot')
+EXECUTOR_WORKSPACE_POOL_SIZE = int(os.getenv('EXECUTOR_WORKSPACE_POOL_SIZE', '8'))
+EXECUTOR_WORKSPACE_MAX_BYTES = int(os.getenv('EXECUTOR_WORKSPACE_MAX_BYTES', str(64 * 1024 * 1024)))
+EXECUTOR_WORKSPACE_MIN_FREE_BYTES = int(os.getenv('EXECUTOR_WORKSPACE_MIN_FREE_BYTES', str(128 * 1024 * 1024)))
+
+# Run output is stored server-side; compile_result only carries a head/tail preview.
+OUTPUT_PREVIEW_BYTES = int(os.getenv('OUTPUT_PREVIEW_BYTES', '4096'))
+OUTPUT_FETCH_MAX_BYTES = int(os.getenv('OUTPUT_FETCH_MAX_BYTES', str(256 * 1024)))
+OUTPUT_STORE_MAX_RUNS = int(os.getenv('OUTPUT_STORE_MAX_RUNS', '500'))
+OUTPUT_STORE_MAX_BYTES = int(os.getenv('OUTPUT_STORE_MAX_BYTES', str(64 * 1024 * 1024)))
+
+# WebSocket authentication. Tokens sent at the handshake are always verified; with
+# WS_REQUIRE_AUTH=True connections without a valid access token are refused.
+WS_REQUIRE_AUTH = os.getenv('WS_REQUIRE_AUTH', 'False') == 'True'
+WS_TOKEN_CACHE_SIZE = int(os.getenv('WS_TOKEN_CACHE_SIZE', '1024'))
+
+# Event loop diagnostics (off by default). Samples loop lag every LOOP_MONITOR_INTERVAL seconds,
+# logs the loop's stack when it is blocked longer than LOOP_MONITOR_BLOCK_THRESHOLD seconds and
+# reports database/executor pool queues at /api/debug/loop/ and /api/debug/metrics/ (admin only).
+LOOP_MONITOR_ENABLED = os.getenv('LOOP_MONITOR_ENABLED', 'False') == 'True'
+LOOP_MONITOR_INTERVAL = float(os.getenv('LOOP_MONITOR_INTERVAL', '0.1'))
+LOOP_MONITOR_BLOCK_THRESHOLD = float(os.getenv('LOOP_MONITOR_BLOCK_THRESHOLD', '0.2'))
+
+# Graceful drain before restarts. Sending DRAIN_SIGNAL to the process (or POST /api/debug/drain/)
+# stops accepting sockets, writes live room state to DRAIN_SNAPSHOT_PATH and tells clients to
+# reconnect spread over DRAIN_RECONNECT_WINDOW_MS. The next process loads the snapshot at startup
+# if it is younger than DRAIN_SNAPSHOT_MAX_AGE seconds. Edits are refused once a drain starts; the
+# snapshot waits up to DRAIN_EDIT_TIMEOUT seconds for edits that were already being applied.
+DRAIN_SIGNAL = os.getenv('DRAIN_SIGNAL', 'SIGUSR1')
+DRAIN_SNAPSHOT_PATH = os.getenv('DRAIN_SNAPSHOT_PATH', str(BASE_DIR / 'drain_snapshot.json'))
+DRAIN_SNAPSHOT_MAX_AGE = int(os.getenv('DRAIN_SNAPSHOT_MAX_AGE', '300'))
+DRAIN_RECONNECT_MIN_MS = int(os.getenv('DRAIN_RECONNECT_MIN_MS', '500'))
+DRAIN_RECONNECT_WINDOW_MS = int(os.getenv('DRAIN_RECONNECT_WINDOW_MS', '10000'))
+DRAIN_EDIT_TIMEOUT = float(os.getenv('DRAIN_EDIT_TIMEOUT', '5'))
+
+# Document storage. 'database' rewrites CodeSession.code on every edit; 'oplog' appends each
+# edit as a small record to a per-room log under OPLOG_DIR and folds the log into a checkpoint
+# in the background once it passes OPLOG_COMPACT_BYTES. OPLOG_FSYNC=True fsyncs every record.
+DOCUMENT_STORE = os.getenv('DOCUMENT_STORE', 'database')
+OPLOG_DIR = os.getenv('OPLOG_DIR', str(BASE_DIR / 'oplog'))
+OPLOG_COMPACT_BYTES = int(os.getenv('OPLOG_COMPACT_BYTES', str(256 * 1024)))
+OPLOG_FSYNC = os.getenv('OPLOG_FSYNC', 'False') == 'True'
+OPLOG_OPEN_ROOMS = int(os.getenv('OPLOG_OPEN_ROOMS', '256'))
+
+# Out-of-process execution. Run `python manage.py executor_daemon` and set EXECUTOR_DAEMON_SOCKET
+# on both sides; compile jobs then go to the daemon over this Unix socket. When the daemon can't
+# be reached, jobs run in-process and the daemon is retried after EXECUTOR_DAEMON_RETRY_SECONDS.
+EXECUTOR_DAEMON_SOCKET = os.getenv('EXECUTOR_DAEMON_SOCKET', '')
+EXECUTOR_DAEMON_WORKERS = int(os.getenv('EXECUTOR_DAEMON_WORKERS', '4'))
+EXECUTOR_DAEMON_POOL_SIZE = int(os.getenv('EXECUTOR_DAEMON_POOL_SIZE', '8'))
+EXECUTOR_DAEMON_TIMEOUT = float(os.getenv('EXECUTOR_DAEMON_TIMEOUT', '120'))
+EXECUTOR_DAEMON_CONNECT_TIMEOUT = float(os.getenv('EXECUTOR_DAEMON_CONNECT_TIMEOUT', '1.0'))
+EXECUTOR_DAEMON_RETRY_SECONDS = float(os.getenv('EXECUTOR_DAEMON_RETRY_SECONDS', '5'))
+
+# Toolchain probe. At startup (ASGI app or executor daemon) each language's compiler/runtime is
+# looked up on PATH and, with EXECUTOR_PREWARM, a hello-world is compiled and run once. Languages
+# that fail are rejected immediately and left out of `languages` in the WebSocket `init`.
+EXECUTOR_PROBE_TOOLCHAINS = os.getenv('EXECUTOR_PROBE_TOOLCHAINS', 'True') == 'True'
+EXECUTOR_PREWARM = os.getenv('EXECUTOR_PREWARM', 'True') == 'True'
+
+# Awareness (carets, selections, names, colors). Carets within AWARENESS_VIEWPORT_MARGIN lines of a
+# client's registered viewport are forwarded immediately; the rest arrive as one summary per
+# AWARENESS_SUMMARY_INTERVAL seconds.
+AWARENESS_VIEWPORT_MARGIN = int(os.getenv('AWARENESS_VIEWPORT_MARGIN', '20'))
+AWARENESS_SUMMARY_INTERVAL = float(os.getenv('AWARENESS_SUMMARY_INTERVAL', '1.0'))
+
+# Read-only spectators (ws/code/<room_id>/watch/). The document reaches them as at most one snapshot per
+# SPECTATOR_SNAPSHOT_INTERVAL seconds; viewer counts are published at most once per SPECTATOR_COUNT_INTERVAL.
+# Counts are kept in the Django cache, so they span processes only with a shared cache backend.
+SPECTATOR_SNAPSHOT_INTERVAL = float(os.getenv('SPECTATOR_SNAPSHOT_INTERVAL', '0.5'))
+SPECTATOR_COUNT_INTERVAL = float(os.getenv('SPECTATOR_COUNT_INTERVAL', '1.0'))
+
+# Traffic recording (opt-in). With TRAFFIC_RECORD=True every frame the editor consumer receives is
+# appended, with a timestamp, to TRAFFIC_RECORD_DIR/traffic-<pid>.jsonl (rotated and gzipped at
+# TRAFFIC_RECORD_MAX_BYTES). Recordings contain room code; `manage.py replay_traffic` plays them back.
+# TRAFFIC_RECORD_ROOMS limits recording to a comma-separated list of room ids.
+TRAFFIC_RECORD = os.getenv('TRAFFIC_RECORD', 'False') == 'True'
+TRAFFIC_RECORD_DIR = os.getenv('TRAFFIC_RECORD_DIR', str(BASE_DIR / 'traffic'))
+TRAFFIC_RECORD_MAX_BYTES = int(os.getenv('TRAFFIC_RECORD_MAX_BYTES', str(64 * 1024 * 1024)))
+TRAFFIC_RECORD_BACKUPS = int(os.getenv('TRAFFIC_RECORD_BACKUPS', '10'))
+TRAFFIC_RECORD_ROOMS = [room for room in os.getenv('TRAFFIC_RECORD_ROOMS', '').split(',') if room]
+
+# Full-text room search (GET /api/rooms/search/, SQLite FTS5). Saves mark a room as changed and changed rooms
+# are re-indexed together SEARCH_INDEX_DELAY seconds later. `manage.py rebuild_search_index` re-indexes everything.
+SEARCH_INDEX_DELAY = float(os.getenv('SEARCH_INDEX_DELAY', '5'))
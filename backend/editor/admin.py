@@ -1,15 +1,63 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
 from .models import Room, CodeSession, ActiveUser
+from .bulk import apply_bulk_action
+from .search import search_index
+
+
+class RoomActionForm(ActionForm):
+    new_owner = forms.CharField(required=False, label='New owner')
+
 
 @admin.register(Room)
 class RoomAdmin(admin.ModelAdmin):
-    list_display = ['room_id', 'name', 'created_at', 'get_active_users_count']
-    search_fields = ['room_id', 'name']
+    list_display = ['room_id', 'name', 'owner_username', 'locked', 'created_at', 'get_active_users_count']
+    list_filter = ['locked']
+    search_fields = ['room_id', 'name', 'owner_username']
+    # bulk actions run one UPDATE/DELETE and notify connected users (editor/bulk.py)
+    action_form = RoomActionForm
+    actions = ['lock_rooms', 'unlock_rooms', 'delete_rooms', 'transfer_rooms']
     
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # picks up name changes
+        search_index.mark(obj.room_id)
+
     def get_active_users_count(self, obj):
         return obj.active_users.count()
     get_active_users_count.short_description = 'Active Users'
 
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        # the stock action deletes row by row without telling connected users
+        actions.pop('delete_selected', None)
+        return actions
+
+    def run_bulk_action(self, request, queryset, action, **kwargs):
+        affected = apply_bulk_action(queryset, action, actor=request.user.get_username(), **kwargs)
+        self.message_user(request, f"{action.capitalize()}: {len(affected)} room(s) affected.")
+
+    @admin.action(description='Lock selected rooms', permissions=['change'])
+    def lock_rooms(self, request, queryset):
+        self.run_bulk_action(request, queryset, 'lock')
+
+    @admin.action(description='Unlock selected rooms', permissions=['change'])
+    def unlock_rooms(self, request, queryset):
+        self.run_bulk_action(request, queryset, 'unlock')
+
+    @admin.action(description='Delete selected rooms and notify connected users', permissions=['delete'])
+    def delete_rooms(self, request, queryset):
+        self.run_bulk_action(request, queryset, 'delete')
+
+    @admin.action(description='Transfer ownership of selected rooms to "New owner"', permissions=['change'])
+    def transfer_rooms(self, request, queryset):
+        new_owner = request.POST.get('new_owner', '').strip()
+        if not new_owner:
+            self.message_user(request, "Enter the new owner's username.", level=messages.ERROR)
+            return
+        self.run_bulk_action(request, queryset, 'transfer', new_owner=new_owner)
+
 @admin.register(CodeSession)
 class CodeSessionAdmin(admin.ModelAdmin):
     list_display = ['room', 'language', 'updated_at']
@@ -18,4 +66,4 @@ class CodeSessionAdmin(admin.ModelAdmin):
 @admin.register(ActiveUser)
 class ActiveUserAdmin(admin.ModelAdmin):
     list_display = ['username', 'room', 'joined_at']
-    list_filter = ['joined_at']
\ No newline at end of file
+    list_filter = ['joined_at']
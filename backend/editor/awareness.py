@@ -0,0 +1,116 @@
+import zlib
+
+from django.conf import settings
+
+# Fields a client may publish about itself. `line` (0-based caret line) drives viewport filtering.
+AWARENESS_FIELDS = ('line', 'pos', 'selection', 'name', 'color')
+
+COLORS = ['#e6194b', '#3cb44b', '#4363d8', '#f58231', '#911eb4', '#42d4f4', '#f032e6', '#469990', '#9a6324', '#800000']
+
+
+def default_color(username):
+    return COLORS[zlib.crc32((username or '').encode('utf-8')) % len(COLORS)]
+
+
+def clean_state(state):
+    """Keep only known fields with sane types and sizes."""
+    if not isinstance(state, dict):
+        return {}
+    cleaned = {}
+    for field in ('line', 'pos'):
+        value = state.get(field)
+        if isinstance(value, int) and not isinstance(value, bool) and value >= 0:
+            cleaned[field] = value
+    selection = state.get('selection')
+    if selection is None and 'selection' in state:
+        cleaned['selection'] = None
+    elif isinstance(selection, dict) and len(selection) <= 4 and all(
+        isinstance(key, str) and isinstance(value, int) and not isinstance(value, bool)
+        for key, value in selection.items()
+    ):
+        cleaned['selection'] = selection
+    for field, limit in (('name', 64), ('color', 32)):
+        value = state.get(field)
+        if isinstance(value, str) and value:
+            cleaned[field] = value[:limit]
+    return cleaned
+
+
+class AwarenessRegistry:
+    """Last published awareness state per user and room, used to compute deltas and join snapshots."""
+
+    def __init__(self):
+        self.rooms = {}
+
+    def update(self, room_id, username, state):
+        """Merge `state` into the user's entry and return only the fields that changed."""
+        users = self.rooms.setdefault(room_id, {})
+        current = users.get(username)
+        if current is None:
+            current = users[username] = {}
+            state = dict({'name': username, 'color': default_color(username)}, **state)
+        changes = {field: value for field, value in state.items() if current.get(field, ...) != value}
+        current.update(changes)
+        return changes
+
+    def get(self, room_id, username):
+        return self.rooms.get(room_id, {}).get(username)
+
+    def snapshot(self, room_id):
+        return {username: dict(state) for username, state in self.rooms.get(room_id, {}).items()}
+
+    def remove(self, room_id, username):
+        users = self.rooms.get(room_id)
+        if not users or users.pop(username, None) is None:
+            return False
+        if not users:
+            del self.rooms[room_id]
+        return True
+
+    def discard(self, room_id):
+        self.rooms.pop(room_id, None)
+
+
+awareness_registry = AwarenessRegistry()
+
+
+class AwarenessView:
+    """Per-connection routing of awareness deltas.
+
+    Carets inside the registered viewport (plus AWARENESS_VIEWPORT_MARGIN
+    lines) are forwarded immediately. Changes for carets outside it are
+    merged per user and sent as one summary every AWARENESS_SUMMARY_INTERVAL.
+    """
+
+    def __init__(self):
+        self.viewport = None
+        self.pending = {}
+
+    def set_viewport(self, first_line, last_line):
+        if first_line > last_line:
+            first_line, last_line = last_line, first_line
+        self.viewport = (first_line, last_line)
+
+    def visible(self, line):
+        if self.viewport is None or line is None:
+            return True
+        margin = getattr(settings, 'AWARENESS_VIEWPORT_MARGIN', 20)
+        return self.viewport[0] - margin <= line <= self.viewport[1] + margin
+
+    def route(self, username, changes, line, removed=False):
+        """Message to send now, or None when the change was queued for the next summary."""
+        if removed:
+            self.pending.pop(username, None)
+            return {'type': 'awareness', 'user': username, 'removed': True}
+        if self.visible(line):
+            # include whatever was held back while the caret was off screen
+            merged = dict(self.pending.pop(username, {}), **changes)
+            return {'type': 'awareness', 'user': username, 'state': merged}
+        self.pending.setdefault(username, {}).update(changes)
+        return None
+
+    def take_summary(self):
+        if not self.pending:
+            return None
+        pending, self.pending = self.pending, {}
+        return {'type': 'awareness_summary', 'users': pending}
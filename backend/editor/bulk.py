@@ -0,0 +1,135 @@
+import asyncio
+import logging
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import Room, CodeSession, ActiveUser
+from .history import room_history
+from .awareness import awareness_registry
+from .spectators import spectator_relay, watch_group
+from .lobby import lobby_broadcaster
+from .drain import restored_rooms
+from .oplog import oplog_store
+from .outputs import output_store
+from .diagnostics import diagnostics_scheduler
+from .search import search_index
+
+logger = logging.getLogger('editor')
+
+BULK_ACTIONS = ('lock', 'unlock', 'delete', 'transfer')
+
+
+def filter_rooms(rooms=None, room_ids=None, owner=None, idle_minutes=None):
+    """Narrow `rooms` (all rooms by default) by id, owner and idle time.
+
+    A room is idle when nobody is connected and neither the room nor its
+    session changed in the last `idle_minutes`. Oplog-stored documents are
+    judged by their log files, since those saves leave `updated_at` alone.
+    """
+    rooms = Room.objects.all() if rooms is None else rooms
+    if room_ids is not None:
+        rooms = rooms.filter(room_id__in=room_ids)
+    if owner is not None:
+        rooms = rooms.filter(owner_username=owner)
+    if idle_minutes is not None:
+        cutoff = timezone.now() - timedelta(minutes=idle_minutes)
+        rooms = rooms.filter(updated_at__lt=cutoff).exclude(session__updated_at__gte=cutoff).exclude(
+            Exists(ActiveUser.objects.filter(room=OuterRef('pk')))
+        )
+        oplog_rooms = rooms.filter(session__storage=CodeSession.STORAGE_OPLOG).values_list('room_id', flat=True)
+        edited = [
+            room_id for room_id, mtime in oplog_store.last_modified(list(oplog_rooms)).items()
+            if mtime >= cutoff.timestamp()
+        ]
+        if edited:
+            rooms = rooms.exclude(room_id__in=edited)
+    return rooms
+
+
+def apply_bulk_action(rooms, action, new_owner=None, actor=None):
+    """Lock, unlock, delete or transfer every room in `rooms` with a single UPDATE/DELETE.
+
+    Rooms that are already in the requested state are skipped. Each affected
+    room with connected users gets one broadcast. Returns the affected room ids.
+    """
+    if action in ('lock', 'unlock'):
+        rooms = rooms.exclude(locked=(action == 'lock'))
+    elif action == 'transfer':
+        rooms = rooms.exclude(owner_username=new_owner)
+
+    owners = dict(rooms.values_list('room_id', 'owner_username'))
+    room_ids = list(owners)
+    if not room_ids:
+        return []
+    live_rooms = set(
+        ActiveUser.objects.filter(room__room_id__in=room_ids).values_list('room__room_id', flat=True).distinct()
+    )
+
+    targets = Room.objects.filter(room_id__in=room_ids)
+    with transaction.atomic():
+        if action == 'delete':
+            search_index.remove(room_ids)
+            targets.delete()
+        elif action == 'transfer':
+            # update() skips auto_now, so bump updated_at explicitly
+            targets.update(owner_username=new_owner, updated_at=timezone.now())
+        else:
+            targets.update(locked=(action == 'lock'), updated_at=timezone.now())
+
+    if action == 'delete':
+        for room_id in room_ids:
+            oplog_store.discard(room_id)
+
+    async_to_sync(announce)(action, room_ids, live_rooms, new_owner, actor, owners)
+    logger.info("Bulk %s by %s affected %d rooms (%d live)", action, actor, len(room_ids), len(live_rooms))
+    return room_ids
+
+
+async def announce(action, room_ids, live_rooms, new_owner=None, actor=None, owners=None):
+    """Drop per-room caches and send one event to each live room's group.
+
+    `owners` maps room ids to their owners; a lock sends every spectator
+    but the owner away.
+    """
+    channel_layer = get_channel_layer()
+    sends = []
+    for room_id in room_ids:
+        restored_rooms.discard(room_id)
+
+        if action == 'delete':
+            lobby_broadcaster.publish(channel_layer, room_id, op='deleted')
+            room_history.discard(room_id)
+            awareness_registry.discard(room_id)
+            diagnostics_scheduler.discard(room_id)
+            event = {'type': 'room_deleted', 'user': actor}
+            spectator_relay.discard(room_id)
+            if room_id in spectator_relay.local:
+                sends.append(channel_layer.group_send(watch_group(room_id), event))
+        elif action == 'transfer':
+            lobby_broadcaster.publish(channel_layer, room_id, owner=new_owner)
+            event = {'type': 'owner_changed', 'owner': new_owner}
+        else:
+            locked = action == 'lock'
+            lobby_broadcaster.publish(channel_layer, room_id, locked=locked)
+            event = {'type': 'room_locked_state', 'locked': locked, 'user': actor}
+            # rooms nobody is resuming don't need a history entry
+            if room_id in live_rooms or room_history.revision(room_id):
+                event['revision'] = room_history.record(room_id, {'type': 'room_locked', 'locked': locked, 'user': actor})
+            if locked:
+                # spectators are not in live_rooms; same event handle_lock_room sends them
+                sends.append(channel_layer.group_send(watch_group(room_id), {
+                    'type': 'room_locked_state', 'locked': True, 'owner': (owners or {}).get(room_id),
+                }))
+
+        if room_id in live_rooms:
+            # same group name as CodeEditorConsumer
+            sends.append(channel_layer.group_send(f'code_{room_id}', event))
+
+    if action == 'delete':
+        output_store.discard_rooms(set(room_ids))
+    await asyncio.gather(*sends)
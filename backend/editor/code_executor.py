@@ -1,12 +1,42 @@
 import subprocess
-import tempfile
 import os
-import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .workspaces import workspace_pool
+from .toolchains import toolchains
+
+class PhaseClock:
+    """Adds the wall time of named phases to `timings`; does nothing when `timings` is None."""
+
+    def __init__(self, timings):
+        self.timings = timings
+        self.phase = None
+        self.started = 0.0
+
+    def start(self, phase):
+        """End the current phase, if any, and start `phase`."""
+        if self.timings is None:
+            return
+        now = time.perf_counter()
+        self.stop(now)
+        self.phase, self.started = phase, now
+
+    def stop(self, now=None):
+        if self.timings is None or self.phase is None:
+            return
+        now = time.perf_counter() if now is None else now
+        self.timings[self.phase] = self.timings.get(self.phase, 0.0) + now - self.started
+        self.phase = None
+
 
 class CodeExecutor:
     def __init__(self):
         self.timeout = 10
-        
+        # upper bound on test cases running at the same time for one request
+        self.max_case_workers = 4
+        self.workspaces = workspace_pool
+
         self.language_configs = {
             'python': {
                 'extension': '.py',
@@ -34,100 +64,220 @@ class CodeExecutor:
                 'run_cmd': ['{output}']
             }
         }
-    
-    def execute(self, code, language):
+
+    def _validate(self, code, language):
         if language not in self.language_configs:
             return f"Error: Unsupported language '{language}'"
-        
+
+        # known missing from the startup probe: fail before touching a workspace
+        reason = toolchains.unavailable_reason(language)
+        if reason:
+            return f"Error: {language} is not available on this server ({reason})"
+
         if not code or not code.strip():
             return "Error: No code provided"
-        
+
+        return None
+
+    def _write_source(self, temp_dir, code, language):
+        config = self.language_configs[language]
+        if language == 'java':
+            filename = 'Main' + config['extension']
+        else:
+            filename = 'program' + config['extension']
+
+        filepath = os.path.join(temp_dir, filename)
+
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write(code)
+
+        return filepath
+
+    def _format_cmd(self, cmd, filepath, temp_dir):
+        return [
+            part.format(
+                file=filepath,
+                dir=temp_dir,
+                output=os.path.join(temp_dir, 'program')
+            ) for part in cmd
+        ]
+
+    def _compile(self, language, filepath, temp_dir):
+        """Compile the source if the language needs it.
+
+        Returns an error message on failure, otherwise None.
+        """
+        config = self.language_configs[language]
+        if not config['compile_cmd']:
+            return None
+
+        compile_cmd = self._format_cmd(config['compile_cmd'], filepath, temp_dir)
+
+        try:
+            compile_result = subprocess.run(
+                compile_cmd,
+                capture_output=True,
+                text=True,
+                timeout=self.timeout,
+                cwd=temp_dir
+            )
+
+            if compile_result.returncode != 0:
+                return f"Compilation Error:\n{compile_result.stderr}"
+
+        except subprocess.TimeoutExpired:
+            return "Error: Compilation timeout"
+        except Exception as e:
+            return f"Compilation Error: {str(e)}"
+
+        return None
+
+    def _run(self, run_cmd, temp_dir, stdin=''):
+        # always feed stdin so programs that read input never wait on the server's stdin
+        return subprocess.run(
+            run_cmd,
+            input=stdin or '',
+            capture_output=True,
+            text=True,
+            timeout=self.timeout,
+            cwd=temp_dir
+        )
+
+    def execute(self, code, language, stdin='', timings=None):
+        """Run `code` and return its formatted output.
+
+        When `timings` is a dict it receives the seconds spent in each phase:
+        setup (workspace and source file), compile, run and cleanup.
+        """
+        error = self._validate(code, language)
+        if error:
+            return error
+
+        clock = PhaseClock(timings)
+        clock.start('setup')
+        try:
+            # pooled RAM-backed workspace, or a disk temp dir when the pool is unavailable
+            with self.workspaces.acquire() as temp_dir:
+                output = self._execute_in(temp_dir, code, language, stdin, clock)
+                clock.start('cleanup')
+            return output
+        finally:
+            clock.stop()
+
+    def _execute_in(self, temp_dir, code, language, stdin, clock):
         config = self.language_configs[language]
-        temp_dir = tempfile.mkdtemp()
-        
+        filepath = self._write_source(temp_dir, code, language)
+
+        output_lines = []
+
+        if config['compile_cmd']:
+            clock.start('compile')
+            output_lines.append(f"Compiling {language}...")
+
+            compile_error = self._compile(language, filepath, temp_dir)
+            if compile_error:
+                return "\n".join(output_lines) + f"\n\n{compile_error}"
+
+            output_lines.append("✓ Compilation successful\n")
+
+        run_cmd = self._format_cmd(config['run_cmd'], filepath, temp_dir)
+
+        output_lines.append("Executing code...\n")
+
+        clock.start('run')
         try:
-            if language == 'java':
-                filename = 'Main' + config['extension']
+            run_result = self._run(run_cmd, temp_dir, stdin)
+
+            if run_result.returncode != 0:
+                if run_result.stderr:
+                    output_lines.append(f"Runtime Error:\n{run_result.stderr}")
+                else:
+                    output_lines.append(f"Program exited with code {run_result.returncode}")
             else:
-                filename = 'program' + config['extension']
-            
-            filepath = os.path.join(temp_dir, filename)
-            
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(code)
-            
-            output_lines = []
-            
-            if config['compile_cmd']:
-                compile_cmd = [
-                    cmd.format(
-                        file=filepath,
-                        dir=temp_dir,
-                        output=os.path.join(temp_dir, 'program')
-                    ) for cmd in config['compile_cmd']
-                ]
-                
-                output_lines.append(f"Compiling {language}...")
-                
-                try:
-                    compile_result = subprocess.run(
-                        compile_cmd,
-                        capture_output=True,
-                        text=True,
-                        timeout=self.timeout,
-                        cwd=temp_dir
-                    )
-                    
-                    if compile_result.returncode != 0:
-                        return "\n".join(output_lines) + f"\n\nCompilation Error:\n{compile_result.stderr}"
-                    
-                    output_lines.append("✓ Compilation successful\n")
-                
-                except subprocess.TimeoutExpired:
-                    return "\n".join(output_lines) + "\n\nError: Compilation timeout"
-                except Exception as e:
-                    return "\n".join(output_lines) + f"\n\nCompilation Error: {str(e)}"
-            
-            run_cmd = [
-                cmd.format(
-                    file=filepath,
-                    dir=temp_dir,
-                    output=os.path.join(temp_dir, 'program')
-                ) for cmd in config['run_cmd']
-            ]
-            
-            output_lines.append("Executing code...\n")
-            
-            try:
-                run_result = subprocess.run(
-                    run_cmd,
-                    capture_output=True,
-                    text=True,
-                    timeout=self.timeout,
-                    cwd=temp_dir
-                )
-                
-                if run_result.returncode != 0:
-                    if run_result.stderr:
-                        output_lines.append(f"Runtime Error:\n{run_result.stderr}")
-                    else:
-                        output_lines.append(f"Program exited with code {run_result.returncode}")
+                if run_result.stdout:
+                    output_lines.append(run_result.stdout)
                 else:
-                    if run_result.stdout:
-                        output_lines.append(run_result.stdout)
-                    else:
-                        output_lines.append("(No output)")
-                    output_lines.append("\n✓ Execution completed successfully")
-                
-                return "\n".join(output_lines)
-            
-            except subprocess.TimeoutExpired:
-                return "\n".join(output_lines) + f"\n\nError: Execution timeout ({self.timeout} seconds)"
-            except Exception as e:
-                return "\n".join(output_lines) + f"\n\nRuntime Error: {str(e)}"
-        
-        finally:
-            try:
-                shutil.rmtree(temp_dir, ignore_errors=True)
-            except Exception:
-                pass
\ No newline at end of file
+                    output_lines.append("(No output)")
+                output_lines.append("\n✓ Execution completed successfully")
+
+            return "\n".join(output_lines)
+
+        except subprocess.TimeoutExpired:
+            return "\n".join(output_lines) + f"\n\nError: Execution timeout ({self.timeout} seconds)"
+        except Exception as e:
+            return "\n".join(output_lines) + f"\n\nRuntime Error: {str(e)}"
+
+    def execute_cases(self, code, language, cases):
+        """Compile once and run the program against every stdin case.
+
+        `cases` is a list of strings or dicts with `input` and optional
+        `expected`. Returns a dict with the compile step outcome and one
+        result per case, in the order given.
+        """
+        error = self._validate(code, language)
+        if error:
+            return {'error': error, 'compile_ms': 0, 'cases': []}
+
+        config = self.language_configs[language]
+
+        with self.workspaces.acquire() as temp_dir:
+            filepath = self._write_source(temp_dir, code, language)
+
+            started = time.monotonic()
+            compile_error = self._compile(language, filepath, temp_dir)
+            compile_ms = round((time.monotonic() - started) * 1000, 1)
+            if compile_error:
+                return {'error': compile_error, 'compile_ms': compile_ms, 'cases': []}
+
+            run_cmd = self._format_cmd(config['run_cmd'], filepath, temp_dir)
+            normalized = [self._normalize_case(case) for case in cases]
+
+            workers = max(1, min(self.max_case_workers, len(normalized)))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(
+                    lambda item: self._run_case(item[0], item[1], run_cmd, temp_dir),
+                    enumerate(normalized)
+                ))
+
+            return {'error': None, 'compile_ms': compile_ms, 'cases': results}
+
+    def _normalize_case(self, case):
+        if isinstance(case, dict):
+            return {'input': str(case.get('input') or ''), 'expected': case.get('expected')}
+        return {'input': '' if case is None else str(case), 'expected': None}
+
+    def _run_case(self, index, case, run_cmd, temp_dir):
+        result = {
+            'index': index,
+            'stdout': '',
+            'stderr': '',
+            'exit_code': None,
+            'timed_out': False,
+            'time_ms': 0,
+            'passed': None,
+        }
+
+        started = time.monotonic()
+        try:
+            run_result = self._run(run_cmd, temp_dir, case['input'])
+            result['stdout'] = run_result.stdout
+            result['stderr'] = run_result.stderr
+            result['exit_code'] = run_result.returncode
+        except subprocess.TimeoutExpired:
+            result['timed_out'] = True
+            result['stderr'] = f"Error: Execution timeout ({self.timeout} seconds)"
+        except Exception as e:
+            result['stderr'] = f"Runtime Error: {str(e)}"
+        result['time_ms'] = round((time.monotonic() - started) * 1000, 1)
+
+        if case['expected'] is not None:
+            result['passed'] = (
+                result['exit_code'] == 0
+                and self._normalize_output(result['stdout']) == self._normalize_output(str(case['expected']))
+            )
+
+        return result
+
+    def _normalize_output(self, text):
+        # ignore trailing whitespace on each line and trailing blank lines
+        return "\n".join(line.rstrip() for line in text.strip('\n').splitlines()).rstrip()
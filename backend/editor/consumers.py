@@ -1,27 +1,95 @@
 import json
 import asyncio
+import hashlib
 import logging
+import time
 
+from django.conf import settings
+from django.contrib.auth import get_user_model
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from django.db.models import Count
 
 from .models import Room, CodeSession, ActiveUser
-from .code_executor import CodeExecutor
+from .executor_service import executor_client
+from .ratelimit import ConnectionRateLimiter, rejections
+from .history import room_history
+from .diagnostics import diagnostics_scheduler
+from .lobby import lobby_broadcaster, LOBBY_GROUP
+from .outputs import output_store, store_run, parse_range_params
+from .middleware import auth_rejected
+from .drain import drain_coordinator, restored_rooms
+from .oplog import oplog_store
+from .awareness import AwarenessView, awareness_registry, clean_state
+from .spectators import spectator_relay, watch_group
+from .recorder import traffic_recorder
+from .search import search_index
 
 logger = logging.getLogger(__name__)
 logger = logging.getLogger('editor')
 
+# (room_id, run hash) -> {'requested_by': [...]} for compiles currently executing in this process
+_inflight_compiles = {}
+
+# message types where only the latest frame matters; over-limit frames are merged instead of dropped
+MERGEABLE_MESSAGES = {'code_update', 'cursor_move', 'awareness', 'viewport'}
+
+# message types that change room state; refused once a drain has started so the snapshot stays complete
+STATE_MESSAGES = {'code_update', 'language_change', 'kick_user', 'lock_room', 'delete_room'}
+
+
+def output_chunk_reply(data):
+    """`output_chunk` answer (or error) for a `fetch_output` request."""
+    try:
+        params = parse_range_params(data)
+    except (TypeError, ValueError):
+        return {'type': 'error', 'message': 'invalid_range'}
+
+    chunk = output_store.read(data.get('run_id'), **params)
+    if chunk is None:
+        return {'type': 'error', 'message': 'run_not_found', 'run_id': data.get('run_id')}
+    return {'type': 'output_chunk', **chunk}
+
+
+def frame_type(data):
+    """A frame's `type`, or None (an unknown type) when it isn't a string.
+
+    Checked before the type is used as a key for rate limits and merging.
+    """
+    message_type = data.get('type') if isinstance(data, dict) else None
+    return message_type if isinstance(message_type, str) else None
+
+
 class CodeEditorConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.room_id = self.scope.get('url_route', {}).get('kwargs', {}).get('room_id')
         self.room_group_name = f'code_{self.room_id}' if self.room_id else None
         self.username = None
+        # identity verified by JWTAuthMiddleware; when present it overrides client-sent user fields
+        self.identity = self.scope.get('auth_identity')
+        # owner cached per connection, kept current by user_joined/owner_changed events
+        self.room_owner = None
+        self.owner_known = False
+        self.rate_limiter = ConnectionRateLimiter(self.room_id)
+        self.pending_frames = {}
+        self.flush_tasks = {}
+        self.rate_limit_notified = {}
+        self.awareness_view = AwarenessView()
+        self.awareness_summary_task = None
+        self.traffic_connection = None
+
+        if auth_rejected(self.scope):
+            logger.info("WebSocket rejected (authentication): room=%s", self.room_id)
+            await self.close(code=4401)
+            return
 
         try:
             logger.info("WebSocket connect requested: room=%s channel=%s", self.room_id, getattr(self, 'channel_name', None))
             # Join channel layer group for room
             await self.channel_layer.group_add(self.room_group_name, self.channel_name)
             await self.accept()
+            drain_coordinator.register(self)
+            self.traffic_connection = traffic_recorder.opened(self.room_id, self.identity and self.identity['username'])
             logger.info("WebSocket accepted: room=%s channel=%s group=%s", self.room_id, self.channel_name, self.room_group_name)
         except Exception:
             logger.exception("Error during WebSocket connect for room %s", self.room_id)
@@ -38,13 +106,30 @@ class CodeEditorConsumer(AsyncWebsocketConsumer):
             getattr(self, 'username', None)
         )
 
+        for task in list(getattr(self, 'flush_tasks', {}).values()):
+            task.cancel()
+        if getattr(self, 'awareness_summary_task', None):
+            self.awareness_summary_task.cancel()
+        drain_coordinator.unregister(self)
+        if getattr(self, 'traffic_connection', None):
+            traffic_recorder.closed(self.traffic_connection, self.room_id)
+
         # Never let disconnect path crash the consumer; that can look like random disconnect loops.
         try:
-            if getattr(self, 'username', None) and self.room_group_name:
+            # while draining, presence was already cleared in bulk and ownership must survive the restart
+            if getattr(self, 'username', None) and self.room_group_name and not drain_coordinator.draining:
                 await self.remove_active_user()
                 # If the leaving user was the owner, transfer ownership
-                await self.transfer_owner_if_needed(self.username)
+                new_owner = await self.transfer_owner_if_needed(self.username)
+                await self.broadcast_owner_if_changed(new_owner)
                 active_users = await self.get_active_users()
+                lobby_broadcaster.publish(self.channel_layer, self.room_id, user_count=len(active_users))
+                if awareness_registry.remove(self.room_id, self.username):
+                    await self.channel_layer.group_send(self.room_group_name, {
+                        'type': 'awareness_delta',
+                        'user': self.username,
+                        'removed': True,
+                    })
 
                 # Notify room that user left
                 await self.channel_layer.group_send(
@@ -66,9 +151,39 @@ class CodeEditorConsumer(AsyncWebsocketConsumer):
 
 
     async def receive(self, text_data):
+        if self.traffic_connection:
+            traffic_recorder.frame(self.traffic_connection, self.room_id, text_data)
+
         data = json.loads(text_data)
-        message_type = data.get('type')
+        message_type = frame_type(data)
+
+        if message_type in STATE_MESSAGES and drain_coordinator.draining:
+            await self.send(text_data=json.dumps({'type': 'error', 'message': 'draining', 'message_type': message_type}))
+            return
+
+        # a newer frame replaces one that is already waiting for rate-limit tokens
+        if message_type in self.pending_frames:
+            self.pending_frames[message_type] = data
+            rejections[message_type] += 1
+            return
+
+        # rate limits are applied before any database or executor work
+        retry_after = self.rate_limiter.check(message_type)
+        if retry_after:
+            await self.handle_rate_limited(message_type, data, retry_after)
+            return
+
+        await self.apply_message(message_type, data)
+
+    async def apply_message(self, message_type, data):
+        if message_type in STATE_MESSAGES:
+            # a drain waits for these before it snapshots the rooms
+            with drain_coordinator.applying():
+                await self.dispatch_message(message_type, data)
+        else:
+            await self.dispatch_message(message_type, data)
 
+    async def dispatch_message(self, message_type, data):
         if message_type == 'join':
             await self.handle_join(data)
         elif message_type == 'code_update':
@@ -79,49 +194,206 @@ class CodeEditorConsumer(AsyncWebsocketConsumer):
             await self.handle_compile(data)
         elif message_type == 'clear_output':
             await self.handle_clear_output(data)
-        elif message_type == 'cursor_move':
-            await self.handle_cursor_move(data)
+        elif message_type in ('awareness', 'cursor_move'):
+            await self.handle_awareness(data)
+        elif message_type == 'viewport':
+            await self.handle_viewport(data)
         elif message_type == 'kick_user':
             await self.handle_kick_user(data)
         elif message_type == 'lock_room':
             await self.handle_lock_room(data)
         elif message_type == 'delete_room':
             await self.handle_delete_room(data)
+        elif message_type == 'fetch_output':
+            await self.handle_fetch_output(data)
         else:
             # unknown message type - ignore
             logger.debug("Unknown message type received: %s", message_type)
 
+    async def handle_rate_limited(self, message_type, data, retry_after):
+        if message_type in MERGEABLE_MESSAGES:
+            # only the latest frame matters, keep it and send it once tokens are available
+            self.pending_frames[message_type] = data
+            self.flush_tasks[message_type] = asyncio.create_task(
+                self.flush_pending_frame(message_type, retry_after)
+            )
+            action = 'merged'
+        else:
+            action = 'dropped'
+
+        logger.debug("Rate limited %s from %s in room %s (%s)", message_type, self.username, self.room_id, action)
+
+        # report at most once per second per message type so the error frames don't become a flood themselves
+        now = time.monotonic()
+        if now - self.rate_limit_notified.get(message_type, 0) >= 1:
+            self.rate_limit_notified[message_type] = now
+            await self.send(text_data=json.dumps({
+                'type': 'error',
+                'message': 'rate_limited',
+                'message_type': message_type,
+                'action': action,
+                'retry_after': round(retry_after, 3),
+            }))
+
+    async def flush_pending_frame(self, message_type, delay):
+        try:
+            while True:
+                await asyncio.sleep(delay)
+                delay = self.rate_limiter.check(message_type)
+                if not delay:
+                    break
+        finally:
+            # Once the frame is taken this task is no longer cancellable by flush_pending_frames;
+            # a drain waits for it through applying() instead, and a newer frame starts its own flush.
+            # A task that flush_pending_frames already replaced leaves the newer one's frame alone.
+            data = None
+            if self.flush_tasks.get(message_type) is asyncio.current_task():
+                del self.flush_tasks[message_type]
+                data = self.pending_frames.pop(message_type, None)
+
+        if data is None:
+            return
+        try:
+            await self.apply_message(message_type, data)
+        except Exception:
+            logger.exception("Error flushing rate-limited %s in room %s", message_type, self.room_id)
+
+    def get_sender(self, data):
+        # authenticated sockets can't speak for anyone else
+        if self.identity:
+            return self.username
+        return data.get('user', self.username)
+
+    def set_room_owner(self, owner):
+        self.room_owner = owner
+        self.owner_known = True
+
+    async def is_room_owner(self):
+        # owner-only actions need the JWT-verified identity; a client-sent `user` proves nothing
+        if not self.identity:
+            return False
+        if not self.owner_known:
+            self.set_room_owner(await self.get_room_owner())
+        return self.room_owner == self.identity['username']
+
+    async def broadcast_owner_if_changed(self, new_owner):
+        if self.owner_known and new_owner == self.room_owner:
+            return
+        restored_rooms.discard(self.room_id)
+        await self.channel_layer.group_send(self.room_group_name, {
+            'type': 'owner_changed',   # -> owner_changed()
+            'owner': new_owner,
+        })
+
+    async def flush_pending_frames(self):
+        # deliver merged frames right away instead of waiting for rate-limit tokens
+        for task in list(self.flush_tasks.values()):
+            task.cancel()
+        pending, self.pending_frames = self.pending_frames, {}
+        for message_type, data in pending.items():
+            await self.apply_message(message_type, data)
+
+    async def send_reconnect(self, retry_after_ms):
+        try:
+            await self.send(text_data=json.dumps({'type': 'reconnect', 'retry_after_ms': retry_after_ms}))
+        finally:
+            # 1012: service restart
+            await self.close(code=1012)
+
     # ----------------------------
     # Handlers for incoming client events
     # ----------------------------
     async def handle_join(self, data):
-        self.username = data.get('username')
+        self.username = self.identity['username'] if self.identity else data.get('username')
+        if not self.identity and await self.is_registered_username(self.username):
+            # an account's name is only taken with that account's token
+            await self.send(text_data=json.dumps({'type': 'error', 'message': 'username_reserved'}))
+            await self.close(code=4403)
+            return
+
+        # right after a restart the drain snapshot answers the first joins without the usual lookups
+        restored = restored_rooms.get(self.room_id)
+        if restored and not restored['owner']:
+            # add_active_user may hand this user the ownership, so the database has to decide
+            restored = None
 
         # check locked state before joining
-        locked, owner = await self.get_room_locked_and_owner()
-        if locked and owner and owner != self.username:
-            # room is locked and this user is not the owner
+        if restored:
+            locked, owner = restored['locked'], restored['owner']
+        else:
+            locked, owner = await self.get_room_locked_and_owner()
+        if locked and owner and not (self.identity and self.identity['username'] == owner):
+            # room is locked and this socket hasn't proven it is the owner
             await self.send(text_data=json.dumps({'type': 'room_locked'}))
             await self.close()
             return
 
-        await self.add_active_user()
-
-        code_data = await self.get_current_code()
-        active_users = await self.get_active_users()
+        if restored:
+            # only the first join trusts the snapshot; later joins read the database again
+            restored_rooms.discard(self.room_id)
+        room_pk = restored['pk'] if restored else None
+        room_created = await self.add_active_user(room_pk)
+
+        # a reconnecting client that still has a buffered revision only needs what it missed
+        missed = None
+        if data.get('last_revision') is not None:
+            missed = room_history.since(self.room_id, data.get('epoch'), data.get('last_revision'))
+
+        # read the revision before the snapshot so the snapshot is never older than it
+        revision = room_history.revision(self.room_id)
+        code_data = None
+        if missed is None:
+            if restored and restored['code'] is not None:
+                code_data = {'code': restored['code'], 'language': restored['language']}
+            else:
+                code_data = await self.get_current_code()
+        active_users = await self.get_active_users(room_pk)
 
         # room info
-        room_locked, room_owner = await self.get_room_locked_and_owner()
-
-        # Send init only to joining socket
-        await self.send(text_data=json.dumps({
-            'type': 'init',
-            'code': code_data['code'],
-            'language': code_data['language'],
-            'users': active_users,
-            'owner': room_owner,
-            'locked': room_locked,
-        }))
+        if restored:
+            room_locked, room_owner = locked, owner
+        else:
+            room_locked, room_owner = await self.get_room_locked_and_owner()
+        self.set_room_owner(room_owner)
+
+        if room_created:
+            lobby_broadcaster.publish(
+                self.channel_layer, self.room_id, op='created',
+                name='', owner=room_owner, locked=room_locked, user_count=len(active_users),
+            )
+        else:
+            lobby_broadcaster.publish(self.channel_layer, self.room_id, user_count=len(active_users))
+
+        if missed is not None:
+            await self.send(text_data=json.dumps({
+                'type': 'resume',
+                'updates': missed,
+                'users': active_users,
+                'owner': room_owner,
+                'locked': room_locked,
+                'revision': revision,
+                'epoch': room_history.epoch,
+            }))
+        else:
+            # Send init only to joining socket
+            await self.send(text_data=json.dumps({
+                'type': 'init',
+                'code': code_data['code'],
+                'language': code_data['language'],
+                'users': active_users,
+                'owner': room_owner,
+                'locked': room_locked,
+                'revision': revision,
+                'epoch': room_history.epoch,
+                'spectators': await spectator_relay.count(self.room_id),
+                'languages': await executor_client.languages(),
+            }))
+
+        # everyone else's caret, name and color as known to this process
+        others = awareness_registry.snapshot(self.room_id)
+        others.pop(self.username, None)
+        if others:
+            await self.send(text_data=json.dumps({'type': 'awareness_snapshot', 'users': others}))
 
         # Broadcast join to everyone in room
         await self.channel_layer.group_send(
@@ -129,16 +401,25 @@ class CodeEditorConsumer(AsyncWebsocketConsumer):
             {
                 'type': 'user_joined',   # -> user_joined()
                 'username': self.username,
-                'users': active_users
+                'users': active_users,
+                'owner': room_owner,
             }
         )
 
     async def handle_code_update(self, data):
         code = data.get('code', '')
-        username = data.get('user', self.username)
+        username = self.get_sender(data)
         language = data.get('language')
 
         await self.save_code(code, language)
+        restored_rooms.discard(self.room_id)
+
+        revision = room_history.record(self.room_id, {
+            'type': 'code_update',
+            'code': code,
+            'user': username,
+            'language': language,
+        })
 
         await self.channel_layer.group_send(
             self.room_group_name,
@@ -146,16 +427,28 @@ class CodeEditorConsumer(AsyncWebsocketConsumer):
                 'type': 'code_changed',   # -> code_changed()
                 'code': code,
                 'user': username,
-                'language': language
+                'language': language,
+                'revision': revision,
             }
         )
 
+        diagnostics_scheduler.schedule(self.channel_layer, self.room_group_name, self.room_id, revision, code, language)
+        spectator_relay.document_changed(self.channel_layer, self.room_id, code, language, revision)
+
     async def handle_language_change(self, data):
         language = data.get('language')
         template_code = data.get('code', '')
-        username = data.get('user', self.username)
+        username = self.get_sender(data)
 
         await self.update_language(language, template_code)
+        restored_rooms.discard(self.room_id)
+
+        revision = room_history.record(self.room_id, {
+            'type': 'language_change',
+            'language': language,
+            'code': template_code,
+            'user': username,
+        })
 
         await self.channel_layer.group_send(
             self.room_group_name,
@@ -163,68 +456,164 @@ class CodeEditorConsumer(AsyncWebsocketConsumer):
                 'type': 'language_changed',   # -> language_changed()
                 'language': language,
                 'code': template_code,
-                'user': username
+                'user': username,
+                'revision': revision,
             }
         )
 
+        diagnostics_scheduler.schedule(self.channel_layer, self.room_group_name, self.room_id, revision, template_code, language)
+        spectator_relay.document_changed(self.channel_layer, self.room_id, template_code, language, revision)
+
     async def handle_compile(self, data):
         language = data.get('language')
-        code = data.get('code', '')
-        username = data.get('user', self.username)
+        code = data.get('code') or ''
+        username = self.get_sender(data)
+        stdin = data.get('stdin') or ''
+        cases = data.get('cases')
+
+        # checked before compile_key hashes them
+        if not all(isinstance(value, str) for value in (code, stdin)) or not isinstance(language, (str, type(None))):
+            await self.send(text_data=json.dumps({'type': 'error', 'message': 'invalid_compile'}))
+            return
+
+        if cases is not None:
+            error = self.validate_cases(cases)
+            if error:
+                await self.send(text_data=json.dumps(error))
+                return
+
+        # single-flight: identical runs already in progress in this room absorb the request
+        key = self.compile_key(language, code, stdin, cases)
+        run = _inflight_compiles.get(key)
+        if run is not None:
+            if username not in run['requested_by']:
+                run['requested_by'].append(username)
+            logger.debug("Compile attached to in-flight run: room=%s user=%s", self.room_id, username)
+            return
+
+        run = {'requested_by': [username]}
+        _inflight_compiles[key] = run
+        try:
+            if cases is not None:
+                result = await self.run_compile_cases(code, language, username, cases)
+            else:
+                result = await self.run_compile(code, language, username, stdin)
+        finally:
+            _inflight_compiles.pop(key, None)
 
-        executor = CodeExecutor()
+        # full output stays server-side, the room only gets a head/tail preview
+        result = store_run(self.room_id, result)
 
+        event = {
+            'type': 'compile_result',   # -> compile_result()
+            'language': language,
+            'user': username,
+            'requested_by': run['requested_by'],
+            **result,
+        }
+        event['revision'] = room_history.record(self.room_id, self.compile_message(event))
+
+        # BROADCAST compile result to whole room so everyone sees output
+        await self.channel_layer.group_send(self.room_group_name, event)
+        await self.channel_layer.group_send(watch_group(self.room_id), event)
+
+    def compile_key(self, language, code, stdin, cases):
+        digest = hashlib.sha256()
+        for part in (language or '', code or '', stdin, json.dumps(cases, sort_keys=True)):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return (self.room_id, digest.hexdigest())
+
+    def validate_cases(self, cases):
+        max_cases = getattr(settings, 'EXECUTOR_MAX_CASES', 20)
+        if not isinstance(cases, list) or not cases:
+            return {'type': 'error', 'message': 'invalid_cases'}
+        if len(cases) > max_cases:
+            return {'type': 'error', 'message': 'too_many_cases', 'limit': max_cases}
+        return None
+
+    async def run_compile(self, code, language, username, stdin):
         try:
-            # execute on thread pool to avoid blocking event loop
-            output = await asyncio.to_thread(executor.execute, code, language)
+            # executor daemon when configured, else a thread in this process
+            output = await executor_client.execute(code, language, stdin)
         except Exception as e:
             logger.exception("Error executing code for user %s", username)
             output = f"Execution Error: {str(e)}"
 
-        # BROADCAST compile result to whole room so everyone sees output
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'compile_result',   # -> compile_result()
-                'output': output,
-                'language': language,
-                'user': username
-            }
-        )
+        return {'output': output}
+
+    async def run_compile_cases(self, code, language, username, cases):
+        max_case_workers = getattr(settings, 'EXECUTOR_CASE_CONCURRENCY', None)
+
+        try:
+            result = await executor_client.execute_cases(code, language, cases, max_case_workers)
+        except Exception as e:
+            logger.exception("Error executing test cases for user %s", username)
+            result = {'error': f"Execution Error: {str(e)}", 'compile_ms': 0, 'cases': []}
+
+        results = result['cases']
+        passed = sum(1 for case in results if case['passed'])
+        checked = sum(1 for case in results if case['passed'] is not None)
+        if result['error']:
+            output = result['error']
+        else:
+            output = f"Ran {len(results)} test case(s)"
+            if checked:
+                output += f": {passed}/{checked} passed"
+
+        return {'output': output, 'cases': results, 'compile_ms': result['compile_ms']}
 
     async def handle_clear_output(self, data):
-        username = data.get('user', self.username)
+        username = self.get_sender(data)
+
+        revision = room_history.record(self.room_id, {'type': 'output_cleared', 'user': username})
 
         # Broadcast output cleared to everyone in the room
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'output_cleared',   # -> output_cleared()
-                'user': username
-            }
-        )
+        event = {
+            'type': 'output_cleared',   # -> output_cleared()
+            'user': username,
+            'revision': revision,
+        }
+        await self.channel_layer.group_send(self.room_group_name, event)
+        await self.channel_layer.group_send(watch_group(self.room_id), event)
 
-    async def handle_cursor_move(self, data):
-        cursor = data.get('cursor')
-        username = data.get('user', self.username)
+    async def handle_awareness(self, data):
+        # `cursor_move` is the older name; its `cursor` object is read as the state
+        if not self.username:
+            return
+        state = clean_state(data.get('state', data.get('cursor')))
+        changes = awareness_registry.update(self.room_id, self.username, state)
+        if not changes:
+            return
 
-        # Broadcast cursor position to the room
+        # only changed fields travel; `line` rides along so receivers can filter by viewport
         await self.channel_layer.group_send(
             self.room_group_name,
             {
-                'type': 'cursor_moved',
-                'user': username,
-                'cursor': cursor,
+                'type': 'awareness_delta',   # -> awareness_delta()
+                'user': self.username,
+                'changes': changes,
+                'line': awareness_registry.get(self.room_id, self.username).get('line'),
             }
         )
 
+    async def handle_viewport(self, data):
+        first_line, last_line = data.get('from_line'), data.get('to_line')
+        if not all(isinstance(value, int) and not isinstance(value, bool) for value in (first_line, last_line)):
+            self.awareness_view.viewport = None
+            return
+        self.awareness_view.set_viewport(first_line, last_line)
+
+    async def handle_fetch_output(self, data):
+        # reply only to the requesting socket
+        await self.send(text_data=json.dumps(output_chunk_reply(data)))
+
     async def handle_kick_user(self, data):
         target = data.get('target')
-        requester = data.get('user', self.username)
+        requester = self.get_sender(data)
 
         # Only owner can kick
-        owner = await self.get_room_owner()
-        if owner != requester:
+        if not await self.is_room_owner():
             await self.send(text_data=json.dumps({'type': 'error', 'message': 'permission_denied'}))
             return
 
@@ -240,8 +629,10 @@ class CodeEditorConsumer(AsyncWebsocketConsumer):
         # remove from active users list and broadcast updated list
         await self.remove_user_by_name(target)
         # if kicked user was owner, transfer ownership
-        await self.transfer_owner_if_needed(target)
+        new_owner = await self.transfer_owner_if_needed(target)
+        await self.broadcast_owner_if_changed(new_owner)
         users = await self.get_active_users()
+        lobby_broadcaster.publish(self.channel_layer, self.room_id, user_count=len(users))
         await self.channel_layer.group_send(self.room_group_name, {
             'type': 'user_kicked',
             'target': target,
@@ -249,46 +640,75 @@ class CodeEditorConsumer(AsyncWebsocketConsumer):
         })
 
     async def handle_lock_room(self, data):
-        requester = data.get('user', self.username)
+        requester = self.get_sender(data)
         lock = data.get('lock', True)
 
-        owner = await self.get_room_owner()
-        if owner != requester:
+        if not await self.is_room_owner():
             await self.send(text_data=json.dumps({'type': 'error', 'message': 'permission_denied'}))
             return
 
         await self.set_room_locked(lock)
+        restored_rooms.discard(self.room_id)
+        lobby_broadcaster.publish(self.channel_layer, self.room_id, locked=bool(lock))
+        revision = room_history.record(self.room_id, {'type': 'room_locked', 'locked': lock, 'user': requester})
         await self.channel_layer.group_send(self.room_group_name, {
             'type': 'room_locked_state',
             'locked': lock,
             'user': requester,
+            'revision': revision,
+        })
+        # spectators other than the owner are sent away from a locked room
+        await self.channel_layer.group_send(watch_group(self.room_id), {
+            'type': 'room_locked_state',
+            'locked': lock,
+            'owner': self.room_owner,
         })
 
     async def handle_delete_room(self, data):
-        requester = data.get('user', self.username)
-        owner = await self.get_room_owner()
-        if owner != requester:
+        requester = self.get_sender(data)
+        if not await self.is_room_owner():
             await self.send(text_data=json.dumps({'type': 'error', 'message': 'permission_denied'}))
             return
 
         # notify clients the room is being deleted
-        await self.channel_layer.group_send(self.room_group_name, {
+        event = {
             'type': 'room_deleted',
             'user': requester,
-        })
+        }
+        await self.channel_layer.group_send(self.room_group_name, event)
+        await self.channel_layer.group_send(watch_group(self.room_id), event)
 
         # delete from DB
         await self.delete_room_db()
+        lobby_broadcaster.publish(self.channel_layer, self.room_id, op='deleted')
+        room_history.discard(self.room_id)
+        restored_rooms.discard(self.room_id)
+        awareness_registry.discard(self.room_id)
+        spectator_relay.discard(self.room_id)
+        diagnostics_scheduler.discard(self.room_id)
+        output_store.discard_room(self.room_id)
 
     # ----------------------------
     # Group event handlers (called by Channels when group_send is used)
     # All of these send JSON messages to the WebSocket clients.
     # ----------------------------
     async def user_joined(self, event):
-        await self.send(text_data=json.dumps({
+        if 'owner' in event:
+            self.set_room_owner(event['owner'])
+        message = {
             'type': 'user_joined',
             'username': event.get('username'),
-            'users': event.get('users', [])
+            'users': event.get('users', []),
+        }
+        if 'owner' in event:
+            message['owner'] = event['owner']
+        await self.send(text_data=json.dumps(message))
+
+    async def owner_changed(self, event):
+        self.set_room_owner(event.get('owner'))
+        await self.send(text_data=json.dumps({
+            'type': 'owner_changed',
+            'owner': event.get('owner'),
         }))
 
     async def user_left(self, event):
@@ -305,12 +725,29 @@ class CodeEditorConsumer(AsyncWebsocketConsumer):
             'users': event.get('users', [])
         }))
 
-    async def cursor_moved(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'cursor_move',
-            'user': event.get('user'),
-            'cursor': event.get('cursor')
-        }))
+    async def awareness_delta(self, event):
+        if event.get('user') == self.username:
+            return
+        message = self.awareness_view.route(
+            event.get('user'), event.get('changes', {}), event.get('line'), removed=event.get('removed', False)
+        )
+        if message is not None:
+            await self.send(text_data=json.dumps(message))
+        elif self.awareness_summary_task is None:
+            self.awareness_summary_task = asyncio.create_task(self.send_awareness_summary())
+
+    async def send_awareness_summary(self):
+        try:
+            await asyncio.sleep(getattr(settings, 'AWARENESS_SUMMARY_INTERVAL', 1.0))
+            summary = self.awareness_view.take_summary()
+            if summary is not None:
+                await self.send(text_data=json.dumps(summary))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Error sending awareness summary in room %s", self.room_id)
+        finally:
+            self.awareness_summary_task = None
 
     async def code_changed(self, event):
         # send code updates to all clients (clients can ignore if user == self.username)
@@ -318,7 +755,8 @@ class CodeEditorConsumer(AsyncWebsocketConsumer):
             'type': 'code_update',
             'code': event.get('code', ''),
             'user': event.get('user'),
-            'language': event.get('language')
+            'language': event.get('language'),
+            'revision': event.get('revision'),
         }))
 
     async def language_changed(self, event):
@@ -326,29 +764,57 @@ class CodeEditorConsumer(AsyncWebsocketConsumer):
             'type': 'language_change',
             'language': event.get('language'),
             'code': event.get('code', ''),
-            'user': event.get('user')
+            'user': event.get('user'),
+            'revision': event.get('revision'),
         }))
 
     async def compile_result(self, event):
         # broadcasted compile result - everyone receives
-        await self.send(text_data=json.dumps({
+        message = self.compile_message(event)
+        message['revision'] = event.get('revision')
+        await self.send(text_data=json.dumps(message))
+
+    @staticmethod
+    def compile_message(event):
+        message = {
             'type': 'compile_result',
             'output': event.get('output', ''),
             'language': event.get('language'),
-            'user': event.get('user')
+            'user': event.get('user'),
+            'requested_by': event.get('requested_by', [event.get('user')]),
+        }
+        for field in ('run_id', 'truncated', 'total_bytes', 'total_lines'):
+            if field in event:
+                message[field] = event[field]
+        if 'cases' in event:
+            message['cases'] = event['cases']
+            message['compile_ms'] = event.get('compile_ms')
+        return message
+
+    async def spectator_count(self, event):
+        await self.send(text_data=json.dumps({'type': 'spectator_count', 'count': event.get('count', 0)}))
+
+    async def diagnostics_ready(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'diagnostics',
+            'language': event.get('language'),
+            'revision': event.get('revision'),
+            'diagnostics': event.get('diagnostics', []),
         }))
 
     async def output_cleared(self, event):
         await self.send(text_data=json.dumps({
             'type': 'output_cleared',
-            'user': event.get('user')
+            'user': event.get('user'),
+            'revision': event.get('revision'),
         }))
 
     async def room_locked_state(self, event):
         await self.send(text_data=json.dumps({
             'type': 'room_locked',
             'locked': event.get('locked', False),
-            'user': event.get('user')
+            'user': event.get('user'),
+            'revision': event.get('revision'),
         }))
 
     async def room_deleted(self, event):
@@ -369,7 +835,23 @@ class CodeEditorConsumer(AsyncWebsocketConsumer):
     # Database helpers (run in thread pool via database_sync_to_async)
     # ----------------------------
     @database_sync_to_async
-    def add_active_user(self):
+    def is_registered_username(self, username):
+        if not isinstance(username, str) or not username:
+            return False
+        User = get_user_model()
+        return User.objects.filter(**{User.USERNAME_FIELD: username}).exists()
+
+    @database_sync_to_async
+    def add_active_user(self, room_pk=None):
+        if room_pk is not None:
+            # room known to exist and to have an owner (restored from a drain snapshot)
+            ActiveUser.objects.update_or_create(
+                room_id=room_pk,
+                username=self.username,
+                defaults={'channel_name': self.channel_name}
+            )
+            return False
+
         room, created = Room.objects.get_or_create(room_id=self.room_id)
         # set owner to first user if room has no owner
         if (created or not room.owner_username) and self.username:
@@ -381,6 +863,7 @@ class CodeEditorConsumer(AsyncWebsocketConsumer):
             username=self.username,
             defaults={'channel_name': self.channel_name}
         )
+        return created
 
     @database_sync_to_async
     def remove_active_user(self):
@@ -436,7 +919,9 @@ class CodeEditorConsumer(AsyncWebsocketConsumer):
     @database_sync_to_async
     def delete_room_db(self):
         try:
+            search_index.remove([self.room_id])
             Room.objects.filter(room_id=self.room_id).delete()
+            oplog_store.discard(self.room_id)
         except Exception:
             pass
 
@@ -460,7 +945,9 @@ class CodeEditorConsumer(AsyncWebsocketConsumer):
             return None
 
     @database_sync_to_async
-    def get_active_users(self):
+    def get_active_users(self, room_pk=None):
+        if room_pk is not None:
+            return list(ActiveUser.objects.filter(room_id=room_pk).values_list('username', flat=True))
         try:
             room = Room.objects.get(room_id=self.room_id)
             return list(room.active_users.values_list('username', flat=True))
@@ -469,14 +956,17 @@ class CodeEditorConsumer(AsyncWebsocketConsumer):
 
     @database_sync_to_async
     def get_current_code(self):
+        defaults = {
+            'code': '// Welcome to CoDe KnOt! Start coding together.',
+            'language': 'javascript'
+        }
+        if oplog_store.enabled:
+            return oplog_store.read(self.room_id, defaults=defaults)
+
         room, _ = Room.objects.get_or_create(room_id=self.room_id)
-        session, _ = CodeSession.objects.get_or_create(
-            room=room,
-            defaults={
-                'code': '// Welcome to CoDe KnOt! Start coding together.',
-                'language': 'javascript'
-            }
-        )
+        session, _ = CodeSession.objects.get_or_create(room=room, defaults=defaults)
+        if session.storage == CodeSession.STORAGE_OPLOG:
+            oplog_store.export(session)
         return {
             'code': session.code,
             'language': session.language
@@ -484,8 +974,17 @@ class CodeEditorConsumer(AsyncWebsocketConsumer):
 
     @database_sync_to_async
     def save_code(self, code, language=None):
+        # indexed in batches a few seconds later, not on every keystroke
+        search_index.mark(self.room_id)
+        if oplog_store.enabled:
+            # appends only the changed span instead of rewriting the whole document
+            oplog_store.write(self.room_id, code, language)
+            return
+
         room, _ = Room.objects.get_or_create(room_id=self.room_id)
         session, _ = CodeSession.objects.get_or_create(room=room)
+        if session.storage == CodeSession.STORAGE_OPLOG:
+            oplog_store.export(session)
         session.code = code
         if language:
             session.language = language
@@ -493,9 +992,225 @@ class CodeEditorConsumer(AsyncWebsocketConsumer):
 
     @database_sync_to_async
     def update_language(self, language, code=None):
+        search_index.mark(self.room_id)
+        if oplog_store.enabled:
+            log = oplog_store.open(self.room_id)
+            oplog_store.write(self.room_id, log.text if code is None else code, language)
+            return
+
         room, _ = Room.objects.get_or_create(room_id=self.room_id)
         session, _ = CodeSession.objects.get_or_create(room=room)
+        if session.storage == CodeSession.STORAGE_OPLOG:
+            oplog_store.export(session)
         session.language = language
         if code is not None:
             session.code = code
-        session.save()
\ No newline at end of file
+        session.save()
+
+
+class SpectatorConsumer(AsyncWebsocketConsumer):
+    """Read-only view of a room: throttled document snapshots, compile output and the viewer count.
+
+    Spectators are not room members. They get no ActiveUser row, no
+    presence or awareness traffic, and nothing they send reaches the room.
+    """
+
+    async def connect(self):
+        self.room_id = self.scope.get('url_route', {}).get('kwargs', {}).get('room_id')
+        self.group_name = watch_group(self.room_id)
+        self.identity = self.scope.get('auth_identity')
+        self.rate_limiter = ConnectionRateLimiter(self.room_id)
+        self.error_notified = 0
+        self.watching = False
+
+        if auth_rejected(self.scope):
+            await self.close(code=4401)
+            return
+
+        # a locked room is only watchable by its owner, and only with a verified identity
+        locked, owner = await self.get_room_locked_and_owner()
+        if locked and not self.is_owner(owner):
+            logger.info("Spectator rejected (room locked): room=%s", self.room_id)
+            await self.close(code=4403)
+            return
+
+        try:
+            # join before reading the document so no snapshot can fall between the two
+            await self.channel_layer.group_add(self.group_name, self.channel_name)
+            await self.accept()
+
+            document = spectator_relay.latest.get(self.room_id)
+            if document is None:
+                document = await self.get_document()
+            if document is None:
+                await self.send(text_data=json.dumps({'type': 'error', 'message': 'room_not_found'}))
+                await self.close(code=4404)
+                return
+
+            await spectator_relay.joined(self.channel_layer, self.room_id)
+            self.watching = True
+            await self.send(text_data=json.dumps({
+                'type': 'init',
+                'spectator': True,
+                'code': document['code'],
+                'language': document['language'],
+                'revision': document['revision'],
+                'spectators': await spectator_relay.count(self.room_id),
+            }))
+        except Exception:
+            logger.exception("Error during spectator WebSocket connect for room %s", self.room_id)
+            await self.close()
+
+    async def disconnect(self, close_code):
+        if getattr(self, 'watching', False):
+            self.watching = False
+            try:
+                await spectator_relay.left(self.channel_layer, self.room_id)
+            except Exception:
+                logger.exception("Error updating spectator count for room %s", self.room_id)
+        try:
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        except Exception:
+            logger.exception("Error discarding channel from spectator group: %s", getattr(self, 'group_name', None))
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            data = json.loads(text_data or '')
+        except ValueError:
+            return
+        message_type = frame_type(data)
+
+        retry_after = self.rate_limiter.check(message_type)
+        if message_type == 'fetch_output' and not retry_after:
+            await self.send(text_data=json.dumps(output_chunk_reply(data)))
+            return
+
+        # everything else is dropped; say so at most once per second
+        now = time.monotonic()
+        if now - self.error_notified >= 1:
+            self.error_notified = now
+            await self.send(text_data=json.dumps({
+                'type': 'error',
+                'message': 'rate_limited' if retry_after else 'read_only',
+                'message_type': message_type,
+            }))
+
+    async def spectator_snapshot(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'snapshot',
+            'code': event.get('code', ''),
+            'language': event.get('language'),
+            'revision': event.get('revision'),
+        }))
+
+    async def compile_result(self, event):
+        message = CodeEditorConsumer.compile_message(event)
+        message['revision'] = event.get('revision')
+        await self.send(text_data=json.dumps(message))
+
+    async def output_cleared(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'output_cleared',
+            'user': event.get('user'),
+            'revision': event.get('revision'),
+        }))
+
+    async def spectator_count(self, event):
+        await self.send(text_data=json.dumps({'type': 'spectator_count', 'count': event.get('count', 0)}))
+
+    async def room_locked_state(self, event):
+        if not event.get('locked') or self.is_owner(event.get('owner')):
+            return
+        try:
+            await self.send(text_data=json.dumps({'type': 'room_locked', 'locked': True}))
+        finally:
+            await self.close(code=4403)
+
+    async def room_deleted(self, event):
+        try:
+            await self.send(text_data=json.dumps({'type': 'room_deleted', 'user': event.get('user')}))
+        finally:
+            await self.close()
+
+    def is_owner(self, owner):
+        return bool(owner) and bool(self.identity) and self.identity['username'] == owner
+
+    @database_sync_to_async
+    def get_room_locked_and_owner(self):
+        room = Room.objects.filter(room_id=self.room_id).values('locked', 'owner_username').first()
+        if room is None:
+            return False, None
+        return room['locked'], room['owner_username']
+
+    @database_sync_to_async
+    def get_document(self):
+        # unlike joining as an editor, watching never creates the room
+        room = Room.objects.filter(room_id=self.room_id).first()
+        if room is None:
+            return None
+        session = CodeSession.objects.filter(room=room).select_related('room').first()
+        if session is None:
+            document = {'code': '', 'language': 'javascript'}
+        else:
+            document = oplog_store.document(session)
+        return dict(document, revision=room_history.revision(self.room_id))
+
+
+class LobbyConsumer(AsyncWebsocketConsumer):
+    """Streams room occupancy: one snapshot on connect, then batched deltas."""
+
+    async def connect(self):
+        if auth_rejected(self.scope):
+            await self.close(code=4401)
+            return
+
+        try:
+            # join before the snapshot so no change can fall between the two
+            await self.channel_layer.group_add(LOBBY_GROUP, self.channel_name)
+            lobby_broadcaster.subscribers += 1
+            self.subscribed = True
+            await self.accept()
+
+            rooms = await self.get_rooms()
+            await self.send(text_data=json.dumps({'type': 'snapshot', 'rooms': rooms}))
+        except Exception:
+            logger.exception("Error during lobby WebSocket connect")
+            await self.close()
+
+    async def disconnect(self, close_code):
+        if getattr(self, 'subscribed', False):
+            lobby_broadcaster.subscribers -= 1
+            self.subscribed = False
+        try:
+            await self.channel_layer.group_discard(LOBBY_GROUP, self.channel_name)
+        except Exception:
+            logger.exception("Error discarding channel from lobby group: %s", getattr(self, 'channel_name', None))
+
+    async def receive(self, text_data=None, bytes_data=None):
+        # the lobby is push-only
+        pass
+
+    async def lobby_delta(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'delta',
+            'changes': event.get('changes', []),
+        }))
+
+    @database_sync_to_async
+    def get_rooms(self):
+        rooms = (
+            Room.objects
+            .annotate(user_count=Count('active_users'))
+            .order_by('-created_at')
+            .values('room_id', 'name', 'owner_username', 'locked', 'user_count')
+        )
+        return [
+            {
+                'room_id': room['room_id'],
+                'name': room['name'],
+                'owner': room['owner_username'],
+                'locked': room['locked'],
+                'user_count': room['user_count'],
+            }
+            for room in rooms
+        ]
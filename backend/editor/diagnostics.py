@@ -0,0 +1,177 @@
+import os
+import re
+import ast
+import asyncio
+import hashlib
+import logging
+import shutil
+import subprocess
+import tempfile
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+from .code_executor import CodeExecutor
+
+logger = logging.getLogger('editor')
+
+# Flags that turn each language's compiler from CodeExecutor.language_configs into a syntax-only check.
+SYNTAX_ONLY_FLAGS = {
+    'c': ['-fsyntax-only'],
+    'cpp': ['-fsyntax-only'],
+    'java': ['-proc:none', '-d', '{dir}'],
+}
+
+# gcc/g++: "file:line:col: error: message", javac: "file:line: error: message"
+COMPILER_DIAGNOSTIC_RE = re.compile(
+    r'^(?P<file>[^:\n]+):(?P<line>\d+):(?:(?P<column>\d+):)?\s*(?:fatal )?(?P<severity>error|warning):\s*(?P<message>.*)$'
+)
+
+
+def check_syntax(language, code):
+    """Return a list of diagnostics for `code`.
+
+    Runs inside the diagnostics process pool, so it only relies on the
+    standard library and the compilers on PATH.
+    """
+    if language == 'python':
+        return _check_python(code)
+    if language in SYNTAX_ONLY_FLAGS:
+        return _check_with_compiler(language, code)
+    return []
+
+
+def _check_python(code):
+    try:
+        ast.parse(code)
+    except SyntaxError as e:
+        return [{
+            'line': e.lineno or 1,
+            'column': e.offset or 1,
+            'severity': 'error',
+            'message': e.msg,
+        }]
+    return []
+
+
+def _check_with_compiler(language, code):
+    executor = CodeExecutor()
+    config = executor.language_configs[language]
+    temp_dir = tempfile.mkdtemp()
+    try:
+        filepath = executor._write_source(temp_dir, code, language)
+        cmd = [config['compile_cmd'][0]] + [
+            flag.format(dir=temp_dir) for flag in SYNTAX_ONLY_FLAGS[language]
+        ] + [filepath]
+        try:
+            result = subprocess.run(
+                cmd,
+                capture_output=True,
+                text=True,
+                timeout=executor.timeout,
+                cwd=temp_dir
+            )
+        except (subprocess.TimeoutExpired, OSError):
+            return []
+
+        diagnostics = []
+        for line in result.stderr.splitlines():
+            match = COMPILER_DIAGNOSTIC_RE.match(line)
+            if not match or os.path.basename(match.group('file')) != os.path.basename(filepath):
+                continue
+            diagnostics.append({
+                'line': int(match.group('line')),
+                'column': int(match.group('column') or 1),
+                'severity': match.group('severity'),
+                'message': match.group('message'),
+            })
+        return diagnostics
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+class DiagnosticsScheduler:
+    """Debounces syntax checks per room and runs them off the event loop.
+
+    A newer revision cancels the room's pending job, results are cached by
+    content hash and broadcast to the room as `diagnostics` events.
+    """
+
+    def __init__(self):
+        self.pool = None
+        self.tasks = {}
+        self.languages = {}
+        self.cache = OrderedDict()
+
+    def supports(self, language):
+        return language == 'python' or language in SYNTAX_ONLY_FLAGS
+
+    def get_pool(self):
+        if self.pool is None:
+            # spawn keeps the workers free of the event loop and thread state of this process
+            self.pool = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'DIAGNOSTICS_WORKERS', 2),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return self.pool
+
+    def schedule(self, channel_layer, group_name, room_id, revision, code, language=None):
+        if not getattr(settings, 'DIAGNOSTICS_ENABLED', True):
+            return
+        if language:
+            self.languages[room_id] = language
+        language = self.languages.get(room_id)
+        if not self.supports(language):
+            return
+
+        previous = self.tasks.get(room_id)
+        if previous is not None:
+            previous.cancel()
+
+        self.tasks[room_id] = asyncio.create_task(
+            self.run(channel_layer, group_name, room_id, revision, code, language)
+        )
+
+    async def run(self, channel_layer, group_name, room_id, revision, code, language):
+        try:
+            await asyncio.sleep(getattr(settings, 'DIAGNOSTICS_DEBOUNCE', 0.5))
+
+            key = hashlib.sha256(f'{language}\0{code}'.encode('utf-8')).hexdigest()
+            diagnostics = self.cache.get(key)
+            if diagnostics is not None:
+                self.cache.move_to_end(key)
+            else:
+                loop = asyncio.get_running_loop()
+                diagnostics = await loop.run_in_executor(self.get_pool(), check_syntax, language, code)
+                self.remember(key, diagnostics)
+
+            await channel_layer.group_send(group_name, {
+                'type': 'diagnostics_ready',   # -> diagnostics_ready()
+                'language': language,
+                'revision': revision,
+                'diagnostics': diagnostics,
+            })
+        except asyncio.CancelledError:
+            # superseded by a newer revision
+            raise
+        except Exception:
+            logger.exception("Error computing diagnostics for room %s", room_id)
+        finally:
+            if self.tasks.get(room_id) is asyncio.current_task():
+                del self.tasks[room_id]
+
+    def remember(self, key, diagnostics):
+        self.cache[key] = diagnostics
+        while len(self.cache) > getattr(settings, 'DIAGNOSTICS_CACHE_SIZE', 512):
+            self.cache.popitem(last=False)
+
+    def discard(self, room_id):
+        task = self.tasks.pop(room_id, None)
+        if task is not None:
+            task.cancel()
+        self.languages.pop(room_id, None)
+
+
+diagnostics_scheduler = DiagnosticsScheduler()
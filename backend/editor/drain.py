@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import random
+import signal
+import asyncio
+import logging
+from contextlib import contextmanager
+
+from django.conf import settings
+from channels.db import database_sync_to_async
+
+from .models import Room, ActiveUser
+from .history import room_history
+from .oplog import oplog_store
+
+logger = logging.getLogger('editor')
+
+SNAPSHOT_VERSION = 1
+
+
+class RestoredRooms:
+    """Room state loaded from the previous process' drain snapshot.
+
+    An entry only answers the first join after a restart; that join, or any
+    change to the room, drops it so the database is authoritative again.
+    """
+
+    def __init__(self):
+        self.rooms = {}
+
+    def get(self, room_id):
+        return self.rooms.get(room_id)
+
+    def discard(self, room_id):
+        self.rooms.pop(room_id, None)
+
+    def load(self, path=None):
+        path = path or getattr(settings, 'DRAIN_SNAPSHOT_PATH', None)
+        if not path or not os.path.exists(path):
+            return 0
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            logger.exception("Could not read drain snapshot %s", path)
+            return 0
+        finally:
+            # a snapshot is only valid for the restart that follows it
+            try:
+                os.replace(path, path + '.loaded')
+            except OSError:
+                pass
+
+        max_age = getattr(settings, 'DRAIN_SNAPSHOT_MAX_AGE', 300)
+        if snapshot.get('version') != SNAPSHOT_VERSION or time.time() - snapshot.get('created_at', 0) > max_age:
+            logger.info("Ignoring stale drain snapshot %s", path)
+            return 0
+
+        for room in snapshot.get('rooms', []):
+            self.rooms[room['room_id']] = room
+        # keep the old revision numbering so reconnecting clients can resume instead of re-downloading
+        room_history.restore(snapshot.get('epoch'), {room['room_id']: room['revision'] for room in snapshot.get('rooms', [])})
+        logger.info("Loaded drain snapshot with %d rooms", len(self.rooms))
+        return len(self.rooms)
+
+
+restored_rooms = RestoredRooms()
+
+
+class DrainCoordinator:
+    """Stops accepting sockets, snapshots live rooms and sends clients away with staggered reconnect hints."""
+
+    def __init__(self):
+        self.draining = False
+        self.consumers = {}
+        self.signal_installed = False
+        # state-changing messages being handled right now (see CodeEditorConsumer.receive)
+        self.in_flight = 0
+
+    def register(self, consumer):
+        self.consumers[consumer.channel_name] = consumer
+
+    def unregister(self, consumer):
+        self.consumers.pop(getattr(consumer, 'channel_name', None), None)
+
+    @contextmanager
+    def applying(self):
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+    async def wait_for_edits(self, timeout):
+        # consumers refuse new edits once draining; let the ones already running reach the database
+        deadline = time.monotonic() + timeout
+        while self.in_flight and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        if self.in_flight:
+            logger.warning("Drain snapshot taken with %d edits still running", self.in_flight)
+
+    def install_signal_handler(self):
+        signame = getattr(settings, 'DRAIN_SIGNAL', 'SIGUSR1')
+        if self.signal_installed or not signame:
+            return
+        self.signal_installed = True
+        try:
+            loop = asyncio.get_running_loop()
+            loop.add_signal_handler(getattr(signal, signame), lambda: loop.create_task(self.drain()))
+        except (AttributeError, NotImplementedError, RuntimeError, ValueError):
+            logger.warning("Could not install drain handler for %s", signame)
+
+    async def drain(self):
+        if self.draining:
+            return None
+        self.draining = True
+        started = time.monotonic()
+        consumers = list(self.consumers.values())
+        logger.info("Draining %d connections", len(consumers))
+
+        # edits still waiting on rate-limit tokens are part of the room state
+        for consumer in consumers:
+            try:
+                await consumer.flush_pending_frames()
+            except Exception:
+                logger.exception("Error flushing pending frames for %s", consumer.channel_name)
+        await self.wait_for_edits(getattr(settings, 'DRAIN_EDIT_TIMEOUT', 5.0))
+
+        room_ids = sorted({consumer.room_id for consumer in consumers if consumer.room_id})
+        path = getattr(settings, 'DRAIN_SNAPSHOT_PATH', None)
+        rooms = await self.write_snapshot(path, room_ids) if path else 0
+
+        # presence is rebuilt when clients rejoin; one bulk delete instead of a query per socket
+        await self.clear_active_users([consumer.channel_name for consumer in consumers])
+
+        window_ms = getattr(settings, 'DRAIN_RECONNECT_WINDOW_MS', 10000)
+        min_ms = getattr(settings, 'DRAIN_RECONNECT_MIN_MS', 500)
+        random.shuffle(consumers)
+        slot = window_ms / max(len(consumers), 1)
+        for index, consumer in enumerate(consumers):
+            retry_after_ms = int(min_ms + index * slot + random.uniform(0, slot))
+            try:
+                await consumer.send_reconnect(retry_after_ms)
+            except Exception:
+                logger.exception("Error sending reconnect hint to %s", consumer.channel_name)
+
+        summary = {
+            'connections': len(consumers),
+            'rooms': rooms,
+            'snapshot': path,
+            'elapsed_ms': round((time.monotonic() - started) * 1000, 1),
+        }
+        logger.info("Drain complete: %s", summary)
+        return summary
+
+    async def write_snapshot(self, path, room_ids):
+        rooms = await self.collect_rooms(room_ids)
+        snapshot = {
+            'version': SNAPSHOT_VERSION,
+            'created_at': time.time(),
+            'epoch': room_history.epoch,
+            'rooms': rooms,
+        }
+        temp_path = f'{path}.tmp'
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, separators=(',', ':'))
+        # readers only ever see a complete file
+        os.replace(temp_path, path)
+        return len(rooms)
+
+    @database_sync_to_async
+    def collect_rooms(self, room_ids):
+        rooms = Room.objects.filter(room_id__in=room_ids).select_related('session')
+        snapshot = []
+        for room in rooms:
+            session = getattr(room, 'session', None)
+            document = oplog_store.document(session) if session else {'code': None, 'language': None}
+            snapshot.append({
+                'pk': room.pk,
+                'room_id': room.room_id,
+                'code': document['code'],
+                'language': document['language'],
+                'owner': room.owner_username,
+                'locked': room.locked,
+                'revision': room_history.revision(room.room_id),
+            })
+        return snapshot
+
+    @database_sync_to_async
+    def clear_active_users(self, channel_names):
+        ActiveUser.objects.filter(channel_name__in=channel_names).delete()
+
+
+drain_coordinator = DrainCoordinator()
+
+
+class DrainMiddleware:
+    """ASGI wrapper that refuses new WebSocket handshakes while draining."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        drain_coordinator.install_signal_handler()
+        if scope['type'] == 'websocket' and drain_coordinator.draining:
+            await receive()  # websocket.connect
+            await send({'type': 'websocket.close', 'code': 1013})
+            return
+        return await self.app(scope, receive, send)
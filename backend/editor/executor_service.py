@@ -0,0 +1,255 @@
+import os
+import json
+import time
+import signal
+import struct
+import asyncio
+import logging
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .code_executor import CodeExecutor
+from .toolchains import toolchains
+
+logger = logging.getLogger('editor')
+
+# every message is a 4-byte big-endian length followed by that many bytes of JSON
+FRAME_HEADER = struct.Struct('>I')
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+# how long ExecutorClient.languages() trusts the daemon's last answer
+TOOLCHAINS_REFRESH_SECONDS = 30
+
+
+class DaemonUnavailable(Exception):
+    """The executor daemon could not be reached; the job was not run there."""
+
+
+class DaemonTimeout(Exception):
+    pass
+
+
+async def read_frame(reader):
+    """Next decoded message, or None when the peer closed the connection between messages."""
+    try:
+        header = await reader.readexactly(FRAME_HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise
+    (length,) = FRAME_HEADER.unpack(header)
+    if length > MAX_FRAME_BYTES:
+        raise ValueError(f"Frame of {length} bytes exceeds the limit")
+    return json.loads(await reader.readexactly(length))
+
+
+def write_frame(writer, message):
+    payload = json.dumps(message).encode('utf-8')
+    writer.write(FRAME_HEADER.pack(len(payload)) + payload)
+
+
+def _execute(params):
+    return CodeExecutor().execute(params['code'], params['language'], params.get('stdin') or '')
+
+
+def _execute_cases(params):
+    executor = CodeExecutor()
+    if params.get('max_case_workers'):
+        executor.max_case_workers = params['max_case_workers']
+    return executor.execute_cases(params['code'], params['language'], params['cases'])
+
+
+JOBS = {
+    'execute': _execute,
+    'execute_cases': _execute_cases,
+}
+
+
+class ExecutorServer:
+    """Runs CodeExecutor jobs for clients connecting over a Unix domain socket.
+
+    A connection carries one request at a time; clients open several
+    connections for concurrent jobs. Jobs beyond `workers` wait in the pool's queue.
+    """
+
+    def __init__(self, path, workers):
+        self.path = path
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='executor-job')
+        self.started = time.time()
+        self.jobs = 0
+
+    async def serve(self):
+        if os.path.exists(self.path):
+            # left behind by a daemon that did not shut down cleanly
+            os.unlink(self.path)
+        server = await asyncio.start_unix_server(self.handle_connection, path=self.path)
+        os.chmod(self.path, 0o660)
+
+        loop = asyncio.get_running_loop()
+        if getattr(settings, 'EXECUTOR_PROBE_TOOLCHAINS', True):
+            # jobs run here, so this is the process whose toolchains need warming
+            await loop.run_in_executor(self.pool, toolchains.probe, getattr(settings, 'EXECUTOR_PREWARM', True))
+        stopping = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stopping.set)
+
+        logger.info("Executor daemon listening on %s with %d workers", self.path, self.workers)
+        async with server:
+            await stopping.wait()
+        # let running jobs finish so their clients get an answer
+        self.pool.shutdown(wait=True)
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        logger.info("Executor daemon stopped after %d jobs", self.jobs)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await read_frame(reader)
+                if request is None:
+                    break
+                write_frame(writer, await self.dispatch(request))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+            logger.debug("Executor client connection dropped: %s", e)
+        finally:
+            writer.close()
+
+    async def dispatch(self, request):
+        request_id = request.get('id')
+        method = request.get('method')
+        if method == 'ping':
+            return {'id': request_id, 'result': {
+                'pid': os.getpid(), 'workers': self.workers, 'jobs': self.jobs,
+                'uptime': round(time.time() - self.started, 1),
+                'toolchains': toolchains.status,
+            }}
+        job = JOBS.get(method)
+        if job is None:
+            return {'id': request_id, 'error': f"Unknown method '{method}'"}
+
+        self.jobs += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self.pool, job, request.get('params') or {})
+        except Exception as e:
+            logger.exception("Executor job %s failed", method)
+            return {'id': request_id, 'error': str(e)}
+        return {'id': request_id, 'result': result}
+
+
+class ExecutorClient:
+    """Async client for the executor daemon (EXECUTOR_DAEMON_SOCKET).
+
+    Idle connections are kept for reuse. When the daemon can't be reached,
+    jobs run in-process on a thread like before, and the daemon is retried
+    after EXECUTOR_DAEMON_RETRY_SECONDS.
+    """
+
+    def __init__(self):
+        self.idle = []
+        self.loop = None
+        self.ids = itertools.count(1)
+        self.unavailable_until = 0.0
+        # the daemon's toolchain probe from its last ping ({} while it is still probing)
+        self.daemon_toolchains = None
+        self.toolchains_checked = None
+
+    @property
+    def path(self):
+        return getattr(settings, 'EXECUTOR_DAEMON_SOCKET', '')
+
+    async def execute(self, code, language, stdin=''):
+        try:
+            return await self.call('execute', {'code': code, 'language': language, 'stdin': stdin})
+        except DaemonUnavailable:
+            return await asyncio.to_thread(_execute, {'code': code, 'language': language, 'stdin': stdin})
+
+    async def execute_cases(self, code, language, cases, max_case_workers=None):
+        params = {'code': code, 'language': language, 'cases': cases, 'max_case_workers': max_case_workers}
+        try:
+            return await self.call('execute_cases', params)
+        except DaemonUnavailable:
+            return await asyncio.to_thread(_execute_cases, params)
+
+    async def languages(self):
+        """Languages a job can run in: per the daemon's probe while it answers, else this process's own."""
+        now = time.monotonic()
+        if not self.path:
+            self.daemon_toolchains = None
+        elif self.toolchains_checked is None or now - self.toolchains_checked >= TOOLCHAINS_REFRESH_SECONDS:
+            # set first so joins arriving during the ping use the previous answer instead of pinging too
+            self.toolchains_checked = now
+            try:
+                result = await self.call('ping', {}, timeout=getattr(settings, 'EXECUTOR_DAEMON_CONNECT_TIMEOUT', 1.0))
+                self.daemon_toolchains = result.get('toolchains') or {}
+            except (DaemonUnavailable, DaemonTimeout, RuntimeError):
+                # jobs fall back to this process too
+                self.daemon_toolchains = None
+        if self.daemon_toolchains is not None:
+            return toolchains.languages(self.daemon_toolchains)
+        return toolchains.languages()
+
+    async def call(self, method, params, timeout=None):
+        if not self.path or time.monotonic() < self.unavailable_until:
+            raise DaemonUnavailable()
+
+        loop = asyncio.get_running_loop()
+        if loop is not self.loop:
+            # streams belong to the loop that opened them
+            self.idle, self.loop = [], loop
+
+        timeout = timeout or getattr(settings, 'EXECUTOR_DAEMON_TIMEOUT', 120)
+        # a pooled connection may have been closed by a daemon restart; retry once on a fresh one
+        while True:
+            reused = bool(self.idle)
+            reader, writer = self.idle.pop() if reused else await self.connect()
+            try:
+                write_frame(writer, {'id': next(self.ids), 'method': method, 'params': params})
+                await writer.drain()
+                response = await asyncio.wait_for(read_frame(reader), timeout)
+            except asyncio.TimeoutError:
+                # the job may still be running there; don't run it a second time in-process
+                writer.close()
+                raise DaemonTimeout(f"executor daemon did not answer within {timeout}s")
+            except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+                response = None
+
+            if response is not None:
+                break
+            writer.close()
+            if not reused:
+                self.mark_unavailable(f"connection lost during {method}")
+                raise DaemonUnavailable()
+
+        if len(self.idle) < getattr(settings, 'EXECUTOR_DAEMON_POOL_SIZE', 8):
+            self.idle.append((reader, writer))
+        else:
+            writer.close()
+
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response['result']
+
+    async def connect(self):
+        try:
+            return await asyncio.wait_for(
+                asyncio.open_unix_connection(self.path), getattr(settings, 'EXECUTOR_DAEMON_CONNECT_TIMEOUT', 1.0)
+            )
+        except (OSError, asyncio.TimeoutError) as e:
+            self.mark_unavailable(e)
+            raise DaemonUnavailable() from e
+
+    def mark_unavailable(self, reason):
+        retry = getattr(settings, 'EXECUTOR_DAEMON_RETRY_SECONDS', 5)
+        self.unavailable_until = time.monotonic() + retry
+        for _, writer in self.idle:
+            writer.close()
+        self.idle = []
+        logger.warning("Executor daemon unavailable (%s), running jobs in-process for %ss", reason, retry)
+
+
+executor_client = ExecutorClient()
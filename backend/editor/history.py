@@ -0,0 +1,105 @@
+import json
+import uuid
+from collections import deque
+
+from django.conf import settings
+
+# Updates that carry the whole document; an older one is superseded by any newer one.
+DOCUMENT_UPDATES = {'code_update', 'language_change'}
+
+
+class RoomHistory:
+    """Monotonic revision counter plus a bounded buffer of recent room updates."""
+
+    def __init__(self, max_entries, max_bytes):
+        self.revision = 0
+        self.entries = deque()
+        self.size = 0
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+    def record(self, message):
+        self.revision += 1
+        entry = dict(message, revision=self.revision)
+        entry_size = _entry_size(entry)
+        self.entries.append((entry, entry_size))
+        self.size += entry_size
+        while self.entries and (len(self.entries) > self.max_entries or self.size > self.max_bytes):
+            _, dropped_size = self.entries.popleft()
+            self.size -= dropped_size
+        return self.revision
+
+    def since(self, revision):
+        """Updates after `revision`, or None when they are no longer buffered."""
+        if revision > self.revision:
+            return None
+        if revision == self.revision:
+            return []
+        oldest = self.entries[0][0]['revision'] if self.entries else self.revision + 1
+        if revision + 1 < oldest:
+            return None
+
+        missed = [entry for entry, _ in self.entries if entry['revision'] > revision]
+        # every document update carries the full code, so only the last one needs resending;
+        # code_update doesn't reliably carry the language, so the last language_change stays too
+        last_document = max(
+            (i for i, entry in enumerate(missed) if entry['type'] in DOCUMENT_UPDATES),
+            default=None,
+        )
+        last_language = max(
+            (i for i, entry in enumerate(missed) if entry['type'] == 'language_change'),
+            default=None,
+        )
+        return [
+            entry for i, entry in enumerate(missed)
+            if entry['type'] not in DOCUMENT_UPDATES or i in (last_document, last_language)
+        ]
+
+
+def _entry_size(entry):
+    # serialized length, so nested values such as compile_result cases count too
+    return len(json.dumps(entry))
+
+
+class HistoryRegistry:
+    def __init__(self):
+        self.rooms = {}
+        # Identifies these revision counters. Revisions are kept in memory, so a client
+        # holding a revision from another epoch must get a full snapshot.
+        self.epoch = uuid.uuid4().hex[:12]
+
+    def get(self, room_id):
+        history = self.rooms.get(room_id)
+        if history is None:
+            history = self.rooms[room_id] = RoomHistory(
+                getattr(settings, 'ROOM_HISTORY_MAX_ENTRIES', 200),
+                getattr(settings, 'ROOM_HISTORY_MAX_BYTES', 1024 * 1024),
+            )
+        return history
+
+    def revision(self, room_id):
+        history = self.rooms.get(room_id)
+        return history.revision if history else 0
+
+    def record(self, room_id, message):
+        return self.get(room_id).record(message)
+
+    def restore(self, epoch, revisions):
+        """Continue the numbering of a drained process (see editor.drain)."""
+        if not epoch:
+            return
+        self.epoch = epoch
+        self.rooms = {}
+        for room_id, revision in revisions.items():
+            self.get(room_id).revision = revision
+
+    def since(self, room_id, epoch, revision):
+        if epoch != self.epoch or not isinstance(revision, int) or revision < 0:
+            return None
+        return self.get(room_id).since(revision)
+
+    def discard(self, room_id):
+        self.rooms.pop(room_id, None)
+
+
+room_history = HistoryRegistry()
@@ -0,0 +1,55 @@
+import asyncio
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger('editor')
+
+LOBBY_GROUP = 'lobby'
+
+
+class LobbyBroadcaster:
+    """Collects room changes and sends them to the lobby group in one batch per interval.
+
+    Changes for the same room within a batch are merged, so a burst of
+    joins only produces a single user count update.
+    """
+
+    def __init__(self):
+        self.pending = {}
+        self.flush_task = None
+        self.subscribers = 0
+
+    def publish(self, channel_layer, room_id, **fields):
+        # nobody in this process is watching the lobby, nothing to batch
+        if not self.subscribers or not room_id:
+            return
+
+        op = fields.pop('op', 'updated')
+        change = self.pending.get(room_id)
+        if change is not None and change['op'] == 'deleted' and op != 'created':
+            # late updates from sockets leaving a deleted room
+            return
+        if change is None or op in ('created', 'deleted'):
+            change = self.pending[room_id] = {'room_id': room_id, 'op': op}
+        change.update(fields)
+
+        if self.flush_task is None:
+            self.flush_task = asyncio.create_task(self.flush(channel_layer))
+
+    async def flush(self, channel_layer):
+        try:
+            await asyncio.sleep(getattr(settings, 'LOBBY_BATCH_INTERVAL', 1.0))
+            changes, self.pending = list(self.pending.values()), {}
+            if changes:
+                await channel_layer.group_send(LOBBY_GROUP, {
+                    'type': 'lobby_delta',   # -> LobbyConsumer.lobby_delta()
+                    'changes': changes,
+                })
+        except Exception:
+            logger.exception("Error flushing lobby deltas")
+        finally:
+            self.flush_task = None
+
+
+lobby_broadcaster = LobbyBroadcaster()
@@ -0,0 +1,195 @@
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+logger = logging.getLogger('editor')
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _summary_ms(values):
+    values = list(values)
+    return {
+        'p50': round(_percentile(values, 0.5) * 1000, 2),
+        'p99': round(_percentile(values, 0.99) * 1000, 2),
+        'max': round(max(values, default=0.0) * 1000, 2),
+    }
+
+
+class InstrumentedThreadPoolExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor that tracks queue depth and how long jobs wait for a thread."""
+
+    def __init__(self, pool_name, max_workers=None, **kwargs):
+        super().__init__(max_workers=max_workers, thread_name_prefix=pool_name, **kwargs)
+        self.pool_name = pool_name
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.waits = deque(maxlen=1000)
+        self.stats_lock = threading.Lock()
+
+    def submit(self, fn, /, *args, **kwargs):
+        submitted = time.monotonic()
+        with self.stats_lock:
+            self.queued += 1
+
+        def timed():
+            with self.stats_lock:
+                self.queued -= 1
+                self.running += 1
+                self.waits.append(time.monotonic() - submitted)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self.stats_lock:
+                    self.running -= 1
+                    self.completed += 1
+
+        return super().submit(timed)
+
+    def stats(self):
+        with self.stats_lock:
+            return {
+                'max_workers': self._max_workers,
+                'queue_depth': self.queued,
+                'running': self.running,
+                'completed': self.completed,
+                'wait_ms': _summary_ms(self.waits),
+            }
+
+
+class LoopMonitor:
+    """Opt-in event loop diagnostics.
+
+    A sampler task measures how late the loop wakes up (lag), and a watchdog
+    thread logs the loop thread's stack whenever a callback holds the loop
+    longer than the blocking threshold. The database (`database_sync_to_async`)
+    and executor (`asyncio.to_thread`) pools are replaced with instrumented
+    executors so their queue depth and wait times can be reported.
+    """
+
+    def __init__(self):
+        self.started = False
+        self.lags = deque(maxlen=600)
+        self.heartbeat = time.monotonic()
+        self.loop_thread_id = None
+        self.blocking_events = 0
+        self.last_block = None
+        self.reported_beat = None
+        self.pools = {}
+        self.stopped = threading.Event()
+
+    def ensure_started(self):
+        if self.started:
+            return
+        self.started = True
+        self.interval = getattr(settings, 'LOOP_MONITOR_INTERVAL', 0.1)
+        self.threshold = getattr(settings, 'LOOP_MONITOR_BLOCK_THRESHOLD', 0.2)
+
+        loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        self.instrument_pools(loop)
+
+        self.heartbeat = time.monotonic()
+        self.sampler = loop.create_task(self.sample())
+        threading.Thread(target=self.watch, name='loop-monitor', daemon=True).start()
+        logger.info("Event loop monitor started: interval=%ss block_threshold=%ss", self.interval, self.threshold)
+
+    def instrument_pools(self, loop):
+        from asgiref.sync import SyncToAsync
+
+        # database_sync_to_async runs on asgiref's shared single thread executor inside consumers
+        database_pool = InstrumentedThreadPoolExecutor('database', max_workers=1)
+        SyncToAsync.single_thread_executor = database_pool
+        self.pools['database'] = database_pool
+
+        # asyncio.to_thread uses the loop's default executor
+        executor_pool = InstrumentedThreadPoolExecutor(
+            'executor', max_workers=getattr(settings, 'LOOP_MONITOR_EXECUTOR_WORKERS', None)
+        )
+        loop.set_default_executor(executor_pool)
+        self.pools['executor'] = executor_pool
+
+    async def sample(self):
+        while True:
+            started = time.monotonic()
+            self.heartbeat = started
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(time.monotonic() - started - self.interval, 0.0))
+
+    def watch(self):
+        while not self.stopped.wait(self.threshold / 2):
+            beat = self.heartbeat
+            stalled = time.monotonic() - beat - self.interval
+            if stalled < self.threshold or beat == self.reported_beat:
+                continue
+
+            # report each stall once, with the stack the loop thread is stuck in
+            self.reported_beat = beat
+            frame = sys._current_frames().get(self.loop_thread_id)
+            stack = ''.join(traceback.format_stack(frame)) if frame else '(stack unavailable)\n'
+            self.blocking_events += 1
+            self.last_block = {'at': time.time(), 'blocked_ms': round(stalled * 1000, 1), 'stack': stack}
+            logger.warning("Event loop blocked for at least %.0f ms:\n%s", stalled * 1000, stack)
+
+    def stats(self):
+        lags = list(self.lags)
+        return {
+            'enabled': self.started,
+            'loop': {
+                'lag_ms': dict(_summary_ms(lags), last=round(lags[-1] * 1000, 2) if lags else 0.0),
+                'blocking_events': self.blocking_events,
+                'last_block': self.last_block,
+            },
+            'pools': {name: pool.stats() for name, pool in self.pools.items()},
+        }
+
+    def prometheus(self):
+        stats = self.stats()
+        pools = stats['pools']
+        lines = ['# TYPE codeknot_loop_lag_ms gauge']
+        for key, value in stats['loop']['lag_ms'].items():
+            lines.append(f'codeknot_loop_lag_ms{{stat="{key}"}} {value}')
+        lines.append('# TYPE codeknot_loop_blocking_events_total counter')
+        lines.append(f"codeknot_loop_blocking_events_total {stats['loop']['blocking_events']}")
+
+        # samples of one metric family have to stay together
+        for metric, kind, field in (
+            ('codeknot_pool_queue_depth', 'gauge', 'queue_depth'),
+            ('codeknot_pool_running', 'gauge', 'running'),
+            ('codeknot_pool_completed_total', 'counter', 'completed'),
+        ):
+            lines.append(f'# TYPE {metric} {kind}')
+            for name, pool in pools.items():
+                lines.append(f'{metric}{{pool="{name}"}} {pool[field]}')
+        lines.append('# TYPE codeknot_pool_wait_ms gauge')
+        for name, pool in pools.items():
+            for key, value in pool['wait_ms'].items():
+                lines.append(f'codeknot_pool_wait_ms{{pool="{name}",stat="{key}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+loop_monitor = LoopMonitor()
+
+
+class LoopMonitorMiddleware:
+    """ASGI wrapper that starts the loop monitor on the server's event loop."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        loop_monitor.ensure_started()
+        return await self.app(scope, receive, send)
@@ -0,0 +1,129 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from editor.code_executor import CodeExecutor
+from editor.stats import percentile
+from editor.toolchains import SAMPLE_PROGRAMS, missing_program, sample_failure
+from editor.workspaces import WorkspacePool
+
+PHASES = ('setup', 'compile', 'run', 'cleanup')
+
+
+class Command(BaseCommand):
+    help = (
+        "Run sample programs through every CodeExecutor language and report per-phase timings: "
+        "setup (workspace + source file), compile, run and cleanup (workspace release). "
+        "Runs in this process, not through the executor daemon."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--language', action='append', default=[], help="Only benchmark this language (repeatable)")
+        parser.add_argument('--program', action='append', default=[], choices=['hello', 'compute', 'stdin'],
+                            help="Only run this sample program (repeatable)")
+        parser.add_argument('--iterations', type=int, default=10, help="Timed runs per language and program")
+        parser.add_argument('--warmup', type=int, default=1, help="Untimed runs before the timed ones")
+        parser.add_argument('--no-pool', action='store_true', help="Use plain disk temp dirs instead of the workspace pool")
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1 or options['warmup'] < 0:
+            raise CommandError("--iterations must be >= 1 and --warmup >= 0")
+
+        executor = CodeExecutor()
+        languages = options['language'] or list(executor.language_configs)
+        unknown = [language for language in languages if language not in executor.language_configs]
+        if unknown:
+            raise CommandError(f"Unknown language(s): {', '.join(unknown)}")
+        if options['no_pool']:
+            # an empty root disables the pool, so every run gets a fresh mkdtemp directory
+            executor.workspaces = WorkspacePool(root='')
+
+        report = {'iterations': options['iterations'], 'pooled': None, 'languages': {}}
+        for language in languages:
+            missing = missing_program(executor.language_configs[language])
+            if missing:
+                report['languages'][language] = {'skipped': f"{missing} not found"}
+                continue
+            programs = options['program'] or list(SAMPLE_PROGRAMS[language])
+            report['languages'][language] = {
+                program: self.benchmark(executor, language, SAMPLE_PROGRAMS[language][program], options)
+                for program in programs
+            }
+        # known once the pool has handed out a workspace
+        report['pooled'] = bool(executor.workspaces.available)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_report(report)
+
+    def benchmark(self, executor, language, sample, options):
+        timings = {phase: [] for phase in PHASES}
+        failures = []
+        for i in range(options['warmup'] + options['iterations']):
+            phases, error = self.run_once(executor, language, sample)
+            if i < options['warmup']:
+                continue
+            if error:
+                failures.append(error)
+                continue
+            for phase, seconds in phases.items():
+                timings[phase].append(seconds)
+
+        result = {'runs': len(timings['run']), 'failures': len(failures)}
+        if failures:
+            result['first_failure'] = failures[0][:500]
+        for phase, values in timings.items():
+            values.sort()
+            result[phase] = {
+                'p50': self.ms(percentile(values, 50)) if values else None,
+                'p95': self.ms(percentile(values, 95)) if values else None,
+                'max': self.ms(values[-1]) if values else None,
+            }
+        total = sorted(sum(run) for run in zip(*timings.values()))
+        result['total'] = {
+            'p50': self.ms(percentile(total, 50)) if total else None,
+            'p95': self.ms(percentile(total, 95)) if total else None,
+            'max': self.ms(total[-1]) if total else None,
+        }
+        return result
+
+    def run_once(self, executor, language, sample):
+        """One timed CodeExecutor.execute call.
+
+        Returns `({phase: seconds}, error)`; error is None when the program
+        printed the expected output.
+        """
+        code, stdin, expected = sample
+        phases = {}
+        output = executor.execute(code, language, stdin, timings=phases)
+        # interpreted languages have no compile phase
+        phases.setdefault('compile', 0.0)
+        return phases, sample_failure(output, expected)
+
+    def ms(self, seconds):
+        return round(seconds * 1000, 2)
+
+    def print_report(self, report):
+        self.stdout.write(
+            f"{report['iterations']} runs per program, "
+            f"{'pooled workspaces' if report['pooled'] else 'mkdtemp workspaces'}; times in ms (p50 / p95 / max)"
+        )
+        header = f"{'language':<12}{'program':<10}{'fail':>5}" + ''.join(f"{phase:>25}" for phase in PHASES + ('total',))
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for language, programs in report['languages'].items():
+            if 'skipped' in programs:
+                self.stdout.write(f"{language:<12}skipped: {programs['skipped']}")
+                continue
+            for program, row in programs.items():
+                cells = ''.join(f"{self.cell(row[phase]):>25}" for phase in PHASES + ('total',))
+                self.stdout.write(f"{language:<12}{program:<10}{row['failures']:>5}{cells}")
+                if row['failures']:
+                    self.stdout.write(f"{'':<12}first failure: {row['first_failure'].splitlines()[0] if row['first_failure'] else ''}")
+
+    def cell(self, stats):
+        if stats['p50'] is None:
+            return '-'
+        return f"{stats['p50']} / {stats['p95']} / {stats['max']}"
@@ -0,0 +1,23 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from editor.executor_service import ExecutorServer
+
+
+class Command(BaseCommand):
+    help = "Run the code execution daemon that the ASGI server sends compile jobs to (EXECUTOR_DAEMON_SOCKET)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default=None, help="Unix socket path (default: EXECUTOR_DAEMON_SOCKET)")
+        parser.add_argument('--workers', type=int, default=None, help="Concurrent jobs (default: EXECUTOR_DAEMON_WORKERS)")
+
+    def handle(self, *args, **options):
+        path = options['socket'] or getattr(settings, 'EXECUTOR_DAEMON_SOCKET', '')
+        if not path:
+            raise CommandError("Set EXECUTOR_DAEMON_SOCKET or pass --socket")
+        workers = options['workers'] or getattr(settings, 'EXECUTOR_DAEMON_WORKERS', 4)
+
+        self.stdout.write(f"Executor daemon on {path} with {workers} workers")
+        asyncio.run(ExecutorServer(path, workers).serve())
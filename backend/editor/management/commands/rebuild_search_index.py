@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from editor.search import search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text room search index (SQLite FTS5) from every room's current name and code."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Rooms read and inserted per batch")
+
+    def handle(self, *args, **options):
+        if not search_index.available:
+            raise CommandError("The search index needs SQLite; other databases are searched with a LIKE scan")
+        try:
+            count = search_index.rebuild(batch_size=options['batch_size'])
+        except DatabaseError as e:
+            raise CommandError(f"Rebuilding the search index failed: {e}")
+        self.stdout.write(f"Indexed {count} rooms")
@@ -0,0 +1,82 @@
+import os
+import json
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from editor.models import Room
+from editor.oplog import oplog_store
+from editor.recorder import read_recording
+from editor.replay import Replayer, group_connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay traffic recorded with TRAFFIC_RECORD=True through the editor consumer and report "
+        "latency, database queries and CPU per message type. Writes to the configured database; "
+        "replayed rooms are deleted afterwards unless --keep is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help="Recording files or directories (default: TRAFFIC_RECORD_DIR)")
+        parser.add_argument('--speed', type=float, default=1.0, help="Playback speed; 1 is real time, 0 sends without waiting")
+        parser.add_argument('--copies', type=int, default=1, help="Replay the recording this many times concurrently, each copy in its own rooms")
+        parser.add_argument('--room', action='append', default=[], help="Only replay this recorded room (repeatable)")
+        parser.add_argument('--skip', action='append', default=[], help="Leave out frames of this message type, e.g. compile (repeatable)")
+        parser.add_argument('--prefix', default='replay', help="Prefix of the replayed room ids")
+        parser.add_argument('--no-rate-limits', action='store_true', help="Disable WS_RATE_LIMITS while replaying")
+        parser.add_argument('--settle', type=float, default=1.0, help="Seconds to wait for debounced work after the last frame")
+        parser.add_argument('--keep', action='store_true', help="Keep the replayed rooms")
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+
+    def handle(self, *args, **options):
+        if options['speed'] < 0 or options['copies'] < 1:
+            raise CommandError("--speed must be >= 0 and --copies >= 1")
+        if not options['prefix'].isidentifier():
+            raise CommandError("--prefix may only contain letters, digits and underscores")
+
+        paths = options['paths'] or [getattr(settings, 'TRAFFIC_RECORD_DIR', os.path.join(settings.BASE_DIR, 'traffic'))]
+        connections = group_connections(read_recording(paths), rooms=set(options['room']), skip_types=set(options['skip']))
+        if not connections:
+            raise CommandError("No recorded connections found")
+
+        # a replay must not end up in the recording
+        settings.TRAFFIC_RECORD = False
+        if options['no_rate_limits']:
+            settings.WS_RATE_LIMITS = {}
+
+        replayer = Replayer(connections, speed=options['speed'], copies=options['copies'], prefix=options['prefix'])
+        try:
+            report = asyncio.run(replayer.run(settle=options['settle']))
+        finally:
+            if not options['keep']:
+                Room.objects.filter(room_id__in=replayer.room_ids).delete()
+                for room_id in replayer.room_ids:
+                    oplog_store.discard(room_id)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_report(report)
+
+    def print_report(self, report):
+        self.stdout.write(
+            f"{report['messages']} messages over {report['connections']} connections "
+            f"({report['refused_connections']} refused) in {report['wall_seconds']}s, "
+            f"{report['messages_per_second']} msg/s"
+        )
+        self.stdout.write(
+            f"CPU {report['cpu_seconds']}s ({report['idle_cpu_seconds']}s outside message handling), "
+            f"{report['frames_out']} frames / {report['bytes_out']} bytes sent, "
+            f"max schedule lag {report['max_lag_ms']}ms"
+        )
+        header = f"{'type':<18}{'count':>8}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'q/msg':>8}{'cpu ms/msg':>12}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for name, row in report['types'].items():
+            latency = row['latency_ms']
+            self.stdout.write(
+                f"{name[:17]:<18}{row['count']:>8}{row['errors']:>5}{latency['p50']:>10}{latency['p95']:>10}"
+                f"{latency['p99']:>10}{latency['max']:>10}{row['queries_per_message']:>8}{row['cpu_ms_per_message']:>12}"
+            )
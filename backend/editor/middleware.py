@@ -0,0 +1,129 @@
+import time
+import hashlib
+import logging
+import threading
+import urllib.parse
+from collections import OrderedDict
+
+from django.conf import settings
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+
+logger = logging.getLogger('editor')
+
+
+class VerifiedTokenCache:
+    """LRU cache of verified access tokens, each entry valid until the token expires."""
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _key(self, raw_token):
+        # never keep raw bearer tokens around in memory longer than needed
+        return hashlib.sha256(raw_token.encode('utf-8')).hexdigest()
+
+    def get(self, raw_token):
+        key = self._key(raw_token)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            identity, expires_at = entry
+            if expires_at <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return identity
+
+    def set(self, raw_token, identity, expires_at):
+        max_size = self.max_size or getattr(settings, 'WS_TOKEN_CACHE_SIZE', 1024)
+        key = self._key(raw_token)
+        with self.lock:
+            self.entries[key] = (identity, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > max_size:
+                self.entries.popitem(last=False)
+
+
+token_cache = VerifiedTokenCache()
+
+
+@database_sync_to_async
+def verify_access_token(raw_token):
+    """Validate a SimpleJWT access token and resolve its user.
+
+    Returns (identity, expires_at) or None if the token or user is invalid.
+    """
+    from django.contrib.auth import get_user_model
+    from rest_framework_simplejwt.tokens import AccessToken
+    from rest_framework_simplejwt.exceptions import TokenError
+    from rest_framework_simplejwt.settings import api_settings
+
+    try:
+        token = AccessToken(raw_token)
+        user_id = token[api_settings.USER_ID_CLAIM]
+    except (TokenError, KeyError):
+        return None
+
+    User = get_user_model()
+    user = User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+    if user is None or not user.is_active:
+        return None
+
+    identity = {'user_id': user_id, 'username': user.get_username()}
+    return identity, token['exp']
+
+
+async def authenticate_token(raw_token):
+    identity = token_cache.get(raw_token)
+    if identity is not None:
+        return identity
+
+    verified = await verify_access_token(raw_token)
+    if verified is None:
+        return None
+    identity, expires_at = verified
+    token_cache.set(raw_token, identity, expires_at)
+    return identity
+
+
+def get_raw_token(scope):
+    # browsers can't set headers on WebSocket handshakes, so the query string is the usual carrier
+    query = urllib.parse.parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    if query.get('token'):
+        return query['token'][0]
+
+    for name, value in scope.get('headers', []):
+        if name == b'authorization':
+            parts = value.decode('latin-1').split()
+            if len(parts) == 2 and parts[0] == 'Bearer':
+                return parts[1]
+    return None
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """Verifies the access token once per WebSocket handshake.
+
+    Sets `scope['auth_identity']` to `{'user_id', 'username'}` for a valid
+    token, or `scope['auth_error']` when a token was sent but rejected.
+    """
+
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope, auth_identity=None, auth_error=None)
+        raw_token = get_raw_token(scope)
+        if raw_token:
+            identity = await authenticate_token(raw_token)
+            if identity is None:
+                scope['auth_error'] = 'invalid_token'
+            else:
+                scope['auth_identity'] = identity
+        return await super().__call__(scope, receive, send)
+
+
+def auth_rejected(scope):
+    """True when the handshake must be refused under the current auth settings."""
+    if scope.get('auth_error'):
+        return True
+    return getattr(settings, 'WS_REQUIRE_AUTH', False) and not scope.get('auth_identity')
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('editor', '0002_room_owner_locked'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='codesession',
+            name='storage',
+            field=models.CharField(choices=[('database', 'Database'), ('oplog', 'Operation log')], default='database', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='codesession',
+            name='log_generation',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='codesession',
+            name='checkpoint_seq',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='codesession',
+            name='checkpoint_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    # FTS5 is SQLite only; other backends search with a LIKE scan (editor/search.py)
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS editor_room_search USING fts5(name, code)")
+    # rooms stored with DOCUMENT_STORE=oplog have empty `code` here; `manage.py rebuild_search_index` fills them in
+    schema_editor.execute(
+        "INSERT INTO editor_room_search (rowid, name, code) "
+        "SELECT r.id, r.name, COALESCE(s.code, '') FROM editor_room r LEFT JOIN editor_codesession s ON s.room_id = r.id"
+    )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS editor_room_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('editor', '0003_codesession_oplog'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
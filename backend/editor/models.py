@@ -15,10 +15,23 @@ class Room(models.Model):
         ordering = ['-created_at']
 
 class CodeSession(models.Model):
+    STORAGE_DATABASE = 'database'
+    STORAGE_OPLOG = 'oplog'
+    STORAGE_CHOICES = [
+        (STORAGE_DATABASE, 'Database'),
+        (STORAGE_OPLOG, 'Operation log'),
+    ]
+
     room = models.OneToOneField(Room, on_delete=models.CASCADE, related_name='session')
     code = models.TextField(default='')
     language = models.CharField(max_length=50, default='javascript')
     updated_at = models.DateTimeField(auto_now=True)
+    # With DOCUMENT_STORE=oplog the document lives in a per-room log (editor/oplog.py);
+    # `code` is then empty and these fields point at the latest checkpoint.
+    storage = models.CharField(max_length=16, choices=STORAGE_CHOICES, default=STORAGE_DATABASE)
+    log_generation = models.PositiveIntegerField(default=0)
+    checkpoint_seq = models.BigIntegerField(default=0)
+    checkpoint_at = models.DateTimeField(blank=True, null=True)
     
     def __str__(self):
         return f"Session for {self.room.room_id}"
@@ -0,0 +1,372 @@
+import os
+import re
+import json
+import mmap
+import zlib
+import struct
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Room, CodeSession
+
+logger = logging.getLogger('editor')
+
+# record header: payload length, crc32 of the payload, sequence number
+HEADER = struct.Struct('<IIQ')
+CHECKPOINT_VERSION = 1
+
+
+def _common_prefix(a, b):
+    # binary search on slice comparisons runs at C speed, unlike a per-character loop
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _common_suffix(a, b, limit):
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid:] == b[len(b) - mid:]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def diff_splice(old, new):
+    """Smallest single splice turning `old` into `new`: (position, deleted length, inserted text)."""
+    prefix = _common_prefix(old, new)
+    suffix = _common_suffix(old, new, min(len(old), len(new)) - prefix)
+    return prefix, len(old) - prefix - suffix, new[prefix:len(new) - suffix]
+
+
+def _file_key(room_id):
+    if re.fullmatch(r'[\w-]{1,100}', room_id):
+        return room_id
+    return hashlib.sha256(room_id.encode('utf-8')).hexdigest()[:32]
+
+
+class LogClosed(Exception):
+    """The room log was evicted while a write was on its way to it."""
+
+
+class RoomLog:
+    """One room's document: a checkpoint file plus append-only log generations.
+
+    Every edit is appended to `<key>.<generation>.log` as a small splice
+    record. Compaction starts a new generation, then writes the current
+    document to `<key>.ckpt` and removes older generations. Loading replays
+    every generation at or after the checkpoint's and skips records the
+    checkpoint already contains, so a crash at any point of a compaction
+    leaves a readable room. A torn record at the end of a log (crash
+    mid-append) is cut off.
+    """
+
+    def __init__(self, directory, room_id):
+        self.directory = directory
+        self.room_id = room_id
+        self.key = _file_key(room_id)
+        self.text = ''
+        self.language = 'javascript'
+        self.seq = 0
+        self.generation = 1
+        self.file = None
+        self.log_size = 0
+        self.compacting = False
+        self.lock = threading.Lock()
+
+    @property
+    def checkpoint_path(self):
+        return os.path.join(self.directory, f'{self.key}.ckpt')
+
+    def log_path(self, generation):
+        return os.path.join(self.directory, f'{self.key}.{generation:08d}.log')
+
+    def generations(self):
+        pattern = re.compile(re.escape(self.key) + r'\.(\d{8})\.log$')
+        found = []
+        if not os.path.isdir(self.directory):
+            return found
+        for name in os.listdir(self.directory):
+            match = pattern.match(name)
+            if match:
+                found.append(int(match.group(1)))
+        return sorted(found)
+
+    def remove_files(self, below_generation=None):
+        paths = [self.log_path(g) for g in self.generations() if below_generation is None or g < below_generation]
+        if below_generation is None:
+            paths.append(self.checkpoint_path)
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def bootstrap(self, text, language):
+        """Start a fresh log from a document kept in the database."""
+        os.makedirs(self.directory, exist_ok=True)
+        self.remove_files()
+        self.text, self.language, self.seq, self.generation = text, language, 0, 1
+        write_checkpoint(self.checkpoint_path, text, language, 0, 1)
+        self._open_for_append()
+
+    def load(self):
+        checkpoint = read_checkpoint(self.checkpoint_path)
+        if checkpoint is None:
+            logger.error("Missing checkpoint for room log %s, replaying logs onto an empty document", self.key)
+            checkpoint = {'text': '', 'language': 'javascript', 'seq': 0, 'generation': 1}
+        self.text, self.language = checkpoint['text'], checkpoint['language']
+        self.seq, self.generation = checkpoint['seq'], checkpoint['generation']
+
+        # logs older than the checkpoint are leftovers of a compaction that crashed before cleanup
+        self.remove_files(below_generation=self.generation)
+        for generation in self.generations():
+            self._replay(self.log_path(generation))
+            self.generation = generation
+        self._open_for_append()
+
+    def _replay(self, path):
+        size = os.path.getsize(path)
+        if size == 0:
+            return
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offset = 0
+            while offset + HEADER.size <= size:
+                length, crc, seq = HEADER.unpack_from(data, offset)
+                end = offset + HEADER.size + length
+                if end > size:
+                    break
+                payload = data[offset + HEADER.size:end]
+                if zlib.crc32(payload) != crc:
+                    break
+                offset = end
+                if seq <= self.seq:
+                    continue
+                record = json.loads(payload)
+                self.text = self.text[:record['p']] + record['i'] + self.text[record['p'] + record['d']:]
+                if record.get('l'):
+                    self.language = record['l']
+                self.seq = seq
+
+        if offset < size:
+            logger.warning("Truncating torn record in %s at byte %d of %d", path, offset, size)
+            with open(path, 'r+b') as f:
+                f.truncate(offset)
+
+    def _open_for_append(self):
+        path = self.log_path(self.generation)
+        # unbuffered: each record reaches the OS in a single write
+        self.file = open(path, 'ab', buffering=0)
+        self.log_size = self.file.tell()
+
+    def write(self, text, language=None):
+        """Append the change from the current document to `text`.
+
+        Returns a compaction snapshot when the log passed its size threshold, else None.
+        """
+        with self.lock:
+            if self.file is None:
+                raise LogClosed(self.key)
+            position, deleted, inserted = diff_splice(self.text, text)
+            language_changed = bool(language) and language != self.language
+            if not deleted and not inserted and not language_changed:
+                return None
+
+            record = {'p': position, 'd': deleted, 'i': inserted}
+            if language_changed:
+                record['l'] = language
+            payload = json.dumps(record, separators=(',', ':')).encode('utf-8')
+            self.seq += 1
+            self.file.write(HEADER.pack(len(payload), zlib.crc32(payload), self.seq) + payload)
+            if getattr(settings, 'OPLOG_FSYNC', False):
+                os.fsync(self.file.fileno())
+            self.log_size += HEADER.size + len(payload)
+            self.text = text
+            if language_changed:
+                self.language = language
+
+            if self.compacting or self.log_size < getattr(settings, 'OPLOG_COMPACT_BYTES', 256 * 1024):
+                return None
+            # switch appends to a new generation; the checkpoint is written off the hot path
+            self.compacting = True
+            self.file.close()
+            self.generation += 1
+            self._open_for_append()
+            return {'text': self.text, 'language': self.language, 'seq': self.seq, 'generation': self.generation}
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+
+
+def write_checkpoint(path, text, language, seq, generation):
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'version': CHECKPOINT_VERSION,
+            'seq': seq,
+            'generation': generation,
+            'language': language,
+            'text': text,
+        }, f, separators=(',', ':'))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def read_checkpoint(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        return None
+    if checkpoint.get('version') != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version in {path}")
+    return checkpoint
+
+
+class OplogStore:
+    """Document storage for DOCUMENT_STORE=oplog.
+
+    Keeps the most recently used rooms open (OPLOG_OPEN_ROOMS); others are
+    replayed from disk on their next access. `CodeSession` only records the
+    storage mode and the latest checkpoint.
+    """
+
+    def __init__(self):
+        self.rooms = OrderedDict()
+        self.lock = threading.Lock()
+        # one worker: compactions of the same room must never overtake each other
+        self.compactor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='oplog-compact')
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'DOCUMENT_STORE', 'database') == CodeSession.STORAGE_OPLOG
+
+    def directory(self):
+        return getattr(settings, 'OPLOG_DIR', os.path.join(settings.BASE_DIR, 'oplog'))
+
+    def open(self, room_id, session=None, defaults=None):
+        with self.lock:
+            log = self.rooms.get(room_id)
+            if log is not None:
+                self.rooms.move_to_end(room_id)
+                return log
+
+            if session is None:
+                room, _ = Room.objects.get_or_create(room_id=room_id)
+                session, _ = CodeSession.objects.get_or_create(room=room, defaults=defaults or {})
+            log = RoomLog(self.directory(), room_id)
+            if session.storage == CodeSession.STORAGE_OPLOG:
+                log.load()
+            else:
+                log.bootstrap(session.code, session.language)
+                session.storage = CodeSession.STORAGE_OPLOG
+                session.code = ''
+                session.log_generation = log.generation
+                session.checkpoint_seq = 0
+                session.checkpoint_at = timezone.now()
+                session.save()
+
+            self.rooms[room_id] = log
+            while len(self.rooms) > getattr(settings, 'OPLOG_OPEN_ROOMS', 256):
+                _, evicted = self.rooms.popitem(last=False)
+                evicted.close()
+            return log
+
+    def read(self, room_id, defaults=None):
+        log = self.open(room_id, defaults=defaults)
+        return {'code': log.text, 'language': log.language}
+
+    def write(self, room_id, code, language=None):
+        while True:
+            log = self.open(room_id)
+            try:
+                snapshot = log.write(code, language)
+                break
+            except LogClosed:
+                # evicted by another thread between open() and write(); the next open() replays it
+                continue
+        if snapshot is not None:
+            self.compactor.submit(self.compact, log, snapshot)
+
+    def compact(self, log, snapshot):
+        try:
+            write_checkpoint(log.checkpoint_path, snapshot['text'], snapshot['language'], snapshot['seq'], snapshot['generation'])
+            log.remove_files(below_generation=snapshot['generation'])
+            CodeSession.objects.filter(
+                room__room_id=log.room_id, storage=CodeSession.STORAGE_OPLOG,
+            ).update(
+                log_generation=snapshot['generation'],
+                checkpoint_seq=snapshot['seq'],
+                checkpoint_at=timezone.now(),
+            )
+            logger.info("Compacted room log %s at seq %d", log.key, snapshot['seq'])
+        except Exception:
+            logger.exception("Compaction of room log %s failed", log.key)
+        finally:
+            log.compacting = False
+
+    def document(self, session):
+        """Current code and language of any session, whatever its storage."""
+        if session.storage != CodeSession.STORAGE_OPLOG:
+            return {'code': session.code, 'language': session.language}
+        log = self.open(session.room.room_id, session=session)
+        return {'code': log.text, 'language': log.language}
+
+    def export(self, session):
+        """Move a session back into the database (DOCUMENT_STORE switched back to database)."""
+        document = self.document(session)
+        session.code, session.language = document['code'], document['language']
+        session.storage = CodeSession.STORAGE_DATABASE
+        session.save()
+        self.discard(session.room.room_id)
+
+    def last_modified(self, room_ids):
+        """`{room_id: unix time of its newest log or checkpoint write}` for rooms that have oplog files.
+
+        Oplog saves never touch `CodeSession.updated_at`, so this is the
+        last-edit time of those rooms. The directory is scanned once for all ids.
+        """
+        keys = {_file_key(room_id): room_id for room_id in room_ids}
+        latest = {}
+        try:
+            entries = list(os.scandir(self.directory()))
+        except FileNotFoundError:
+            return latest
+        for entry in entries:
+            room_id = keys.get(entry.name.split('.', 1)[0])
+            if room_id is None or not (entry.name.endswith('.log') or entry.name.endswith('.ckpt')):
+                continue
+            try:
+                mtime = entry.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            latest[room_id] = max(mtime, latest.get(room_id, 0))
+        return latest
+
+    def discard(self, room_id):
+        with self.lock:
+            log = self.rooms.pop(room_id, None)
+        if log is None:
+            log = RoomLog(self.directory(), room_id)
+        log.close()
+        log.remove_files()
+
+
+oplog_store = OplogStore()
@@ -0,0 +1,156 @@
+import uuid
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+def _preview_bytes():
+    return getattr(settings, 'OUTPUT_PREVIEW_BYTES', 4096)
+
+
+def preview_text(text):
+    """Head and tail of `text` when it is longer than the preview size.
+
+    Returns (preview, truncated, total_bytes, total_lines).
+    """
+    data = text.encode('utf-8')
+    total_lines = text.count('\n') + (1 if text and not text.endswith('\n') else 0)
+    limit = _preview_bytes()
+    if len(data) <= limit:
+        return text, False, len(data), total_lines
+
+    half = limit // 2
+    head = data[:half].decode('utf-8', errors='ignore')
+    tail = data[-half:].decode('utf-8', errors='ignore')
+    omitted = len(data) - 2 * half
+    return f"{head}\n\n... [{omitted} bytes omitted] ...\n\n{tail}", True, len(data), total_lines
+
+
+class OutputStore:
+    """Keeps full run output server-side so broadcasts only carry a preview.
+
+    Runs are evicted oldest first once either the run count or the total
+    stored size exceeds its limit.
+    """
+
+    def __init__(self):
+        self.runs = OrderedDict()
+        self.size = 0
+        # REST views read from worker threads while consumers write from the event loop
+        self.lock = threading.Lock()
+
+    def save(self, room_id, streams):
+        run_id = uuid.uuid4().hex
+        encoded = {name: text.encode('utf-8') for name, text in streams.items()}
+        entry_size = sum(len(data) for data in encoded.values())
+
+        with self.lock:
+            self.runs[run_id] = {'room_id': room_id, 'streams': encoded, 'size': entry_size}
+            self.size += entry_size
+            max_runs = getattr(settings, 'OUTPUT_STORE_MAX_RUNS', 500)
+            max_bytes = getattr(settings, 'OUTPUT_STORE_MAX_BYTES', 64 * 1024 * 1024)
+            # keep at least the run just stored, even if it alone is over the size limit
+            while len(self.runs) > 1 and (len(self.runs) > max_runs or self.size > max_bytes):
+                _, evicted = self.runs.popitem(last=False)
+                self.size -= evicted['size']
+        return run_id
+
+    def read(self, run_id, stream='output', start=None, end=None, start_line=None, end_line=None):
+        """Return a byte or line range of a stored stream, or None if unknown."""
+        if not isinstance(run_id, str) or not isinstance(stream, str):
+            return None
+        with self.lock:
+            entry = self.runs.get(run_id)
+            data = entry['streams'].get(stream) if entry else None
+        if data is None:
+            return None
+
+        max_chunk = getattr(settings, 'OUTPUT_FETCH_MAX_BYTES', 256 * 1024)
+        chunk = {'run_id': run_id, 'stream': stream, 'total_bytes': len(data)}
+
+        if start_line is not None or end_line is not None:
+            lines = data.splitlines(keepends=True)
+            first = min(max(start_line or 0, 0), len(lines))
+            stop = len(lines) if end_line is None else min(max(end_line, first), len(lines))
+            # stop at a line boundary once the chunk is full so the client can continue from end_line
+            last, size = first, 0
+            while last < stop and (last == first or size + len(lines[last]) <= max_chunk):
+                size += len(lines[last])
+                last += 1
+            selected = b''.join(lines[first:last])
+            chunk.update({
+                'start_line': first,
+                'end_line': last,
+                'total_lines': len(lines),
+                'truncated': len(selected) > max_chunk,
+            })
+            if chunk['truncated']:
+                # a single line longer than a chunk: hand out its first bytes and the byte range,
+                # so the client can continue with start/end instead of lines
+                offset = sum(len(line) for line in lines[:first])
+                selected = selected[:max_chunk]
+                chunk.update({'start': offset, 'end': offset + max_chunk})
+            chunk['data'] = selected.decode('utf-8', errors='replace')
+            return chunk
+
+        first = min(max(start or 0, 0), len(data))
+        last = len(data) if end is None else min(max(end, first), len(data))
+        last = min(last, first + max_chunk)
+        chunk.update({
+            'start': first,
+            'end': last,
+            'data': data[first:last].decode('utf-8', errors='replace'),
+        })
+        return chunk
+
+    def discard_room(self, room_id):
+        self.discard_rooms({room_id})
+
+    def discard_rooms(self, room_ids):
+        with self.lock:
+            for run_id in [key for key, entry in self.runs.items() if entry['room_id'] in room_ids]:
+                self.size -= self.runs.pop(run_id)['size']
+
+
+output_store = OutputStore()
+
+
+def parse_range_params(params):
+    """Read stream and range arguments from a message or query dict.
+
+    Raises ValueError for a non-string stream or non-integer offsets
+    (TypeError for offsets that are lists or objects).
+    """
+    parsed = {'stream': params.get('stream') or 'output'}
+    if not isinstance(parsed['stream'], str):
+        raise ValueError("stream must be a string")
+    for name in ('start', 'end', 'start_line', 'end_line'):
+        value = params.get(name)
+        if value is not None and value != '':
+            parsed[name] = int(value)
+    return parsed
+
+
+def store_run(room_id, result):
+    """Store the full output of a run and return `result` with previews only."""
+    streams = {'output': result['output']}
+    for case in result.get('cases') or []:
+        streams[f"case-{case['index']}-stdout"] = case['stdout']
+        streams[f"case-{case['index']}-stderr"] = case['stderr']
+    run_id = output_store.save(room_id, streams)
+
+    output, truncated, total_bytes, total_lines = preview_text(result['output'])
+    summary = dict(result, output=output, run_id=run_id, truncated=truncated,
+                   total_bytes=total_bytes, total_lines=total_lines)
+
+    if result.get('cases'):
+        cases = []
+        for case in result['cases']:
+            case = dict(case)
+            for field in ('stdout', 'stderr'):
+                case[field], case[f'{field}_truncated'], case[f'{field}_bytes'], _ = preview_text(case[field])
+            cases.append(case)
+        summary['cases'] = cases
+
+    return summary
@@ -0,0 +1,119 @@
+import time
+import logging
+from collections import Counter
+
+from django.conf import settings
+
+logger = logging.getLogger('editor')
+
+# Rejected messages per message type, for the whole process.
+rejections = Counter()
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated = now
+
+    def consume(self, now=None):
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def refund(self):
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    def wait_time(self):
+        """Seconds until the next token becomes available."""
+        if self.tokens >= 1 or self.rate <= 0:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def is_idle(self, now):
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class RoomBuckets:
+    """Buckets shared by every connection of a room within this process."""
+
+    def __init__(self):
+        self.buckets = {}
+        self.last_prune = time.monotonic()
+
+    def get(self, room_id, message_type, rate, burst):
+        key = (room_id, message_type)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(rate, burst)
+        return bucket
+
+    def prune(self, interval=60):
+        # drop full buckets so rooms that went quiet don't accumulate forever
+        now = time.monotonic()
+        if now - self.last_prune < interval:
+            return
+        self.last_prune = now
+        for key in [k for k, bucket in self.buckets.items() if bucket.is_idle(now)]:
+            del self.buckets[key]
+
+
+room_buckets = RoomBuckets()
+
+
+def get_limits(message_type):
+    # configured only in settings.WS_RATE_LIMITS; each scope maps to (tokens per second, burst)
+    limits = getattr(settings, 'WS_RATE_LIMITS', {})
+    return limits.get(message_type) or limits.get('default') or {}
+
+
+class ConnectionRateLimiter:
+    """Per-connection limiter that also consults the shared per-room buckets."""
+
+    def __init__(self, room_id):
+        self.room_id = room_id
+        self.buckets = {}
+
+    def check(self, message_type):
+        """Consume a token for `message_type`.
+
+        Returns 0 if the message is allowed, otherwise the number of
+        seconds until it would be.
+        """
+        limits = get_limits(message_type)
+        conn_limit = limits.get('connection')
+        room_limit = limits.get('room')
+
+        conn_bucket = None
+        if conn_limit:
+            conn_bucket = self.buckets.get(message_type)
+            if conn_bucket is None:
+                conn_bucket = self.buckets[message_type] = TokenBucket(*conn_limit)
+            if not conn_bucket.consume():
+                return self.reject(message_type, conn_bucket)
+
+        if room_limit and self.room_id:
+            room_buckets.prune()
+            room_bucket = room_buckets.get(self.room_id, message_type, *room_limit)
+            if not room_bucket.consume():
+                # the connection didn't get to send, so give its token back
+                if conn_bucket is not None:
+                    conn_bucket.refund()
+                return self.reject(message_type, room_bucket)
+
+        return 0
+
+    def reject(self, message_type, bucket):
+        rejections[message_type] += 1
+        return max(bucket.wait_time(), 0.001)
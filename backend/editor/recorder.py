@@ -0,0 +1,176 @@
+import os
+import re
+import gzip
+import json
+import time
+import queue
+import shutil
+import atexit
+import logging
+import itertools
+import logging.handlers
+
+from django.conf import settings
+
+logger = logging.getLogger('editor')
+
+# event codes in the recording: connection opened, frame received, connection closed
+OPENED, FRAME, CLOSED = 'o', 'f', 'c'
+
+
+def _gzip_rotator(source, dest):
+    with open(source, 'rb') as src, gzip.open(dest, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the event loop: records that don't fit the queue are counted and dropped."""
+
+    def __init__(self, queue):
+        super().__init__(queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # the message is already final; skip QueueHandler's formatting and copying
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class TrafficRecorder:
+    """Opt-in recording of incoming editor frames (TRAFFIC_RECORD=True).
+
+    Every connection open, frame and close is one JSON line:
+    `{"t": <unix ms>, "r": <room_id>, "c": <connection id>, "e": "o"|"f"|"c", ...}`
+    with the raw frame in `"d"` and the verified username (if any) in `"u"`
+    on open. Lines are queued and written by a background thread to
+    TRAFFIC_RECORD_DIR/traffic-<pid>.jsonl (one file per server process),
+    which rotates at TRAFFIC_RECORD_MAX_BYTES into gzipped backups
+    (TRAFFIC_RECORD_BACKUPS are kept). `manage.py replay_traffic` plays the
+    files back.
+
+    Recording never gets in the way of the editor: if it fails (e.g. the
+    directory isn't writable) the error is logged once and recording stays
+    off for the rest of the process.
+    """
+
+    def __init__(self):
+        self.handler = None
+        self.listener = None
+        self.ids = itertools.count(1)
+        self.failed = False
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'TRAFFIC_RECORD', False) and not self.failed
+
+    def wants(self, room_id):
+        if not self.enabled:
+            return False
+        rooms = getattr(settings, 'TRAFFIC_RECORD_ROOMS', [])
+        return not rooms or room_id in rooms
+
+    def start(self):
+        directory = getattr(settings, 'TRAFFIC_RECORD_DIR', os.path.join(settings.BASE_DIR, 'traffic'))
+        os.makedirs(directory, exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            os.path.join(directory, f'traffic-{os.getpid()}.jsonl'),
+            maxBytes=getattr(settings, 'TRAFFIC_RECORD_MAX_BYTES', 64 * 1024 * 1024),
+            backupCount=getattr(settings, 'TRAFFIC_RECORD_BACKUPS', 10),
+            encoding='utf-8',
+        )
+        file_handler.namer = lambda name: f'{name}.gz'
+        file_handler.rotator = _gzip_rotator
+        file_handler.setFormatter(logging.Formatter('%(message)s'))
+
+        self.handler = _DroppingQueueHandler(queue.Queue(getattr(settings, 'TRAFFIC_RECORD_QUEUE', 100000)))
+        self.listener = logging.handlers.QueueListener(self.handler.queue, file_handler)
+        self.listener.start()
+        atexit.register(self.stop)
+        logger.info("Recording editor traffic to %s", directory)
+
+    def stop(self):
+        if self.listener is not None:
+            # drains whatever is still queued
+            self.listener.stop()
+            self.listener = None
+            if self.handler.dropped:
+                logger.warning("Traffic recorder dropped %d records (queue full)", self.handler.dropped)
+
+    def write(self, entry):
+        """Queue one record. Returns False (and turns recording off) when that isn't possible."""
+        if self.failed:
+            return False
+        try:
+            if self.listener is None:
+                self.start()
+            entry['t'] = int(time.time() * 1000)
+            record = logging.LogRecord('editor.traffic', logging.INFO, '', 0, json.dumps(entry, separators=(',', ':')), None, None)
+            self.handler.handle(record)
+        except Exception:
+            self.failed = True
+            logger.exception("Traffic recording failed, recording is off until restart")
+            return False
+        return True
+
+    def opened(self, room_id, username=None):
+        """Connection id to pass to `frame`/`closed`, or None when this room is not recorded."""
+        if not self.wants(room_id):
+            return None
+        connection = f'{os.getpid():x}.{next(self.ids)}'
+        entry = {'r': room_id, 'c': connection, 'e': OPENED}
+        if username:
+            entry['u'] = username
+        return connection if self.write(entry) else None
+
+    def frame(self, connection, room_id, text_data):
+        self.write({'r': room_id, 'c': connection, 'e': FRAME, 'd': text_data})
+
+    def closed(self, connection, room_id):
+        self.write({'r': room_id, 'c': connection, 'e': CLOSED})
+
+
+traffic_recorder = TrafficRecorder()
+
+
+def _file_order(path):
+    # traffic-<pid>.jsonl.3.gz is older than .2.gz, which is older than the live file
+    match = re.search(r'\.jsonl(?:\.(\d+))?(?:\.gz)?$', path)
+    rotation = int(match.group(1)) if match and match.group(1) else 0
+    return (re.sub(r'\.jsonl.*$', '', path), -rotation)
+
+
+def read_recording(paths):
+    """All records of the given files (plain or .gz) or directories, oldest first."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(
+                os.path.join(path, name) for name in os.listdir(path)
+                if name.startswith('traffic-') and '.jsonl' in name
+            )
+        else:
+            files.append(path)
+    files.sort(key=_file_order)
+
+    records = []
+    for path in files:
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # a line cut off by a crash
+                    continue
+    # stable: records with the same millisecond keep their file order
+    records.sort(key=lambda record: record['t'])
+    return records
@@ -0,0 +1,304 @@
+import json
+import time
+import asyncio
+import logging
+import contextvars
+from collections import defaultdict, deque
+
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.urls import re_path
+
+from .consumers import CodeEditorConsumer
+from .recorder import OPENED, FRAME, CLOSED
+from .stats import percentile
+
+logger = logging.getLogger('editor')
+
+# the message currently being handled; database_sync_to_async carries it into the DB thread
+current_sample = contextvars.ContextVar('replay_sample', default=None)
+
+
+def message_type(text_data):
+    try:
+        data = json.loads(text_data)
+    except (TypeError, ValueError):
+        return 'invalid'
+    if not isinstance(data, dict):
+        return 'invalid'
+    return str(data.get('type'))
+
+
+class Sample:
+    __slots__ = ('type', 'latency', 'cpu', 'queries', 'error')
+
+    def __init__(self, type):
+        self.type = type
+        self.latency = 0.0
+        self.cpu = 0.0
+        self.queries = 0
+        self.error = False
+
+
+def count_queries(execute, sql, params, many, context):
+    sample = current_sample.get()
+    if sample is not None:
+        sample.queries += 1
+    return execute(sql, params, many, context)
+
+
+def install_query_counter(sender=None, connection=None, **kwargs):
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+class CpuShare:
+    """Splits process CPU time between the messages being handled at the same moment.
+
+    Exact when messages are handled one at a time; with overlapping
+    messages each gets an equal share of what the process used meanwhile.
+    CPU used while no message was in flight is counted as `idle`.
+    """
+
+    def __init__(self):
+        self.in_flight = set()
+        self.last = time.process_time()
+        self.idle = 0.0
+
+    def settle(self):
+        now = time.process_time()
+        delta, self.last = now - self.last, now
+        if not self.in_flight:
+            self.idle += delta
+            return
+        share = delta / len(self.in_flight)
+        for sample in self.in_flight:
+            sample.cpu += share
+
+    def start(self, sample):
+        self.settle()
+        self.in_flight.add(sample)
+
+    def stop(self, sample):
+        self.settle()
+        self.in_flight.discard(sample)
+
+
+class ReplayStats:
+    def __init__(self):
+        self.samples = []
+        self.cpu = CpuShare()
+        self.frames_out = 0
+        self.bytes_out = 0
+        self.connections = 0
+        self.refused = 0
+        # how far behind the recorded schedule sends fell, in seconds
+        self.max_lag = 0.0
+
+    def report(self, wall):
+        self.cpu.settle()
+        by_type = defaultdict(list)
+        for sample in self.samples:
+            by_type[sample.type].append(sample)
+
+        types = {}
+        for name, samples in sorted(by_type.items()):
+            latencies = sorted(sample.latency for sample in samples)
+            queries = sum(sample.queries for sample in samples)
+            cpu = sum(sample.cpu for sample in samples)
+            types[name] = {
+                'count': len(samples),
+                'errors': sum(sample.error for sample in samples),
+                'latency_ms': {
+                    'p50': _ms(percentile(latencies, 50)),
+                    'p95': _ms(percentile(latencies, 95)),
+                    'p99': _ms(percentile(latencies, 99)),
+                    'max': _ms(latencies[-1]),
+                },
+                'queries': queries,
+                'queries_per_message': round(queries / len(samples), 2),
+                'cpu_ms': _ms(cpu),
+                'cpu_ms_per_message': _ms(cpu / len(samples)),
+            }
+
+        return {
+            'messages': len(self.samples),
+            'connections': self.connections,
+            'refused_connections': self.refused,
+            'wall_seconds': round(wall, 3),
+            'messages_per_second': round(len(self.samples) / wall, 1) if wall else None,
+            'cpu_seconds': round(sum(sample.cpu for sample in self.samples) + self.cpu.idle, 3),
+            'idle_cpu_seconds': round(self.cpu.idle, 3),
+            'frames_out': self.frames_out,
+            'bytes_out': self.bytes_out,
+            'max_lag_ms': _ms(self.max_lag),
+            'types': types,
+        }
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+class ReplayConsumer(CodeEditorConsumer):
+    """CodeEditorConsumer that times every frame it handles for the replay report."""
+
+    async def connect(self):
+        self.replay_stats = self.scope['replay_stats']
+        self.replay_sent = self.scope['replay_sent']
+        await super().connect()
+
+    async def receive(self, text_data):
+        # frames of one connection are handled in order, so the oldest send time belongs to this frame
+        sent_at = self.replay_sent.popleft() if self.replay_sent else time.perf_counter()
+        sample = Sample(message_type(text_data))
+        token = current_sample.set(sample)
+        self.replay_stats.cpu.start(sample)
+        try:
+            await super().receive(text_data)
+        except Exception:
+            sample.error = True
+            logger.exception("Replayed %s frame failed in room %s", sample.type, self.room_id)
+        finally:
+            self.replay_stats.cpu.stop(sample)
+            current_sample.reset(token)
+            sample.latency = time.perf_counter() - sent_at
+            self.replay_stats.samples.append(sample)
+
+
+replay_application = URLRouter([
+    re_path(r"ws/code/(?P<room_id>\w+)/$", ReplayConsumer.as_asgi()),
+])
+
+
+def _with_scope(application, **extra):
+    async def app(scope, receive, send):
+        return await application(dict(scope, **extra), receive, send)
+    return app
+
+
+def group_connections(records, rooms=None, skip_types=()):
+    """Recorded connections in start order: `{'room', 'user', 'start', 'events': [(t, kind, data)]}`."""
+    connections_by_id = {}
+    for record in records:
+        if rooms and record['r'] not in rooms:
+            continue
+        key = record['c']
+        connection = connections_by_id.get(key)
+        if connection is None:
+            # frames of a connection opened before the recording started still replay on a fresh one
+            connection = connections_by_id[key] = {'room': record['r'], 'user': None, 'start': record['t'], 'events': []}
+        if record['e'] == OPENED:
+            connection['user'] = record.get('u')
+        elif record['e'] == FRAME:
+            if skip_types and message_type(record['d']) in skip_types:
+                continue
+            connection['events'].append((record['t'], FRAME, record['d']))
+        elif record['e'] == CLOSED:
+            connection['events'].append((record['t'], CLOSED, None))
+    return sorted(connections_by_id.values(), key=lambda connection: connection['start'])
+
+
+def replay_room_id(prefix, copy, room_id):
+    return f'{prefix}{copy}_{room_id}'[:100]
+
+
+class Replayer:
+    """Feeds recorded connections through ReplayConsumer.
+
+    Every recorded connection becomes an in-process WebSocket connection
+    that sends its frames at the recorded offsets divided by `speed`
+    (0 sends without waiting). `copies` replays the whole recording that
+    many times side by side, each copy in its own rooms
+    (`<prefix><copy>_<room_id>`).
+    """
+
+    def __init__(self, connections, speed=1.0, copies=1, prefix='replay'):
+        self.connections = connections
+        self.speed = speed
+        self.copies = copies
+        self.prefix = prefix
+        self.stats = ReplayStats()
+        self.room_ids = set()
+
+    async def run(self, settle=1.0):
+        connection_created.connect(install_query_counter)
+        for connection in connections.all():
+            install_query_counter(connection=connection)
+
+        if not self.connections:
+            return self.stats.report(0)
+        self.origin = self.connections[0]['start']
+        self.started = time.perf_counter()
+        await asyncio.gather(*(
+            self.play(connection, copy)
+            for copy in range(self.copies)
+            for connection in self.connections
+        ))
+        wall = time.perf_counter() - self.started
+        # let debounced work (diagnostics, lobby and spectator batches) finish before reporting
+        await asyncio.sleep(settle)
+        return self.stats.report(wall)
+
+    async def wait_until(self, recorded_at):
+        if not self.speed:
+            return
+        delay = (recorded_at - self.origin) / 1000 / self.speed - (time.perf_counter() - self.started)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            self.stats.max_lag = max(self.stats.max_lag, -delay)
+
+    async def play(self, connection, copy):
+        room_id = replay_room_id(self.prefix, copy, connection['room'])
+        self.room_ids.add(room_id)
+        sent = deque()
+        identity = {'user_id': None, 'username': connection['user']} if connection['user'] else None
+        application = _with_scope(
+            replay_application, replay_stats=self.stats, replay_sent=sent,
+            auth_identity=identity, auth_error=None,
+        )
+
+        await self.wait_until(connection['start'])
+        communicator = WebsocketCommunicator(application, f'/ws/code/{room_id}/')
+        connected, _ = await communicator.connect()
+        if not connected:
+            self.stats.refused += 1
+            return
+        self.stats.connections += 1
+        reader = asyncio.create_task(self.read_output(communicator))
+        try:
+            for recorded_at, kind, text_data in connection['events']:
+                await self.wait_until(recorded_at)
+                if kind == CLOSED:
+                    break
+                sent.append(time.perf_counter())
+                await communicator.send_to(text_data=text_data)
+            # let the consumer work through everything this connection sent
+            while sent:
+                await asyncio.sleep(0.01)
+                if reader.done():
+                    break
+        finally:
+            reader.cancel()
+            await communicator.disconnect()
+            # count what was sent after the reader stopped
+            while not communicator.output_queue.empty():
+                self.count_output(communicator.output_queue.get_nowait())
+
+    async def read_output(self, communicator):
+        try:
+            while True:
+                self.count_output(await communicator.receive_output(timeout=3600))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # the consumer finished or crashed
+            return
+
+    def count_output(self, message):
+        if message.get('type') == 'websocket.send':
+            self.stats.frames_out += 1
+            self.stats.bytes_out += len(message.get('text') or message.get('bytes') or '')
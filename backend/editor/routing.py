@@ -1,6 +1,8 @@
 from django.urls import re_path
-from .consumers import CodeEditorConsumer
+from .consumers import CodeEditorConsumer, SpectatorConsumer, LobbyConsumer
 
 websocket_urlpatterns = [
     re_path(r"ws/code/(?P<room_id>\w+)/$", CodeEditorConsumer.as_asgi()),
+    re_path(r"ws/code/(?P<room_id>\w+)/watch/$", SpectatorConsumer.as_asgi()),
+    re_path(r"ws/lobby/$", LobbyConsumer.as_asgi()),
 ]
\ No newline at end of file
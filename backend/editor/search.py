@@ -0,0 +1,229 @@
+import re
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction, close_old_connections, DatabaseError
+from django.db.models import Q
+from django.utils.html import escape
+
+from .models import Room, CodeSession
+from .oplog import oplog_store
+
+logger = logging.getLogger('editor')
+
+TABLE = 'editor_room_search'
+# snippet()/highlight() markers; they are stripped from indexed text so only FTS5 can emit them
+MARK_START, MARK_END = '\x02', '\x03'
+_STRIP_MARKS = str.maketrans('', '', MARK_START + MARK_END)
+SNIPPET_TOKENS = 16
+
+
+def fts_query(text, phrase=False):
+    """FTS5 MATCH expression for user input.
+
+    Every whitespace-separated term (or the whole input with `phrase`) is
+    quoted, so punctuation in code never hits FTS5 query syntax; FTS5 then
+    matches the term's tokens next to each other. A trailing `*` keeps
+    prefix matching.
+    """
+    terms = [text.strip()] if phrase else text.split()
+    parts = []
+    for term in terms:
+        prefix = term.endswith('*') and len(term) > 1
+        term = term.rstrip('*') if prefix else term
+        if term:
+            parts.append('"%s"%s' % (term.replace('"', '""'), '*' if prefix else ''))
+    return ' '.join(parts)
+
+
+def marked_html(text):
+    """HTML-escape `text` and turn the match markers into <mark> tags."""
+    return escape(text).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+class SearchIndex:
+    """Full-text index over room names and code (SQLite FTS5 table `editor_room_search`).
+
+    Rows are keyed by `Room.pk`. Saves only mark a room as dirty; dirty
+    rooms are re-indexed together SEARCH_INDEX_DELAY seconds later on a
+    timer thread, so typing costs one index update per room per interval
+    instead of one per keystroke. On other database backends there is no
+    index and `search` falls back to a LIKE scan.
+    """
+
+    def __init__(self):
+        self.dirty = set()
+        self.timer = None
+        self.lock = threading.Lock()
+
+    @property
+    def available(self):
+        return connection.vendor == 'sqlite'
+
+    def mark(self, room_id):
+        if not self.available:
+            return
+        with self.lock:
+            self.dirty.add(room_id)
+            self.schedule()
+
+    def schedule(self):
+        # caller holds self.lock
+        if self.timer is None:
+            self.timer = threading.Timer(getattr(settings, 'SEARCH_INDEX_DELAY', 5.0), self.flush_in_thread)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush_in_thread(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Updating the search index failed, retrying later")
+        finally:
+            close_old_connections()
+
+    def flush(self):
+        with self.lock:
+            room_ids, self.dirty = self.dirty, set()
+            self.timer = None
+        if not room_ids:
+            return
+        try:
+            rooms = list(Room.objects.filter(room_id__in=room_ids).select_related('session'))
+            rows = [self.row(room) for room in rooms]
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(f'DELETE FROM {TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+                cursor.executemany(f'INSERT INTO {TABLE} (rowid, name, code) VALUES (%s, %s, %s)', rows)
+        except Exception:
+            # e.g. the database was locked; keep the rooms for the next round
+            with self.lock:
+                self.dirty.update(room_ids)
+                self.schedule()
+            raise
+        logger.debug("Re-indexed %d rooms for search", len(rows))
+
+    def row(self, room):
+        return room.pk, room.name.translate(_STRIP_MARKS), self.code(room).translate(_STRIP_MARKS)
+
+    def code(self, room):
+        try:
+            session = room.session
+        except CodeSession.DoesNotExist:
+            return ''
+        return oplog_store.document(session)['code']
+
+    def remove(self, room_ids):
+        """Drop index rows of rooms that are about to be deleted (call before the DELETE)."""
+        if not self.available or not room_ids:
+            return
+        room_ids = list(room_ids)
+        with self.lock:
+            self.dirty.difference_update(room_ids)
+        placeholders = ', '.join(['%s'] * len(room_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {TABLE} WHERE rowid IN (SELECT id FROM {Room._meta.db_table} WHERE room_id IN ({placeholders}))',
+                room_ids,
+            )
+
+    def rebuild(self, batch_size=500):
+        """Re-index every room from scratch. Returns the number of rooms indexed."""
+        if not self.available:
+            raise DatabaseError("The search index needs SQLite with FTS5")
+        with self.lock:
+            self.dirty.clear()
+        count = 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE}')
+            batch = []
+            for room in Room.objects.select_related('session').order_by('pk').iterator(chunk_size=batch_size):
+                batch.append(self.row(room))
+                if len(batch) >= batch_size:
+                    cursor.executemany(f'INSERT INTO {TABLE} (rowid, name, code) VALUES (%s, %s, %s)', batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                cursor.executemany(f'INSERT INTO {TABLE} (rowid, name, code) VALUES (%s, %s, %s)', batch)
+                count += len(batch)
+            # merge the index b-trees now that the bulk load is done
+            cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+        return count
+
+    def search(self, text, phrase=False, offset=0, limit=20):
+        """Ranked matches as `(total, [{room_id, name, owner, rank, name_highlighted, snippet}])`."""
+        if not self.available:
+            return self.scan(text, offset, limit)
+        match = fts_query(text, phrase)
+        if not match:
+            return 0, []
+
+        room_table = Room._meta.db_table
+        with connection.cursor() as cursor:
+            # joined to the room table so rows of rooms deleted behind the index's back never show up
+            cursor.execute(
+                f'SELECT count(*) FROM {TABLE} JOIN {room_table} r ON r.id = {TABLE}.rowid WHERE {TABLE} MATCH %s',
+                [match],
+            )
+            total = cursor.fetchone()[0]
+            cursor.execute(
+                f'''SELECT r.room_id, r.name, r.owner_username, bm25({TABLE}, 10.0, 1.0) AS score,
+                           highlight({TABLE}, 0, %s, %s),
+                           snippet({TABLE}, 1, %s, %s, '…', %s)
+                    FROM {TABLE} JOIN {room_table} r ON r.id = {TABLE}.rowid
+                    WHERE {TABLE} MATCH %s
+                    ORDER BY score LIMIT %s OFFSET %s''',
+                [MARK_START, MARK_END, MARK_START, MARK_END, SNIPPET_TOKENS, match, limit, offset],
+            )
+            rows = cursor.fetchall()
+
+        return total, [
+            {
+                'room_id': room_id,
+                'name': name,
+                'owner': owner,
+                # bm25() is lower for better matches
+                'rank': -score,
+                'name_highlighted': marked_html(name_highlighted or ''),
+                'snippet': marked_html(snippet or ''),
+            }
+            for room_id, name, owner, score, name_highlighted, snippet in rows
+        ]
+
+    def scan(self, text, offset=0, limit=20):
+        # no FTS on this backend: substring match on names and database-stored code, newest first
+        text = text.strip()
+        if not text:
+            return 0, []
+        rooms = (
+            Room.objects
+            .filter(Q(name__icontains=text) | Q(session__code__icontains=text))
+            .select_related('session')
+            .order_by('-updated_at')
+        )
+        total = rooms.count()
+        results = []
+        for room in rooms[offset:offset + limit]:
+            results.append({
+                'room_id': room.room_id,
+                'name': room.name,
+                'owner': room.owner_username,
+                'rank': None,
+                'name_highlighted': marked_html(self.mark_substring(room.name, text)),
+                'snippet': marked_html(self.excerpt(self.code(room), text)),
+            })
+        return total, results
+
+    def mark_substring(self, value, text):
+        return re.sub(re.escape(text), lambda m: f'{MARK_START}{m.group(0)}{MARK_END}', value, flags=re.IGNORECASE)
+
+    def excerpt(self, code, text, context=60):
+        index = code.lower().find(text.lower())
+        if index < 0:
+            return ''
+        start, end = max(0, index - context), min(len(code), index + len(text) + context)
+        excerpt = self.mark_substring(code[start:end], text)
+        return ('…' if start else '') + excerpt + ('…' if end < len(code) else '')
+
+
+search_index = SearchIndex()
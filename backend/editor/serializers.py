@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import Room, CodeSession, ActiveUser
+from .oplog import oplog_store
 
 class ActiveUserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -7,10 +8,20 @@ class ActiveUserSerializer(serializers.ModelSerializer):
         fields = ['username', 'joined_at']
 
 class CodeSessionSerializer(serializers.ModelSerializer):
+    code = serializers.SerializerMethodField()
+    language = serializers.SerializerMethodField()
+
     class Meta:
         model = CodeSession
         fields = ['code', 'language', 'updated_at']
 
+    # sessions in the operation log keep their document on disk, not in `code`
+    def get_code(self, obj):
+        return oplog_store.document(obj)['code']
+
+    def get_language(self, obj):
+        return oplog_store.document(obj)['language']
+
 class RoomSerializer(serializers.ModelSerializer):
     active_users = ActiveUserSerializer(many=True, read_only=True)
     session = CodeSessionSerializer(read_only=True)
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .lobby import lobby_broadcaster
+
+logger = logging.getLogger('editor')
+
+
+def watch_group(room_id):
+    return f'watch_{room_id}'
+
+
+def _count_key(room_id):
+    return f'spectators:{room_id}'
+
+
+class SpectatorRelay:
+    """Feeds a room's spectator group (`watch_<room_id>`) from the editors' side.
+
+    Document changes are coalesced into one snapshot per
+    SPECTATOR_SNAPSHOT_INTERVAL and count changes into one update per
+    SPECTATOR_COUNT_INTERVAL, so a burst of edits or of viewers joining
+    costs one broadcast instead of one per event. Spectator counts live in
+    the Django cache, which is shared between processes when a shared cache
+    backend is configured; no database rows are written per viewer.
+    """
+
+    def __init__(self):
+        # latest document per room, served to spectators joining this process
+        self.latest = {}
+        # spectators connected to this process, per room
+        self.local = {}
+        self.snapshot_tasks = {}
+        self.count_tasks = {}
+
+    async def count(self, room_id):
+        return max(await cache.aget(_count_key(room_id), 0), 0)
+
+    async def joined(self, channel_layer, room_id):
+        key = _count_key(room_id)
+        await cache.aadd(key, 0, timeout=None)
+        await cache.aincr(key)
+        self.local[room_id] = self.local.get(room_id, 0) + 1
+        self.schedule_count(channel_layer, room_id)
+
+    async def left(self, channel_layer, room_id):
+        try:
+            await cache.adecr(_count_key(room_id))
+        except ValueError:
+            # cache entry evicted or cleared; the count restarts from the viewers that remain
+            pass
+        self.local[room_id] = self.local.get(room_id, 1) - 1
+        if self.local[room_id] <= 0:
+            del self.local[room_id]
+            self.latest.pop(room_id, None)
+        self.schedule_count(channel_layer, room_id)
+
+    def document_changed(self, channel_layer, room_id, code, language, revision):
+        # code updates may leave the language out
+        language = language or self.latest.get(room_id, {}).get('language')
+        self.latest[room_id] = {'code': code, 'language': language, 'revision': revision}
+        if room_id not in self.snapshot_tasks:
+            self.snapshot_tasks[room_id] = asyncio.create_task(self.flush_snapshot(channel_layer, room_id))
+
+    async def flush_snapshot(self, channel_layer, room_id):
+        try:
+            await asyncio.sleep(getattr(settings, 'SPECTATOR_SNAPSHOT_INTERVAL', 0.5))
+            snapshot = self.latest.get(room_id)
+            if snapshot is not None and await self.count(room_id) > 0:
+                await channel_layer.group_send(watch_group(room_id), {
+                    'type': 'spectator_snapshot',   # -> SpectatorConsumer.spectator_snapshot()
+                    **snapshot,
+                })
+        except Exception:
+            logger.exception("Error sending spectator snapshot for room %s", room_id)
+        finally:
+            self.snapshot_tasks.pop(room_id, None)
+            # only rooms watched from this process keep their document around for joining spectators
+            if room_id not in self.local:
+                self.latest.pop(room_id, None)
+
+    def schedule_count(self, channel_layer, room_id):
+        if room_id not in self.count_tasks:
+            self.count_tasks[room_id] = asyncio.create_task(self.flush_count(channel_layer, room_id))
+
+    async def flush_count(self, channel_layer, room_id):
+        try:
+            await asyncio.sleep(getattr(settings, 'SPECTATOR_COUNT_INTERVAL', 1.0))
+            count = await self.count(room_id)
+            event = {'type': 'spectator_count', 'count': count}
+            await channel_layer.group_send(f'code_{room_id}', event)
+            await channel_layer.group_send(watch_group(room_id), event)
+            lobby_broadcaster.publish(channel_layer, room_id, spectators=count)
+        except Exception:
+            logger.exception("Error sending spectator count for room %s", room_id)
+        finally:
+            self.count_tasks.pop(room_id, None)
+
+    def discard(self, room_id):
+        self.latest.pop(room_id, None)
+        task = self.snapshot_tasks.pop(room_id, None)
+        if task is not None:
+            task.cancel()
+
+
+spectator_relay = SpectatorRelay()
@@ -0,0 +1,7 @@
+import math
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of an already sorted, non-empty list."""
+    index = max(0, min(len(values) - 1, math.ceil(percent / 100 * len(values)) - 1))
+    return values[index]
@@ -0,0 +1,83 @@
+import os
+import time
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from editor.bulk import filter_rooms
+from editor.models import Room, CodeSession, ActiveUser
+from editor.oplog import oplog_store
+
+
+class FilterRoomsTests(TestCase):
+    def make_room(self, room_id, owner='alice', minutes_ago=0):
+        room = Room.objects.create(room_id=room_id, owner_username=owner)
+        CodeSession.objects.create(room=room, code='print(1)', language='python')
+        self.age(room_id, minutes_ago)
+        return room
+
+    def age(self, room_id, minutes_ago):
+        # update() skips auto_now
+        then = timezone.now() - timedelta(minutes=minutes_ago)
+        Room.objects.filter(room_id=room_id).update(updated_at=then)
+        CodeSession.objects.filter(room__room_id=room_id).update(updated_at=then)
+
+    def ids(self, rooms):
+        return sorted(rooms.values_list('room_id', flat=True))
+
+    def test_filters_by_ids_and_owner(self):
+        self.make_room('a1')
+        self.make_room('a2')
+        self.make_room('b1', owner='bob')
+
+        self.assertEqual(self.ids(filter_rooms(room_ids=['a1', 'b1'])), ['a1', 'b1'])
+        self.assertEqual(self.ids(filter_rooms(owner='alice')), ['a1', 'a2'])
+        self.assertEqual(self.ids(filter_rooms(room_ids=['a1', 'b1'], owner='bob')), ['b1'])
+
+    def test_idle_rooms(self):
+        self.make_room('old', minutes_ago=120)
+        self.make_room('fresh', minutes_ago=5)
+        self.make_room('edited', minutes_ago=120)
+        CodeSession.objects.filter(room__room_id='edited').update(updated_at=timezone.now())
+        occupied = self.make_room('occupied', minutes_ago=120)
+        ActiveUser.objects.create(room=occupied, username='carol', channel_name='chan')
+
+        self.assertEqual(self.ids(filter_rooms(idle_minutes=60)), ['old'])
+
+    def test_filters_narrow_a_given_queryset(self):
+        self.make_room('mine', minutes_ago=120)
+        self.make_room('theirs', owner='bob', minutes_ago=120)
+        rooms = filter_rooms(rooms=Room.objects.filter(owner_username='alice'), idle_minutes=60)
+        self.assertEqual(self.ids(rooms), ['mine'])
+
+
+class FilterRoomsOplogTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        settings_override = override_settings(DOCUMENT_STORE='oplog', OPLOG_DIR=self.directory, OPLOG_FSYNC=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def oplog_room(self, room_id):
+        Room.objects.create(room_id=room_id, owner_username='alice')
+        oplog_store.write(room_id, 'print(1)')
+        self.addCleanup(oplog_store.discard, room_id)
+        then = timezone.now() - timedelta(minutes=120)
+        Room.objects.filter(room_id=room_id).update(updated_at=then)
+        CodeSession.objects.filter(room__room_id=room_id).update(updated_at=then)
+
+    def test_recent_oplog_edit_is_not_idle(self):
+        self.oplog_room('typing')
+        self.assertEqual(CodeSession.objects.get(room__room_id='typing').storage, CodeSession.STORAGE_OPLOG)
+        self.assertEqual(list(filter_rooms(idle_minutes=60)), [])
+
+    def test_old_oplog_edit_is_idle(self):
+        self.oplog_room('quiet')
+        old = time.time() - 2 * 3600
+        for name in os.listdir(self.directory):
+            os.utime(os.path.join(self.directory, name), (old, old))
+        self.assertEqual([room.room_id for room in filter_rooms(idle_minutes=60)], ['quiet'])
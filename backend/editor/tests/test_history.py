@@ -0,0 +1,87 @@
+from django.test import SimpleTestCase
+
+from editor.history import RoomHistory, HistoryRegistry
+
+
+class RoomHistorySinceTests(SimpleTestCase):
+    def setUp(self):
+        self.history = RoomHistory(max_entries=100, max_bytes=1024 * 1024)
+
+    def record(self, type, **fields):
+        return self.history.record(dict(fields, type=type))
+
+    def types(self, entries):
+        return [entry['type'] for entry in entries]
+
+    def test_up_to_date_client_gets_nothing(self):
+        self.record('code_update', code='a')
+        self.assertEqual(self.history.since(1), [])
+
+    def test_revision_from_the_future_needs_a_snapshot(self):
+        self.record('code_update', code='a')
+        self.assertIsNone(self.history.since(5))
+
+    def test_only_the_last_code_update_is_resent(self):
+        self.record('code_update', code='a')
+        self.record('compile_result', output='1')
+        self.record('code_update', code='ab')
+        self.record('code_update', code='abc')
+
+        missed = self.history.since(0)
+        self.assertEqual(self.types(missed), ['compile_result', 'code_update'])
+        self.assertEqual(missed[-1]['code'], 'abc')
+        self.assertEqual(missed[-1]['revision'], 4)
+
+    def test_language_change_survives_a_later_code_update(self):
+        self.record('code_update', code='print(1)', language='python')
+        self.record('language_change', language='cpp', code='int main() {}')
+        self.record('code_update', code='int main() { return 0; }', language=None)
+
+        missed = self.history.since(0)
+        self.assertEqual(self.types(missed), ['language_change', 'code_update'])
+        self.assertEqual(missed[0]['language'], 'cpp')
+        self.assertEqual(missed[1]['code'], 'int main() { return 0; }')
+
+    def test_only_the_last_language_change_is_kept(self):
+        self.record('language_change', language='cpp', code='a')
+        self.record('language_change', language='c', code='b')
+
+        missed = self.history.since(0)
+        self.assertEqual(self.types(missed), ['language_change'])
+        self.assertEqual(missed[0]['language'], 'c')
+
+    def test_evicted_revisions_need_a_snapshot(self):
+        history = RoomHistory(max_entries=2, max_bytes=1024 * 1024)
+        for i in range(4):
+            history.record({'type': 'code_update', 'code': str(i)})
+        self.assertIsNone(history.since(0))
+        self.assertEqual(self.types(history.since(2)), ['code_update'])
+
+    def test_byte_budget_evicts_oldest_entries(self):
+        history = RoomHistory(max_entries=100, max_bytes=100)
+        history.record({'type': 'compile_result', 'output': 'x' * 10})
+        history.record({'type': 'compile_result', 'output': 'y' * 10})
+        self.assertIsNone(history.since(0))
+        self.assertEqual([entry['output'] for entry in history.since(1)], ['y' * 10])
+
+    def test_nested_values_count_towards_the_budget(self):
+        history = RoomHistory(max_entries=100, max_bytes=10 * 1024)
+        cases = [{'stdin': '', 'stdout': 'z' * 1024, 'passed': True} for _ in range(8)]
+        history.record({'type': 'compile_result', 'output': '', 'cases': cases})
+        history.record({'type': 'compile_result', 'output': '', 'cases': cases})
+        self.assertLessEqual(history.size, 10 * 1024)
+        self.assertIsNone(history.since(0))
+
+
+class HistoryRegistryTests(SimpleTestCase):
+    def test_other_epoch_needs_a_snapshot(self):
+        registry = HistoryRegistry()
+        registry.record('room', {'type': 'code_update', 'code': 'a'})
+        self.assertIsNone(registry.since('room', 'other-epoch', 0))
+        self.assertEqual(len(registry.since('room', registry.epoch, 0)), 1)
+
+    def test_restore_continues_numbering(self):
+        registry = HistoryRegistry()
+        registry.restore('drained', {'room': 41})
+        self.assertEqual(registry.record('room', {'type': 'code_update', 'code': 'a'}), 42)
+        self.assertEqual(registry.since('room', 'drained', 41)[0]['revision'], 42)
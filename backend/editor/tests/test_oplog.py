@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase, override_settings
+
+from editor.oplog import RoomLog, HEADER, diff_splice, write_checkpoint
+
+
+class DiffSpliceTests(SimpleTestCase):
+    def test_single_splice(self):
+        self.assertEqual(diff_splice('hello world', 'hello brave world'), (6, 0, 'brave '))
+        self.assertEqual(diff_splice('abcdef', 'abef'), (2, 2, ''))
+        self.assertEqual(diff_splice('aaa', 'aaa'), (3, 0, ''))
+        self.assertEqual(diff_splice('', 'x'), (0, 0, 'x'))
+
+
+@override_settings(OPLOG_FSYNC=False, OPLOG_COMPACT_BYTES=1024 * 1024)
+class RoomLogReplayTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def new_log(self):
+        log = RoomLog(self.directory, 'room1')
+        self.addCleanup(log.close)
+        return log
+
+    def write_edits(self, *texts, language=None):
+        log = self.new_log()
+        log.bootstrap('', 'python')
+        for text in texts:
+            log.write(text, language)
+        log.close()
+        return log.log_path(log.generation)
+
+    def reload(self):
+        log = self.new_log()
+        log.load()
+        return log
+
+    def test_replay_restores_document_and_language(self):
+        self.write_edits('a', 'print(1)', language='cpp')
+
+        log = self.reload()
+        self.assertEqual((log.text, log.language, log.seq), ('print(1)', 'cpp', 2))
+
+    def test_torn_payload_is_cut_off(self):
+        path = self.write_edits('a', 'ab', 'abc')
+        intact = os.path.getsize(path)
+        with open(path, 'ab') as f:
+            # header promising more payload than was written, as after a crash mid-append
+            f.write(HEADER.pack(100, 0, 4) + b'{"p":3')
+
+        log = self.reload()
+        self.assertEqual((log.text, log.seq), ('abc', 3))
+        self.assertEqual(os.path.getsize(path), intact)
+
+        # appends continue after the last good record
+        log.write('abcd')
+        log.close()
+        self.assertEqual(self.reload().text, 'abcd')
+
+    def test_partial_header_is_cut_off(self):
+        path = self.write_edits('a', 'ab')
+        intact = os.path.getsize(path)
+        with open(path, 'ab') as f:
+            f.write(HEADER.pack(5, 0, 3)[:7])
+
+        log = self.reload()
+        self.assertEqual(log.text, 'ab')
+        self.assertEqual(os.path.getsize(path), intact)
+
+    def test_corrupt_record_stops_replay(self):
+        path = self.write_edits('a', 'ab', 'abc')
+        with open(path, 'r+b') as f:
+            data = f.read()
+            # flip a byte in the last record's payload so its crc no longer matches
+            f.seek(len(data) - 2)
+            f.write(bytes([data[-2] ^ 0xFF]))
+
+        log = self.reload()
+        self.assertEqual((log.text, log.seq), ('ab', 2))
+
+    def test_records_in_the_checkpoint_are_skipped(self):
+        self.write_edits('a', 'ab', 'abc')
+        # a compaction that wrote the checkpoint for generation 1 but crashed before starting generation 2
+        log = self.new_log()
+        write_checkpoint(log.checkpoint_path, 'ab', 'python', 2, 1)
+
+        log = self.reload()
+        self.assertEqual((log.text, log.seq), ('abc', 3))
+
+    def test_generations_older_than_the_checkpoint_are_removed(self):
+        log = self.new_log()
+        log.bootstrap('', 'python')
+        log.write('old')
+        log.close()
+        write_checkpoint(log.checkpoint_path, 'old', 'python', 1, 2)
+
+        log = self.reload()
+        self.assertEqual(log.text, 'old')
+        self.assertEqual(log.generations(), [2])
@@ -0,0 +1,66 @@
+from django.test import SimpleTestCase, override_settings
+
+from editor.outputs import OutputStore, parse_range_params
+
+
+class ParseRangeParamsTests(SimpleTestCase):
+    def test_defaults_to_the_output_stream(self):
+        self.assertEqual(parse_range_params({}), {'stream': 'output'})
+
+    def test_offsets_are_converted_to_integers(self):
+        parsed = parse_range_params({'stream': 'case-0-stdout', 'start': '10', 'end': 20, 'start_line': ''})
+        self.assertEqual(parsed, {'stream': 'case-0-stdout', 'start': 10, 'end': 20})
+
+    def test_invalid_offsets_are_rejected(self):
+        for value in ('ten', '1.5', [1], {'a': 1}):
+            with self.subTest(value=value):
+                with self.assertRaises((TypeError, ValueError)):
+                    parse_range_params({'start': value})
+
+    def test_non_string_stream_is_rejected(self):
+        for value in (['output'], {'a': 1}, 5):
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    parse_range_params({'stream': value})
+
+
+@override_settings(OUTPUT_FETCH_MAX_BYTES=8)
+class OutputStoreReadTests(SimpleTestCase):
+    def setUp(self):
+        self.store = OutputStore()
+        self.run_id = self.store.save('room', {'output': 'ab\ncd\nefgh\n' + 'x' * 20 + '\nend\n'})
+
+    def test_byte_range_is_capped(self):
+        chunk = self.store.read(self.run_id, start=0, end=100)
+        self.assertEqual((chunk['start'], chunk['end'], chunk['data']), (0, 8, 'ab\ncd\nef'))
+
+    def test_line_range_stops_at_a_line_boundary(self):
+        chunk = self.store.read(self.run_id, start_line=0)
+        self.assertEqual((chunk['start_line'], chunk['end_line']), (0, 2))
+        self.assertEqual(chunk['data'], 'ab\ncd\n')
+        self.assertFalse(chunk['truncated'])
+
+    def test_overlong_line_is_marked_truncated_with_its_byte_range(self):
+        chunk = self.store.read(self.run_id, start_line=3, end_line=4)
+        self.assertTrue(chunk['truncated'])
+        self.assertEqual(chunk['data'], 'x' * 8)
+        self.assertEqual((chunk['start'], chunk['end']), (11, 19))
+
+        rest = self.store.read(self.run_id, start=chunk['end'], end=chunk['start'] + 21)
+        self.assertEqual(rest['data'], 'x' * 8)
+
+    def test_unknown_or_malformed_ids_return_none(self):
+        self.assertIsNone(self.store.read('missing'))
+        self.assertIsNone(self.store.read(['not', 'hashable']))
+        self.assertIsNone(self.store.read(self.run_id, stream={'not': 'hashable'}))
+        self.assertIsNone(self.store.read(self.run_id, stream='case-0-stdout'))
+
+    @override_settings(OUTPUT_STORE_MAX_RUNS=2)
+    def test_oldest_runs_are_evicted(self):
+        second = self.store.save('room', {'output': 'b'})
+        third = self.store.save('other', {'output': 'c'})
+        self.assertIsNone(self.store.read(self.run_id))
+        self.assertIsNotNone(self.store.read(second))
+
+        self.store.discard_room('other')
+        self.assertIsNone(self.store.read(third))
@@ -0,0 +1,40 @@
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase, override_settings
+
+from editor.executor_service import ExecutorClient, DaemonUnavailable
+from editor.toolchains import toolchains
+
+MISSING = {'available': False, 'reason': 'gcc not found', 'warm_ms': None}
+
+
+@override_settings(EXECUTOR_DAEMON_SOCKET='/nonexistent/executor.sock')
+class ExecutorClientLanguagesTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(toolchains, 'status', {'python': MISSING})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = ExecutorClient()
+
+    def languages(self):
+        return async_to_sync(self.client.languages)()
+
+    def test_daemon_probe_decides_while_it_answers(self):
+        with mock.patch.object(self.client, 'call', return_value={'toolchains': {'c': MISSING}}) as call:
+            languages = self.languages()
+            self.languages()
+        self.assertIn('python', languages)
+        self.assertNotIn('c', languages)
+        # the answer is reused instead of pinging on every join
+        self.assertEqual(call.call_count, 1)
+
+    def test_daemon_still_probing_allows_everything(self):
+        with mock.patch.object(self.client, 'call', return_value={'toolchains': None}):
+            self.assertIn('python', self.languages())
+
+    def test_local_probe_decides_when_the_daemon_is_unreachable(self):
+        with mock.patch.object(self.client, 'call', side_effect=DaemonUnavailable()):
+            languages = self.languages()
+        self.assertNotIn('python', languages)
+        self.assertIn('c', languages)
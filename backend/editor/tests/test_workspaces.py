@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from editor.workspaces import WorkspacePool
+
+
+class WorkspacePoolTests(SimpleTestCase):
+    def setUp(self):
+        self.base = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.base, ignore_errors=True)
+        self.pool = WorkspacePool(root=os.path.join(self.base, 'pool'), max_idle=2, max_bytes=1024, min_free_bytes=0)
+        self.addCleanup(self.pool.close)
+
+    def test_workspace_is_emptied_and_reused(self):
+        with self.pool.acquire() as path:
+            os.makedirs(os.path.join(path, 'pkg', 'sub'))
+            with open(os.path.join(path, 'pkg', 'sub', 'mod.py'), 'w') as f:
+                f.write('x = 1')
+            with open(os.path.join(path, 'program.py'), 'w') as f:
+                f.write('print(1)')
+
+        self.assertEqual(self.pool.idle, [path])
+        self.assertEqual(os.listdir(path), [])
+        with self.pool.acquire() as again:
+            self.assertEqual(again, path)
+
+    def test_oversized_workspace_is_discarded(self):
+        with self.pool.acquire() as path:
+            with open(os.path.join(path, 'big.bin'), 'wb') as f:
+                f.write(b'\0' * 2048)
+
+        self.assertEqual(self.pool.idle, [])
+        self.assertFalse(os.path.exists(path))
+
+    def test_workspace_that_survives_reset_is_not_pooled(self):
+        with mock.patch('editor.workspaces.shutil.rmtree'):
+            # rmtree silently leaves the directory in place, as it would for one without write permission
+            with self.pool.acquire() as path:
+                os.mkdir(os.path.join(path, 'json'))
+
+        self.assertEqual(self.pool.idle, [])
+
+    def test_removal_errors_are_not_ignored(self):
+        with self.pool.acquire() as path:
+            os.mkdir(os.path.join(path, 'json'))
+            with mock.patch('editor.workspaces.os.unlink'), \
+                    mock.patch('editor.workspaces.shutil.rmtree', side_effect=PermissionError('denied')):
+                with self.assertRaises(PermissionError):
+                    self.pool._reset(path)
+
+    @unittest.skipIf(os.geteuid() == 0, "root can delete inside read-only directories")
+    def test_read_only_directory_is_discarded(self):
+        with self.pool.acquire() as path:
+            package = os.path.join(path, 'json')
+            os.mkdir(package)
+            with open(os.path.join(package, '__init__.py'), 'w') as f:
+                f.write('raise SystemExit')
+            os.chmod(package, 0o500)
+
+        self.assertEqual(self.pool.idle, [])
+        self.assertFalse(os.path.exists(path))
+        with self.pool.acquire() as fresh:
+            self.assertEqual(os.listdir(fresh), [])
+
+    def test_idle_pool_is_bounded(self):
+        with self.pool.acquire() as a, self.pool.acquire() as b, self.pool.acquire() as c:
+            pass
+        self.assertEqual(len(self.pool.idle), 2)
+        self.assertEqual(sum(os.path.exists(path) for path in (a, b, c)), 2)
+
+    def test_unusable_root_falls_back_to_temp_dirs(self):
+        pool = WorkspacePool(root='', max_idle=2, max_bytes=1024, min_free_bytes=0)
+        with pool.acquire() as path:
+            self.assertTrue(os.path.isdir(path))
+        self.assertFalse(pool.available)
+        self.assertFalse(os.path.exists(path))
@@ -0,0 +1,168 @@
+import shutil
+import logging
+import threading
+import time
+
+logger = logging.getLogger('editor')
+
+# Small programs per language: `hello` proves the toolchain works end to end, `compute` is CPU bound,
+# `stdin` reads numbers from stdin. Each entry is (code, stdin, expected stdout).
+SAMPLE_PROGRAMS = {
+    'python': {
+        'hello': ('print("hello")\n', '', 'hello'),
+        'compute': ('total = 0\nfor i in range(2000000):\n    total += i % 7\nprint(total)\n', '', '5999995'),
+        'stdin': ('import sys\nprint(sum(int(x) for x in sys.stdin.read().split()))\n', '1 2 3 4 5\n', '15'),
+    },
+    'javascript': {
+        'hello': ('console.log("hello");\n', '', 'hello'),
+        'compute': ('let total = 0;\nfor (let i = 0; i < 2000000; i++) total += i % 7;\nconsole.log(total);\n', '', '5999995'),
+        'stdin': (
+            'const data = require("fs").readFileSync(0, "utf8");\n'
+            'console.log(data.split(/\\s+/).filter(Boolean).reduce((a, b) => a + Number(b), 0));\n',
+            '1 2 3 4 5\n', '15',
+        ),
+    },
+    'java': {
+        'hello': ('public class Main {\n    public static void main(String[] args) {\n        System.out.println("hello");\n    }\n}\n', '', 'hello'),
+        'compute': (
+            'public class Main {\n    public static void main(String[] args) {\n        long total = 0;\n'
+            '        for (int i = 0; i < 2000000; i++) total += i % 7;\n        System.out.println(total);\n    }\n}\n',
+            '', '5999995',
+        ),
+        'stdin': (
+            'import java.util.Scanner;\n\npublic class Main {\n    public static void main(String[] args) {\n'
+            '        Scanner in = new Scanner(System.in);\n        long total = 0;\n'
+            '        while (in.hasNextLong()) total += in.nextLong();\n        System.out.println(total);\n    }\n}\n',
+            '1 2 3 4 5\n', '15',
+        ),
+    },
+    'cpp': {
+        'hello': ('#include <iostream>\n\nint main() {\n    std::cout << "hello" << std::endl;\n}\n', '', 'hello'),
+        'compute': (
+            '#include <iostream>\n\nint main() {\n    long long total = 0;\n'
+            '    for (int i = 0; i < 2000000; i++) total += i % 7;\n    std::cout << total << std::endl;\n}\n',
+            '', '5999995',
+        ),
+        'stdin': (
+            '#include <iostream>\n\nint main() {\n    long long x, total = 0;\n'
+            '    while (std::cin >> x) total += x;\n    std::cout << total << std::endl;\n}\n',
+            '1 2 3 4 5\n', '15',
+        ),
+    },
+    'c': {
+        'hello': ('#include <stdio.h>\n\nint main(void) {\n    printf("hello\\n");\n    return 0;\n}\n', '', 'hello'),
+        'compute': (
+            '#include <stdio.h>\n\nint main(void) {\n    long long total = 0;\n'
+            '    for (int i = 0; i < 2000000; i++) total += i % 7;\n    printf("%lld\\n", total);\n    return 0;\n}\n',
+            '', '5999995',
+        ),
+        'stdin': (
+            '#include <stdio.h>\n\nint main(void) {\n    long long x, total = 0;\n'
+            '    while (scanf("%lld", &x) == 1) total += x;\n    printf("%lld\\n", total);\n    return 0;\n}\n',
+            '1 2 3 4 5\n', '15',
+        ),
+    },
+}
+
+
+def required_programs(config):
+    """Executables a language config needs on PATH (its compiler and runtime)."""
+    programs = []
+    for cmd in (config.get('compile_cmd'), config.get('run_cmd')):
+        if cmd and '{' not in cmd[0] and cmd[0] not in programs:
+            programs.append(cmd[0])
+    return programs
+
+
+def sample_failure(output, expected):
+    """Why a sample run's `output` is not a success printing `expected`, or None if it is."""
+    if expected in output and 'successfully' in output:
+        return None
+    # keep the first line that explains the failure
+    return next((line for line in output.splitlines() if 'Error' in line), output.strip()[:200])
+
+
+def missing_program(config):
+    for program in required_programs(config):
+        if shutil.which(program) is None:
+            return program
+    return None
+
+
+class Toolchains:
+    """Which languages this host can actually run, detected once per process.
+
+    `probe()` checks each language's executables on PATH and, with
+    `prewarm`, runs its `hello` sample once. That both proves the toolchain
+    works and pulls compilers and runtimes into the page cache before the
+    first real Run. Until a probe has finished every language counts as
+    available.
+    """
+
+    def __init__(self):
+        self.status = None
+        self.lock = threading.Lock()
+
+    def start(self, prewarm=True):
+        """Probe on a background thread so startup doesn't wait for compilers."""
+        threading.Thread(target=self.probe, kwargs={'prewarm': prewarm}, name='toolchain-probe', daemon=True).start()
+
+    def probe(self, prewarm=True):
+        # imported here: code_executor consults this module while validating
+        from .code_executor import CodeExecutor
+
+        with self.lock:
+            if self.status is not None:
+                return self.status
+            executor = CodeExecutor()
+            status = {}
+            for language, config in executor.language_configs.items():
+                status[language] = self.check(executor, language, config, prewarm)
+            self.status = status
+
+        available = sorted(language for language, entry in status.items() if entry['available'])
+        unavailable = {language: entry['reason'] for language, entry in status.items() if not entry['available']}
+        logger.info("Toolchains available: %s; unavailable: %s", ', '.join(available) or 'none', unavailable or 'none')
+        return status
+
+    def check(self, executor, language, config, prewarm):
+        missing = missing_program(config)
+        if missing:
+            return {'available': False, 'reason': f"{missing} not found", 'warm_ms': None}
+        sample = SAMPLE_PROGRAMS.get(language, {}).get('hello')
+        if not prewarm or sample is None:
+            return {'available': True, 'reason': None, 'warm_ms': None}
+
+        code, stdin, expected = sample
+        started = time.perf_counter()
+        try:
+            output = executor.execute(code, language, stdin)
+        except Exception as e:
+            output = f"Error: {e}"
+        warm_ms = round((time.perf_counter() - started) * 1000, 1)
+        reason = sample_failure(output, expected)
+        if reason:
+            return {'available': False, 'reason': reason, 'warm_ms': warm_ms}
+        return {'available': True, 'reason': None, 'warm_ms': warm_ms}
+
+    def unavailable_reason(self, language, status=None):
+        """Why `language` can't run here, or None if it can (or the probe hasn't finished).
+
+        `status` is another process's probe result (the executor daemon's)
+        to consult instead of this one's.
+        """
+        entry = ((self.status if status is None else status) or {}).get(language)
+        if entry is None or entry['available']:
+            return None
+        return entry['reason']
+
+    def languages(self, status=None):
+        """Configured languages that can run here, or per `status`, in configuration order."""
+        from .code_executor import CodeExecutor
+        return [
+            language for language in CodeExecutor().language_configs
+            if self.unavailable_reason(language, status) is None
+        ]
+
+
+toolchains = Toolchains()
@@ -6,6 +6,12 @@ urlpatterns = [
     path('auth/register/', register),
     path('auth/login/', login),
     path('rooms/', views.list_rooms),
+    path('rooms/bulk/', views.bulk_rooms),
+    path('rooms/search/', views.search_rooms),
+    path('runs/<str:run_id>/output/', views.run_output),
+    path('debug/loop/', views.loop_stats),
+    path('debug/metrics/', views.loop_metrics),
+    path('debug/drain/', views.drain),
 
 ]
 
@@ -10,7 +10,16 @@ logger = logging.getLogger(__name__)
 
 from .models import Room
 from .serializers import RoomSerializer
-from rest_framework.permissions import IsAuthenticated
+from .outputs import output_store, parse_range_params
+from .loopmonitor import loop_monitor
+from .ratelimit import rejections
+from .drain import drain_coordinator
+from .bulk import BULK_ACTIONS, filter_rooms, apply_bulk_action
+from .search import search_index
+from asgiref.sync import async_to_sync
+from django.http import HttpResponse
+from django.db import DatabaseError
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.decorators import permission_classes
 
 
@@ -58,3 +67,128 @@ def list_rooms(request):
     rooms = Room.objects.all().order_by('-created_at')
     serializer = RoomSerializer(rooms, many=True)
     return Response(serializer.data)
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def bulk_rooms(request):
+    """Lock, unlock, delete or transfer every room matching the filters.
+
+    Body: `action`, at least one of `room_ids`, `owner`, `idle_minutes`, plus
+    `new_owner` for transfers. `dry_run` only lists the matching rooms.
+    Non-staff users only ever match rooms they own.
+    """
+    action = request.data.get("action")
+    if action not in BULK_ACTIONS:
+        return Response({"error": f"action must be one of {', '.join(BULK_ACTIONS)}"}, status=400)
+
+    room_ids = request.data.get("room_ids")
+    owner = request.data.get("owner")
+    idle_minutes = request.data.get("idle_minutes")
+    new_owner = request.data.get("new_owner")
+    if room_ids is None and owner is None and idle_minutes is None:
+        return Response({"error": "At least one filter (room_ids, owner, idle_minutes) is required"}, status=400)
+    if room_ids is not None and (not isinstance(room_ids, list) or not all(isinstance(r, str) for r in room_ids)):
+        return Response({"error": "room_ids must be a list of strings"}, status=400)
+    if idle_minutes is not None and (isinstance(idle_minutes, bool) or not isinstance(idle_minutes, int) or idle_minutes < 0):
+        return Response({"error": "idle_minutes must be a non-negative integer"}, status=400)
+    if action == "transfer" and not new_owner:
+        return Response({"error": "new_owner is required for transfer"}, status=400)
+
+    rooms = filter_rooms(room_ids=room_ids, owner=owner, idle_minutes=idle_minutes)
+    if not request.user.is_staff:
+        rooms = rooms.filter(owner_username=request.user.get_username())
+
+    if request.data.get("dry_run"):
+        matched = list(rooms.values_list("room_id", flat=True))
+        return Response({"action": action, "dry_run": True, "rooms": matched, "count": len(matched)})
+
+    affected = apply_bulk_action(rooms, action, new_owner=new_owner, actor=request.user.get_username())
+    return Response({"action": action, "rooms": affected, "count": len(affected)})
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def search_rooms(request):
+    """Full-text search over room names and code.
+
+    Query: `q`, `mode` (`words`: every term must match, default; `phrase`:
+    the whole query as one snippet), `page`, `page_size`. Results are ranked
+    best first; `snippet` and `name_highlighted` are HTML-escaped with
+    matches wrapped in <mark>.
+    """
+    query = request.query_params.get("q", "").strip()
+    if not query:
+        return Response({"error": "q is required"}, status=400)
+    mode = request.query_params.get("mode", "words")
+    if mode not in ("words", "phrase"):
+        return Response({"error": "mode must be words or phrase"}, status=400)
+    try:
+        page = int(request.query_params.get("page", 1))
+        page_size = int(request.query_params.get("page_size", 20))
+    except ValueError:
+        return Response({"error": "page and page_size must be integers"}, status=400)
+    if page < 1 or not 1 <= page_size <= 100:
+        return Response({"error": "page must be >= 1 and page_size between 1 and 100"}, status=400)
+
+    try:
+        total, results = search_index.search(query, phrase=(mode == "phrase"), offset=(page - 1) * page_size, limit=page_size)
+    except DatabaseError:
+        logger.exception("Search failed for %r", query)
+        return Response({"error": "Invalid search query"}, status=400)
+    return Response({"query": query, "count": total, "page": page, "page_size": page_size, "results": results})
+
+
+@api_view(["GET"])
+def run_output(request, run_id):
+    """Return a byte range (`start`, `end`) or line range (`start_line`, `end_line`) of a stored run.
+
+    `stream` selects `output` (default) or `case-<n>-stdout` / `case-<n>-stderr`.
+    """
+    try:
+        params = parse_range_params(request.query_params)
+    except (TypeError, ValueError):
+        return Response({"error": "Range offsets must be integers"}, status=400)
+
+    chunk = output_store.read(run_id, **params)
+    if chunk is None:
+        return Response({"error": "Run not found"}, status=404)
+    return Response(chunk)
+
+
+# =========================
+# Diagnostics (LOOP_MONITOR_ENABLED)
+# =========================
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def loop_stats(request):
+    """Event loop lag, blocking events and thread pool queues, as JSON."""
+    if not loop_monitor.started:
+        return Response({"error": "Loop monitor is disabled"}, status=404)
+    stats = loop_monitor.stats()
+    stats['rate_limit_rejections'] = dict(rejections)
+    return Response(stats)
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def loop_metrics(request):
+    """The same data in Prometheus text exposition format."""
+    if not loop_monitor.started:
+        return Response({"error": "Loop monitor is disabled"}, status=404)
+    body = loop_monitor.prometheus()
+    body += '# TYPE codeknot_rate_limit_rejections_total counter\n'
+    for message_type, count in rejections.items():
+        body += f'codeknot_rate_limit_rejections_total{{message_type="{message_type}"}} {count}\n'
+    return HttpResponse(body, content_type='text/plain; version=0.0.4')
+
+
+@api_view(["POST"])
+@permission_classes([IsAdminUser])
+def drain(request):
+    """Stop accepting sockets, snapshot live rooms and send clients a staggered reconnect hint."""
+    summary = async_to_sync(drain_coordinator.drain)()
+    if summary is None:
+        return Response({"error": "Already draining"}, status=409)
+    return Response(summary)
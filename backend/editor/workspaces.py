@@ -0,0 +1,171 @@
+import os
+import atexit
+import shutil
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger('editor')
+
+
+def _setting(name, default):
+    # the executor also runs in helper processes where Django settings are not configured
+    if not settings.configured:
+        return default
+    return getattr(settings, name, default)
+
+
+def _raise_error(function, path, exc_info):
+    raise exc_info[1]
+
+
+def _directory_size(path):
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class WorkspacePool:
+    """Reusable execution directories on a RAM-backed filesystem.
+
+    Workspaces are emptied and reused instead of being created and removed
+    for every run. When the configured root is unusable (or low on space)
+    the pool falls back to disk-backed `tempfile.mkdtemp()` directories.
+    """
+
+    def __init__(self, root=None, max_idle=None, max_bytes=None, min_free_bytes=None):
+        # unset limits are read from settings on first use, not at import time
+        self.root = root
+        self.max_idle = max_idle
+        self.max_bytes = max_bytes
+        self.min_free_bytes = min_free_bytes
+        self.idle = []
+        self.lock = threading.Lock()
+        self.counter = 0
+        self.available = None
+
+    def _configure(self):
+        if self.root is None:
+            self.root = _setting('EXECUTOR_WORKSPACE_ROOT', '/dev/shm/codeknot')
+        if self.max_idle is None:
+            self.max_idle = _setting('EXECUTOR_WORKSPACE_POOL_SIZE', 8)
+        if self.max_bytes is None:
+            self.max_bytes = _setting('EXECUTOR_WORKSPACE_MAX_BYTES', 64 * 1024 * 1024)
+        if self.min_free_bytes is None:
+            self.min_free_bytes = _setting('EXECUTOR_WORKSPACE_MIN_FREE_BYTES', 128 * 1024 * 1024)
+
+    def _check_root(self):
+        if self.available is None:
+            self._configure()
+            try:
+                if not self.root or not os.path.isdir(os.path.dirname(self.root.rstrip('/')) or '/'):
+                    raise OSError(f"{self.root} is not on an existing filesystem")
+                os.makedirs(self.root, mode=0o700, exist_ok=True)
+                if not os.access(self.root, os.W_OK):
+                    raise OSError(f"{self.root} is not writable")
+                self.available = True
+            except OSError as e:
+                logger.info("Workspace pool disabled, using disk temp directories: %s", e)
+                self.available = False
+        return self.available
+
+    def _has_space(self):
+        try:
+            stat = os.statvfs(self.root)
+        except OSError:
+            return False
+        return stat.f_bavail * stat.f_frsize >= self.min_free_bytes
+
+    def _create(self):
+        with self.lock:
+            self.counter += 1
+            name = f'ws-{os.getpid()}-{self.counter}'
+        path = os.path.join(self.root, name)
+        os.mkdir(path, 0o700)
+        return path
+
+    def _reset(self, path):
+        # anything left behind (e.g. a directory the program made read-only) would be visible to
+        # the next job, so every failure raises and the workspace is discarded instead of pooled
+        for entry in os.scandir(path):
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path, onerror=_raise_error)
+            else:
+                os.unlink(entry.path)
+        if os.listdir(path):
+            raise OSError(f"{path} is not empty after reset")
+
+    def _discard(self, path):
+        shutil.rmtree(path, ignore_errors=True)
+        if os.path.exists(path):
+            # the program may have removed write permission from its own directories
+            for root, dirs, files in os.walk(path):
+                for name in dirs:
+                    directory = os.path.join(root, name)
+                    if not os.path.islink(directory):
+                        try:
+                            os.chmod(directory, 0o700)
+                        except OSError:
+                            pass
+            shutil.rmtree(path, ignore_errors=True)
+
+    def _release(self, path):
+        try:
+            if _directory_size(path) > self.max_bytes:
+                raise OSError("workspace grew past the size limit")
+            self._reset(path)
+        except OSError as e:
+            logger.info("Discarding workspace %s: %s", path, e)
+            self._discard(path)
+            return
+
+        with self.lock:
+            if len(self.idle) < self.max_idle:
+                self.idle.append(path)
+                return
+        self._discard(path)
+
+    @contextmanager
+    def acquire(self):
+        """Yield an empty directory for one execution."""
+        path = None
+        if self._check_root() and self._has_space():
+            with self.lock:
+                if self.idle:
+                    path = self.idle.pop()
+            if path is None:
+                try:
+                    path = self._create()
+                except OSError:
+                    path = None
+
+        if path is None:
+            temp_dir = tempfile.mkdtemp()
+            try:
+                yield temp_dir
+            finally:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+            return
+
+        try:
+            yield path
+        finally:
+            self._release(path)
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for path in idle:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+workspace_pool = WorkspacePool()
+atexit.register(workspace_pool.close)
@@ -1,7 +1,7 @@
 import React, { useEffect, useRef, useState } from "react";
 import axios from "axios";
 import {
-  Users, Copy, Check, LogOut, Play, Terminal, Wifi, WifiOff, Settings, Sun, Moon, MessageSquare, Send
+  Users, Copy, Check, LogOut, Play, Terminal, Wifi, WifiOff, Settings, Sun, Moon, MessageSquare, Send, Eye
 } from "lucide-react";
 
 // ─────────────────────────────────────────────────────────────────────────────
@@ -98,18 +98,29 @@ function useGroqChat(language, code) {
  * Hook: useWebSocket
  * Manages the WebSocket connection and collaborative room state.
  */
-function useWebSocket(isInRoom, user, roomId, setIsInRoom) {
+function useWebSocket(isInRoom, user, roomId, setIsInRoom, spectator) {
   const [language, setLanguage] = useState("javascript");
   const [code, setCode] = useState(LANGUAGES.javascript.defaultCode);
   const [usersInRoom, setUsersInRoom] = useState([]);
+  // Collaborators' caret line, selection, name and color, merged from awareness deltas
+  const [awareness, setAwareness] = useState({});
   const [roomOwner, setRoomOwner] = useState(null);
   const [roomLocked, setRoomLocked] = useState(false);
   const [terminalOutput, setTerminalOutput] = useState("");
   const [isRunning, setIsRunning] = useState(false);
   const [isConnected, setIsConnected] = useState(false);
+  // Read-only viewers of the room, as last reported by the server
+  const [spectators, setSpectators] = useState(0);
+  // Languages the server can run (from init); null until known
+  const [availableLanguages, setAvailableLanguages] = useState(null);
+  // Bumped to open a fresh socket when the server asks clients to reconnect
+  const [connectionTick, setConnectionTick] = useState(0);
 
   const wsRef = useRef(null);
   const outputEndRef = useRef(null);
+  const viewportRef = useRef(null);
+  // Last revision seen for this room, so a reconnect only receives what it missed
+  const resumeRef = useRef({ roomId: null, epoch: null, revision: null });
 
   // Auto-scroll terminal
   useEffect(() => {
@@ -122,27 +133,65 @@ function useWebSocket(isInRoom, user, roomId, setIsInRoom) {
 
     const protocol = BACKEND_URL.startsWith("https") ? "wss" : "ws";
     const host = BACKEND_URL.replace(/^https?:\/\//, "");
-    const ws = new WebSocket(`${protocol}://${host}/ws/code/${roomId}/`);
+    const token = localStorage.getItem("access");
+    const query = token ? `?token=${encodeURIComponent(token)}` : "";
+    // spectators connect to the read-only endpoint and never join the room
+    const ws = new WebSocket(`${protocol}://${host}/ws/code/${roomId}/${spectator ? "watch/" : ""}${query}`);
     wsRef.current = ws;
 
+    if (resumeRef.current.roomId !== roomId) {
+      resumeRef.current = { roomId, epoch: null, revision: null };
+    }
+
     ws.onopen = () => {
       setIsConnected(true);
-      ws.send(JSON.stringify({ type: "join", username: user.email }));
+      // awareness and viewport are per connection; start over on every (re)connect
+      setAwareness({});
+      viewportRef.current = null;
+      if (spectator) return;
+      const { epoch, revision } = resumeRef.current;
+      const join = { type: "join", username: user.email };
+      if (epoch && revision !== null) Object.assign(join, { epoch, last_revision: revision });
+      ws.send(JSON.stringify(join));
     };
 
-    ws.onmessage = (event) => {
-      const data = JSON.parse(event.data);
+    let reconnectTimer = null;
+
+    const handleMessage = (data) => {
+      if (data.epoch) resumeRef.current.epoch = data.epoch;
+      if (typeof data.revision === "number") resumeRef.current.revision = data.revision;
       switch (data.type) {
+        case "resume":
+          (data.updates || []).forEach(handleMessage);
+          resumeRef.current.revision = data.revision;
+          if (data.users) setUsersInRoom(data.users);
+          if (data.owner) setRoomOwner(data.owner);
+          if (typeof data.locked !== 'undefined') setRoomLocked(!!data.locked);
+          break;
         case "init":
           if (data.code) setCode(data.code);
           if (data.language) setLanguage(data.language);
           if (data.users) setUsersInRoom(data.users);
           if (data.owner) setRoomOwner(data.owner);
           if (typeof data.locked !== 'undefined') setRoomLocked(!!data.locked);
+          if (typeof data.spectators === "number") setSpectators(data.spectators);
+          if (Array.isArray(data.languages)) setAvailableLanguages(data.languages);
+          break;
+        case "snapshot":
+          // spectators get the whole document at most a few times per second
+          setCode(data.code || "");
+          if (data.language) setLanguage(data.language);
+          break;
+        case "spectator_count":
+          setSpectators(data.count || 0);
           break;
         case "user_joined":
         case "user_left":
           if (data.users) setUsersInRoom(data.users);
+          if (data.owner) setRoomOwner(data.owner);
+          break;
+        case "owner_changed":
+          setRoomOwner(data.owner || null);
           break;
         case "user_kicked":
           if (data.users) setUsersInRoom(data.users);
@@ -153,12 +202,34 @@ function useWebSocket(isInRoom, user, roomId, setIsInRoom) {
           break;
         case "room_locked":
           setRoomLocked(!!data.locked);
+          if (spectator && data.locked) {
+            alert("The room was locked by the owner");
+            setIsInRoom(false);
+          }
           break;
         case "room_deleted":
           alert("Room was deleted by the owner");
           setIsInRoom(false);
           break;
-        case "cursor_move":
+        case "awareness_snapshot":
+          setAwareness(data.users || {});
+          break;
+        case "awareness":
+          setAwareness((prev) => {
+            const next = { ...prev };
+            if (data.removed) delete next[data.user];
+            else next[data.user] = { ...prev[data.user], ...data.state };
+            return next;
+          });
+          break;
+        case "awareness_summary":
+          setAwareness((prev) => {
+            const next = { ...prev };
+            Object.entries(data.users || {}).forEach(([name, changes]) => {
+              next[name] = { ...prev[name], ...changes };
+            });
+            return next;
+          });
           break;
         case "code_update":
           if (data.user !== user.email) setCode(data.code);
@@ -176,28 +247,63 @@ function useWebSocket(isInRoom, user, roomId, setIsInRoom) {
         case "output_cleared":
           setTerminalOutput("");
           break;
+        case "reconnect":
+          // server is restarting; come back after the staggered delay and resume from the last revision
+          reconnectTimer = setTimeout(() => setConnectionTick((t) => t + 1), data.retry_after_ms || 1000);
+          break;
+        case "error":
+          // an edit refused while the server drains never reached the room; take the full state on reconnect
+          if (data.message === "draining") resumeRef.current.revision = null;
+          if (data.message === "username_reserved") {
+            alert("That name belongs to a registered account; log in to use it");
+            setIsInRoom(false);
+          }
+          break;
         default: break;
       }
     };
 
+    ws.onmessage = (event) => handleMessage(JSON.parse(event.data));
+
     ws.onclose = () => setIsConnected(false);
     ws.onerror = () => setIsConnected(false);
 
-    return () => ws.close();
-  }, [isInRoom, roomId, user, setIsInRoom]);
+    return () => {
+      clearTimeout(reconnectTimer);
+      ws.close();
+    };
+  }, [isInRoom, roomId, user, setIsInRoom, spectator, connectionTick]);
 
   // Helper functions to send data via WebSocket
   const handleCodeChange = (newCode) => {
+    if (spectator) return;
     setCode(newCode);
     wsRef.current?.send(JSON.stringify({ type: "code_update", code: newCode, language, user: user.email }));
   };
 
   const handleCursorChange = (e) => {
-    const pos = e.target.selectionStart;
-    wsRef.current?.send(JSON.stringify({ type: 'cursor_move', cursor: { pos }, user: user.email }));
+    if (spectator) return;
+    const { selectionStart: pos, selectionEnd: end, value } = e.target;
+    const line = value.slice(0, pos).split("\n").length - 1;
+    const selection = end !== pos ? { start: pos, end } : null;
+    wsRef.current?.send(JSON.stringify({ type: "awareness", state: { line, pos, selection }, user: user.email }));
+  };
+
+  // Visible line range, so the server only streams carets near what this client can see
+  const handleViewportChange = (e) => {
+    if (spectator) return;
+    const { scrollTop, clientHeight } = e.target;
+    const lineHeight = parseFloat(window.getComputedStyle(e.target).lineHeight) || 20;
+    const fromLine = Math.floor(scrollTop / lineHeight);
+    const toLine = Math.ceil((scrollTop + clientHeight) / lineHeight);
+    const last = viewportRef.current;
+    if (last && last.fromLine === fromLine && last.toLine === toLine) return;
+    viewportRef.current = { fromLine, toLine };
+    wsRef.current?.send(JSON.stringify({ type: "viewport", from_line: fromLine, to_line: toLine }));
   };
 
   const handleLanguageChange = (newLanguage) => {
+    if (spectator) return;
     const newCode = LANGUAGES[newLanguage]?.defaultCode || "";
     setLanguage(newLanguage);
     setCode(newCode);
@@ -205,6 +311,7 @@ function useWebSocket(isInRoom, user, roomId, setIsInRoom) {
   };
 
   const handleRunCode = () => {
+    if (spectator) return;
     if (!isConnected) return alert("You are not connected to the server.");
     setIsRunning(true);
     setTerminalOutput("Executing code...\n");
@@ -212,8 +319,8 @@ function useWebSocket(isInRoom, user, roomId, setIsInRoom) {
   };
 
   return {
-    language, code, usersInRoom, roomOwner, roomLocked, terminalOutput, isRunning, isConnected,
-    handleCodeChange, handleCursorChange, handleLanguageChange, handleRunCode, wsRef, outputEndRef
+    language, code, usersInRoom, awareness, spectators, availableLanguages, roomOwner, roomLocked, terminalOutput, isRunning, isConnected,
+    handleCodeChange, handleCursorChange, handleViewportChange, handleLanguageChange, handleRunCode, wsRef, outputEndRef
   };
 }
 
@@ -289,6 +396,7 @@ function RoomLobby({ user, onJoinRoom, onLogout, theme, onToggleTheme }) {
   const [roomId, setRoomId] = useState("");
 
   const handleJoin = () => roomId.trim() ? onJoinRoom(roomId.trim()) : alert("Please enter a Room ID");
+  const handleWatch = () => roomId.trim() ? onJoinRoom(roomId.trim(), true) : alert("Please enter a Room ID");
   const handleCreate = () => onJoinRoom(Math.random().toString(36).substring(2, 9));
 
   return (
@@ -316,6 +424,7 @@ function RoomLobby({ user, onJoinRoom, onLogout, theme, onToggleTheme }) {
           <div className="d-flex gap-2">
             <input className="form-control border-0 shadow-none bg-body text-body" placeholder="Paste Room ID here..." value={roomId} onChange={(e) => setRoomId(e.target.value)} onKeyDown={(e) => e.key === "Enter" && handleJoin()} />
             <button className="btn btn-primary px-4 fw-bold" onClick={handleJoin}>Join</button>
+            <button className="btn btn-outline-secondary fw-bold" onClick={handleWatch} title="Watch without editing"><Eye size={16} /></button>
           </div>
         </div>
 
@@ -326,7 +435,7 @@ function RoomLobby({ user, onJoinRoom, onLogout, theme, onToggleTheme }) {
   );
 }
 
-function EditorHeader({ roomId, language, isConnected, isRunning, onLanguageChange, onRunCode, onLeaveRoom, theme, onToggleTheme }) {
+function EditorHeader({ roomId, language, availableLanguages, isConnected, isRunning, spectator, onLanguageChange, onRunCode, onLeaveRoom, theme, onToggleTheme }) {
   const [copied, setCopied] = useState(false);
 
   const handleCopyRoomId = () => {
@@ -349,10 +458,14 @@ function EditorHeader({ roomId, language, isConnected, isRunning, onLanguageChan
       </div>
 
       <div className="d-flex align-items-center gap-3">
-        <select className="form-select border-0 bg-body-tertiary shadow-none fw-bold text-secondary" value={language} onChange={(e) => onLanguageChange(e.target.value)}>
-          {Object.entries(LANGUAGES).map(([key, val]) => <option key={key} value={key}>{val.name}</option>)}
+        {spectator && <span className="badge bg-secondary d-flex align-items-center gap-1"><Eye size={14} /> Watching</span>}
+        <select className="form-select border-0 bg-body-tertiary shadow-none fw-bold text-secondary" value={language} onChange={(e) => onLanguageChange(e.target.value)} disabled={spectator}>
+          {Object.entries(LANGUAGES).map(([key, val]) => {
+            const unavailable = availableLanguages && !availableLanguages.includes(key);
+            return <option key={key} value={key} disabled={unavailable}>{val.name}{unavailable ? " (not installed)" : ""}</option>;
+          })}
         </select>
-        <button className="btn btn-success d-flex align-items-center gap-2 fw-bold px-4" onClick={onRunCode} disabled={isRunning || !isConnected}>
+        <button className="btn btn-success d-flex align-items-center gap-2 fw-bold px-4" onClick={onRunCode} disabled={spectator || isRunning || !isConnected}>
           <Play size={16} /> {isRunning ? "Running..." : "Run Code"}
         </button>
       </div>
@@ -400,7 +513,7 @@ function AIChatbotSidebar({ chatState }) {
   );
 }
 
-function CollaboratorsSidebar({ user, usersInRoom, roomOwner, roomLocked, wsRef }) {
+function CollaboratorsSidebar({ user, usersInRoom, awareness, spectators, spectator, roomOwner, roomLocked, wsRef }) {
   return (
     <div className="card shadow-sm border-0 rounded-4 p-3 d-flex flex-column bg-body" style={{ flex: 1, minHeight: 0 }}>
       <h6 className="fw-bold text-muted d-flex align-items-center mb-3">
@@ -408,7 +521,8 @@ function CollaboratorsSidebar({ user, usersInRoom, roomOwner, roomLocked, wsRef
       </h6>
       <div className="d-flex justify-content-between align-items-center mb-2">
         <div className="small text-muted">Owner: {roomOwner || "(none)"}</div>
-        {roomOwner === user.email && (
+        {spectators > 0 && <div className="small text-muted d-flex align-items-center gap-1"><Eye size={14} /> {spectators} watching</div>}
+        {!spectator && roomOwner === user.email && (
           <div className="d-flex gap-2">
             <button className={`btn btn-sm ${roomLocked ? 'btn-warning' : 'btn-outline-secondary'}`} onClick={() => wsRef.current?.send(JSON.stringify({ type: 'lock_room', lock: !roomLocked, user: user.email }))}>
               {roomLocked ? 'Unlock' : 'Lock'}
@@ -422,12 +536,13 @@ function CollaboratorsSidebar({ user, usersInRoom, roomOwner, roomLocked, wsRef
       <div className="flex-grow-1 overflow-auto pe-2">
         {usersInRoom.map((email) => (
           <div key={email} className="d-flex align-items-center gap-2 mb-2 p-2 bg-body-tertiary rounded-3">
-            <div className="bg-primary text-white rounded-circle d-flex align-items-center justify-content-center" style={{ width: 28, height: 28, fontSize: "0.8rem" }}>
+            <div className={`${awareness[email]?.color ? "" : "bg-primary "}text-white rounded-circle d-flex align-items-center justify-content-center`} style={{ width: 28, height: 28, fontSize: "0.8rem", backgroundColor: awareness[email]?.color }}>
               {getInitials(email)}
             </div>
             <span className="small text-truncate flex-grow-1 text-body">{email}</span>
+            {typeof awareness[email]?.line === "number" && <span className="small text-muted">Ln {awareness[email].line + 1}</span>}
             {email === user.email && <span className="badge bg-secondary">You</span>}
-            {roomOwner === user.email && email !== user.email && (
+            {!spectator && roomOwner === user.email && email !== user.email && (
               <button className="btn btn-sm btn-outline-danger ms-2" onClick={() => { if (window.confirm(`Kick ${email}?`)) wsRef.current?.send(JSON.stringify({ type: 'kick_user', target: email, user: user.email })); }}>Kick</button>
             )}
           </div>
@@ -437,16 +552,18 @@ function CollaboratorsSidebar({ user, usersInRoom, roomOwner, roomLocked, wsRef
   );
 }
 
-function ConsoleTerminal({ terminalOutput, outputEndRef, wsRef }) {
+function ConsoleTerminal({ terminalOutput, outputEndRef, wsRef, spectator }) {
   return (
     <div className="card shadow-sm border-0 rounded-4 p-3 d-flex flex-column bg-dark text-light" style={{ flex: 1, minHeight: 0 }}>
       <div className="d-flex justify-content-between align-items-center mb-2">
         <h6 className="fw-bold text-secondary d-flex align-items-center m-0">
           <Terminal size={16} className="me-2" /> Console
         </h6>
-        <button className="btn btn-sm btn-outline-secondary border-0 p-1 text-light" onClick={() => wsRef.current?.send(JSON.stringify({ type: "clear_output" }))}>
-          Clear
-        </button>
+        {!spectator && (
+          <button className="btn btn-sm btn-outline-secondary border-0 p-1 text-light" onClick={() => wsRef.current?.send(JSON.stringify({ type: "clear_output" }))}>
+            Clear
+          </button>
+        )}
       </div>
       <div className="flex-grow-1 overflow-auto font-monospace small" style={{ whiteSpace: "pre-wrap", color: "#a9b7c6" }}>
         {terminalOutput || <span className="text-secondary">Waiting for execution...</span>}
@@ -465,11 +582,12 @@ export default function CodeEditor() {
   const [user, setUser] = useState(null);
   const [roomId, setRoomId] = useState("");
   const [isInRoom, setIsInRoom] = useState(false);
+  const [isSpectator, setIsSpectator] = useState(false);
 
   // Use Custom Hooks
   const { theme, toggleTheme } = useTheme();
   
-  const wsState = useWebSocket(isInRoom, user, roomId, setIsInRoom);
+  const wsState = useWebSocket(isInRoom, user, roomId, setIsInRoom, isSpectator);
   
   const chatState = useGroqChat(wsState.language, wsState.code);
 
@@ -479,7 +597,7 @@ export default function CodeEditor() {
   }
 
   if (!isInRoom) {
-    return <RoomLobby user={user} onJoinRoom={(id) => { setRoomId(id); setIsInRoom(true); }} onLogout={() => setUser(null)} theme={theme} onToggleTheme={toggleTheme} />;
+    return <RoomLobby user={user} onJoinRoom={(id, spectator = false) => { setRoomId(id); setIsSpectator(spectator); setIsInRoom(true); }} onLogout={() => setUser(null)} theme={theme} onToggleTheme={toggleTheme} />;
   }
 
   // Main Editor View
@@ -487,8 +605,8 @@ export default function CodeEditor() {
     <div className="vh-100 d-flex flex-column font-sans bg-body-tertiary">
       
       <EditorHeader 
-        roomId={roomId} language={wsState.language} 
-        isConnected={wsState.isConnected} isRunning={wsState.isRunning} 
+        roomId={roomId} language={wsState.language} availableLanguages={wsState.availableLanguages}
+        isConnected={wsState.isConnected} isRunning={wsState.isRunning} spectator={isSpectator}
         onLanguageChange={wsState.handleLanguageChange} 
         onRunCode={wsState.handleRunCode} 
         onLeaveRoom={() => setIsInRoom(false)} 
@@ -509,9 +627,12 @@ export default function CodeEditor() {
             className="form-control border-0 rounded-0 flex-grow-1 p-4 font-monospace fs-6 shadow-none bg-body text-body"
             style={{ resize: "none", outline: "none" }}
             value={wsState.code} 
+            readOnly={isSpectator}
             onChange={(e) => wsState.handleCodeChange(e.target.value)} 
             onKeyUp={wsState.handleCursorChange}
             onClick={wsState.handleCursorChange}
+            onScroll={wsState.handleViewportChange}
+            onFocus={wsState.handleViewportChange}
             spellCheck={false}
             placeholder="Start typing your code here..."
           />
@@ -520,14 +641,15 @@ export default function CodeEditor() {
         {/* RIGHT SIDEBAR */}
         <div className="d-flex flex-column gap-3" style={{ width: "320px" }}>
           <CollaboratorsSidebar 
-            user={user} usersInRoom={wsState.usersInRoom} 
+            user={user} usersInRoom={wsState.usersInRoom} awareness={wsState.awareness}
+            spectators={wsState.spectators} spectator={isSpectator}
             roomOwner={wsState.roomOwner} roomLocked={wsState.roomLocked} 
             wsRef={wsState.wsRef} 
           />
           <ConsoleTerminal 
             terminalOutput={wsState.terminalOutput} 
             outputEndRef={wsState.outputEndRef} 
-            wsRef={wsState.wsRef} 
+            wsRef={wsState.wsRef} spectator={isSpectator}
           />
         </div>
         